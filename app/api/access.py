@@ -0,0 +1,148 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.core.auth import AuthService
+from app.core.config import settings
+from app.schemas.access import AccessQuery, AccessQueryResult, IdentityHoldings
+from app.service.access_index import access_index
+from app.service.identity import encode_cursor, decode_cursor
+from typing import Any, Dict, Optional
+
+router = APIRouter()
+
+def _run_query(db: Session, expression: Any, cursor: Optional[str], limit: int) -> AccessQueryResult:
+    try:
+        after_id = decode_cursor(cursor) if cursor else None
+        access_index.refresh(db)
+        count, ids = access_index.query(expression, after_id, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    next_cursor = None
+    if len(ids) > limit:
+        ids = ids[:limit]
+        next_cursor = encode_cursor(ids[-1])
+    return AccessQueryResult(count=count, identity_ids=ids, next_cursor=next_cursor)
+
+@router.post("/query", response_model=AccessQueryResult, summary="Query Access with Set Operations")
+def query_access(
+    query: AccessQuery,
+    db: Session = Depends(get_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Query Access** (HR Only)
+    
+    Answers "who holds X" questions from the in-memory access index, combining keys with set operations.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    **Keys:**
+    - Entitlements: `slack:channels:#alerts`, `iga:permissions:write`
+    - Identity attributes (lowercase): `attribute:business_role:devops`, `attribute:department:platform`,
+      `attribute:is_active:true`
+    - `*`: Every identity
+    
+    **Expression:** a key, or an object with one operation over a list of expressions:
+    - `{"union": [a, b, ...]}`, `{"intersection": [a, b, ...]}`
+    - `{"difference": [a, b, ...]}`: `a` minus all the others
+    
+    Example, in #alerts but not devops:
+    `{"expression": {"difference": ["slack:channels:#alerts", "attribute:business_role:devops"]}}`
+    
+    Returns the total `count` and one page of identity IDs; pass `next_cursor` as `cursor` for the next page.
+    """
+    return _run_query(db, query.expression, query.cursor, query.limit)
+
+@router.get("/holders", response_model=AccessQueryResult, summary="Get Holders of an Access Key")
+def get_access_holders(
+    key: str = Query(..., description='Index key, e.g. "slack:channels:#devops"'),
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous page"),
+    limit: int = Query(settings.identity_page_size, ge=1, le=settings.identity_page_size_max),
+    db: Session = Depends(get_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Get Holders of an Access Key** (HR Only)
+    
+    Identity IDs holding one entitlement or attribute, from the in-memory access index.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    return _run_query(db, key, cursor, limit)
+
+@router.get("/keys", summary="List Access Keys")
+def list_access_keys(
+    prefix: str = Query("", description='Only keys starting with this, e.g. "slack:channels:"'),
+    db: Session = Depends(get_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+) -> Dict[str, int]:
+    """
+    **List Access Keys** (HR Only)
+    
+    Every indexed key with its number of holders.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    access_index.refresh(db)
+    return access_index.keys(prefix)
+
+@router.get("/identities/{identity_id}", response_model=IdentityHoldings, summary="Get Access Held by an Identity")
+def get_identity_access(
+    identity_id: int,
+    db: Session = Depends(get_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Get Access Held by an Identity** (HR Only)
+    
+    Every entitlement and attribute key of one identity, from the in-memory access index.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    access_index.refresh(db)
+    keys = access_index.holdings(identity_id)
+    if keys is None:
+        raise HTTPException(status_code=404, detail="Identity not found")
+    return IdentityHoldings(identity_id=identity_id, keys=keys)
+
+@router.get("/stats", summary="Access Index Statistics")
+def access_index_stats(_: bool = Depends(AuthService.verify_hr_access)):
+    """
+    **Access Index Statistics** (HR Only)
+    
+    Size, memory use and freshness of the in-memory access index.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    **Memory:**
+    - `bitmaps`: Raw bitmap payload, one bit per identity ID up to the highest holder
+    - `postings` / `holdings`: Python object sizes of the key -> bitmap and identity -> keys maps
+    """
+    return access_index.stats()
+
+@router.post("/rebuild", summary="Rebuild Access Index")
+def rebuild_access_index(
+    db: Session = Depends(get_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Rebuild Access Index** (HR Only)
+    
+    Rebuilds the in-memory access index from the identities table.
+    Not needed after identity writes, which are picked up automatically.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    return access_index.build(db)
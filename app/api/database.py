@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends
-from app.core.database import engine, Base
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.database import engine, pool_monitor, async_pool_monitor, replica_pool_monitors, get_read_db
 from app.core.auth import AuthService
-from app.models.identity import Identity, TargetApplication
-from app.models.employee import Employee, EmployeeDocument, EmployeeSkill, EmployeeLeave, EmployeePerformance, Department
+from app.core.migrations import run_migrations, migration_status
+from app.service.policy import role_policies
+from app.service.simulation import PolicySimulationService
+from app.schemas.policy import RolePolicyProposal
+from typing import Optional
+import asyncio
 
 router = APIRouter()
 
@@ -11,30 +17,50 @@ def initialize_database(_: bool = Depends(AuthService.verify_hr_access)):
     """
     **Initialize Database Tables** (HR Only)
     
-    Creates all necessary database tables for the IGA system.
+    Creates all necessary database tables for the IGA system and applies
+    pending schema migrations.
     **Restricted to HR personnel only.**
     
     **Required Header:**
     - `X-User-Role`: Must be "hr"
     """
     try:
-        Base.metadata.create_all(bind=engine)
+        applied = run_migrations(engine)
         return {
             "message": "Database initialized successfully",
+            "migrations_applied": applied,
             "tables_created": [
                 "identities",
+                "identity_entitlements",
                 "target_applications", 
                 "employees",
                 "employee_documents",
                 "employee_skills",
                 "employee_leaves",
                 "employee_performance",
-                "departments"
+                "departments",
+                "provisioning_jobs",
+                "provisioning_job_identities",
+                "idempotency_keys",
+                "schema_migrations"
             ]
         }
     except Exception as e:
         return {"error": f"Database initialization failed: {str(e)}"}
 
+@router.get("/migrations", summary="Schema Migration Status")
+def schema_migration_status(_: bool = Depends(AuthService.verify_hr_access)):
+    """
+    **Schema Migration Status** (HR Only)
+    
+    Returns the current schema version, the applied migrations and the pending ones.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    return migration_status(engine)
+
 @router.get("/db-status", summary="Database Status")
 def database_status(_: bool = Depends(AuthService.verify_hr_access)):
     """
@@ -46,7 +72,7 @@ def database_status(_: bool = Depends(AuthService.verify_hr_access)):
     try:
         # Test database connection
         with engine.connect() as conn:
-            result = conn.execute("SELECT 1")
+            conn.execute(text("SELECT 1"))
             return {
                 "status": "connected",
                 "message": "Database connection successful"
@@ -55,4 +81,93 @@ def database_status(_: bool = Depends(AuthService.verify_hr_access)):
         return {
             "status": "error",
             "message": f"Database connection failed: {str(e)}"
-        }
\ No newline at end of file
+        }
+
+@router.get("/db-pool", summary="Connection Pool Statistics")
+def database_pool_stats(_: bool = Depends(AuthService.verify_hr_access)):
+    """
+    **Connection Pool Statistics** (HR Only)
+    
+    Reports the sync and async connection pools.
+    **Restricted to HR personnel only.**
+    
+    **Per Pool:**
+    - `checked_out` / `checked_in` / `overflow`: Connections in use, idle and beyond `size`
+    - `wait_ms`: Time spent getting a connection from the pool; a growing `max`
+      or any `timeouts` mean workers are starved for connections
+    - `connection_age_s`: Age of the open connections (see `DB_POOL_RECYCLE`)
+    - `longest_checkout_s`: Longest time a connection currently checked out has been held
+    
+    `replicas` lists one entry per configured read replica.
+    """
+    return {
+        "sync": pool_monitor.stats(),
+        "async": async_pool_monitor.stats(),
+        "replicas": [monitor.stats() for monitor in replica_pool_monitors]
+    }
+
+@router.get("/role-policy", summary="Role Policy")
+def role_policy(_: bool = Depends(AuthService.verify_hr_access)):
+    """
+    **Role Policy** (HR Only)
+    
+    Returns the business role -> entitlements policy in use, with its version.
+    Identities record the version their entitlements were derived from in `policy_version`.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    return role_policies.snapshot.describe()
+
+@router.post("/role-policy/reload", summary="Reload Role Policy")
+def reload_role_policy(_: bool = Depends(AuthService.verify_hr_access)):
+    """
+    **Reload Role Policy** (HR Only)
+    
+    Re-reads the policy file now instead of waiting for the next change check.
+    An invalid file is rejected and the current version stays in use.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    reloaded = role_policies.reload(force=True)
+    if role_policies.last_error:
+        raise HTTPException(status_code=422, detail=f"Role policy file is invalid: {role_policies.last_error}")
+    return {"reloaded": reloaded, "version": role_policies.snapshot.version}
+
+@router.post("/role-policy/simulate", summary="Simulate a Role Policy Change")
+async def simulate_role_policy(
+    proposal: RolePolicyProposal,
+    sample_size: Optional[int] = Query(None, ge=1, le=1000, description="Diff groups to return"),
+    db: Session = Depends(get_read_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Simulate a Role Policy Change** (HR Only)
+    
+    Evaluates every identity against a proposed policy and reports what would change,
+    without writing anything or contacting Slack.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    **Proposal:** the current policy with changes applied
+    - `roles`: Roles to add or replace, e.g. `{"developer": {"slack": {"channels": [...]}, "permissions": [...]}}`;
+      `null` removes a role
+    - `default` / `rules`: Replace the default entitlements or the rule list when given
+    
+    **Returns:**
+    - `identities_affected`: Identities whose stored entitlements would change
+    - `slack_invites` / `slack_kicks`: Channel memberships added and removed for active identities,
+      with a per-channel breakdown in `channels`
+    - `diffs`: The largest groups of identically affected identities, with example identities
+    - `identities_out_of_date`: Identities already differing from the current policy
+    """
+    service = PolicySimulationService(db)
+    try:
+        return await asyncio.to_thread(service.simulate, proposal.model_dump(), sample_size)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid role policy proposal: {str(e)}")
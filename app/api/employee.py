@@ -1,8 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_async_db, get_read_db
 from app.core.auth import AuthService
-from app.repository.employee import EmployeeRepository
+from app.repository.employee import AsyncEmployeeRepository
+from app.models.employee import Employee as EmployeeModel
+from app.service.export import stream_table, MEDIA_TYPES
+from app.service.stats import StatsService
 from app.schemas.employee import Employee, EmployeeCreate, EmployeeUpdate, EmployeeSkill, EmployeeSkillCreate, EmployeeLeave, EmployeeLeaveCreate
 from typing import List
 
@@ -11,7 +16,7 @@ router = APIRouter()
 @router.post("/", response_model=Employee, summary="Create Employee Record")
 async def create_employee(
     employee: EmployeeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user_role: str = Depends(AuthService.verify_user_access)
 ):
     """
@@ -24,7 +29,49 @@ async def create_employee(
     - `X-User-Role`: Your business role
     """
     try:
-        repo = EmployeeRepository(db)
-        return repo.create_employee(employee)
+        repo = AsyncEmployeeRepository(db)
+        return await repo.create_employee(employee)
     except Exception as e:
-        return {"error": "Employee creation not available"}
\ No newline at end of file
+        return {"error": "Employee creation not available"}
+
+@router.get("/export", summary="Export All Employees")
+def export_employees(
+    format: str = Query("ndjson", pattern="^(ndjson|json)$"),
+    db: Session = Depends(get_read_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Export All Employees** (HR Only)
+    
+    Streams every employee record as NDJSON (one object per line) or as a JSON array.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    return StreamingResponse(
+        stream_table(db, EmployeeModel, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="employees.{format}"'}
+    )
+
+@router.get("/stats", summary="Employee Dashboard Statistics")
+def get_employee_stats(
+    # Primary, not a replica: the cache is dropped on the primary's commit, and a
+    # lagging replica read right after would be cached as current
+    db: Session = Depends(get_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Employee Dashboard Statistics** (HR Only)
+    
+    Headcount by role, department, status, location and employment type.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    Computed with `GROUP BY` in the database and cached for a few seconds; any
+    employee write drops the cached result.
+    """
+    return StatsService(db).employee_stats()
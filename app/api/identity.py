@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Query, Header
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_async_db, get_read_db
 from app.core.auth import AuthService
-from app.service.identity import IdentityService
-from app.schemas.identity import Identity, IdentityCreate, IdentityUpdate
-from typing import List
+from app.core.idempotency import IdempotencyGuard
+from app.core.config import settings
+from app.service.identity import IdentityService, AsyncIdentityService
+from app.service.slack import SlackService, get_slack_service
+from app.schemas.identity import Identity, IdentityCreate, IdentityUpdate, IdentityImportResult, IdentitySyncResult, IdentityPage
+from app.service.identity_import import iter_lines, iter_ndjson_records, iter_csv_records
+from app.service.export import stream_table, MEDIA_TYPES
+from app.service.stats import StatsService
+from app.models.identity import Identity as IdentityModel
+from fastapi.responses import StreamingResponse
+from app.schemas.provisioning import ProvisioningJob
+from typing import List, Optional
+import asyncio
 
 router = APIRouter()
 
@@ -12,7 +23,10 @@ router = APIRouter()
 async def create_identity(
     identity: IdentityCreate,
     db: Session = Depends(get_db),
-    user_role: str = Depends(AuthService.verify_user_access)
+    async_db: AsyncSession = Depends(get_async_db),
+    slack_service: SlackService = Depends(get_slack_service),
+    user_role: str = Depends(AuthService.verify_user_access),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     **Create New User Identity**
@@ -26,60 +40,360 @@ async def create_identity(
     **Business Process:**
     1. Validates user information and business role
     2. Maps business role to appropriate entitlements
-    3. Provisions user to target applications (Slack, etc.)
+    3. Queues provisioning to target applications (Slack, etc.) in the same transaction
     4. Returns complete identity record with assigned entitlements
     
+    Provisioning runs in the background; poll `GET /api/v1/identity/{identity_id}/jobs`
+    for its status.
+    
     **Supported Business Roles:**
     - `developer`, `tester`, `manager`, `hr`, `designer`, `analyst`
     - `devops`, `sales`, `marketing`, `support`, `intern`, `contractor`
+    
+    **Optional Header:**
+    - `Idempotency-Key`: Replaying a request with the same key returns the stored
+      response without creating the identity or provisioning again
     """
+    guard = IdempotencyGuard(db, "identity.create", idempotency_key, identity.model_dump(mode="json"))
+    # The idempotency record lives on the sync session, keep it off the event loop
+    replay = await asyncio.to_thread(guard.replay)
+    if replay is not None:
+        return replay
+    
     try:
-        service = IdentityService(db)
-        return await service.create_identity(identity)
+        service = AsyncIdentityService(async_db, slack_service)
+        created = await service.create_identity(identity)
     except Exception as e:
+        await asyncio.to_thread(guard.release)
         import logging
         logging.error(f"Error creating identity: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    await asyncio.to_thread(guard.complete, 201, Identity.model_validate(created).model_dump(mode="json"))
+    return created
 
-@router.get("/employees/all", response_model=List[Identity], summary="Get All Employees")
-def get_all_employees(
+@router.post("/import", response_model=IdentityImportResult, summary="Bulk Import Identities")
+async def import_identities(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Defaults to the request Content-Type"),
+    db: Session = Depends(get_db),
+    slack_service: SlackService = Depends(get_slack_service),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Bulk Import Identities** (HR Only)
+    
+    Streams an NDJSON or CSV upload and creates identities in chunks.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    - `Content-Type`: `application/x-ndjson` or `text/csv` (or use the `format` query parameter)
+    
+    **Business Process:**
+    1. Rows are validated against the identity schema as they arrive
+    2. Each chunk is inserted with a single statement and one commit
+    3. One provisioning job per chunk invites users to channels in bulk
+    4. Invalid or duplicate rows are reported by row number without aborting the import
+    
+    CSV uploads need a header row with identity field names and one record per line.
+    """
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    lines = iter_lines(request.stream())
+    records = iter_csv_records(lines) if fmt == "csv" else iter_ndjson_records(lines)
+    
+    service = IdentityService(db, slack_service)
+    return await service.import_identities(records)
+
+@router.post("/sync", response_model=IdentitySyncResult, summary="Sync Identities from an HR Snapshot")
+async def sync_identities(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Defaults to the request Content-Type"),
     db: Session = Depends(get_db),
+    slack_service: SlackService = Depends(get_slack_service),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Sync Identities from an HR Snapshot** (HR Only)
+    
+    Streams a full NDJSON or CSV snapshot and inserts or updates identities keyed on `employee_id`.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    - `Content-Type`: `application/x-ndjson` or `text/csv` (or use the `format` query parameter)
+    
+    **Business Process:**
+    1. Each chunk is compared with the stored identities; unchanged rows are not written
+    2. New and changed rows are written with one `INSERT ... ON CONFLICT DO UPDATE` per chunk
+    3. New identities are provisioned in bulk; changed identities are reprovisioned
+       only when their Slack channels changed
+    4. Rows whose `primary_email` belongs to another employee are reported as errors
+    
+    Each row replaces the stored identity, so send complete records.
+    """
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    lines = iter_lines(request.stream())
+    records = iter_csv_records(lines) if fmt == "csv" else iter_ndjson_records(lines)
+    
+    service = IdentityService(db, slack_service)
+    return await service.sync_identities(records)
+
+@router.post("/reevaluate", summary="Re-evaluate Entitlements Against the Current Policy")
+async def reevaluate_entitlements(
+    apply: bool = Query(False, description="Write the new entitlements and queue reprovisioning; otherwise only report"),
+    db: Session = Depends(get_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Re-evaluate Entitlements** (HR Only)
+    
+    Evaluates every identity against the current role policy and attribute rules.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    **Returns:**
+    - `changed`: Count and a sample of identities whose entitlements differ, with the delta
+    - `restamped`: Identities whose entitlements match but were derived from an older policy version
+    - `job_ids`: Reprovisioning jobs queued for channel changes (only with `apply=true`)
+    """
+    service = IdentityService(db)
+    return await asyncio.to_thread(service.reevaluate_entitlements, apply)
+
+@router.get("/employees/all", response_model=IdentityPage, summary="Get All Employees")
+def get_all_employees(
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous page"),
+    limit: int = Query(settings.identity_page_size, ge=1, le=settings.identity_page_size_max),
+    department: Optional[str] = None,
+    location: Optional[str] = None,
+    employment_status: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    db: Session = Depends(get_read_db),
     _: bool = Depends(AuthService.verify_hr_access)
 ):
     """
     **Get All Employees** (HR Only)
     
-    Retrieves all employees in the system.
+    Retrieves employees one page at a time, ordered by ID.
     **Restricted to HR personnel only.**
     
     **Required Header:**
     - `X-User-Role`: Must be "hr"
+    
+    **Pagination:**
+    - Pass the returned `next_cursor` as `cursor` to fetch the next page
+    - `next_cursor` is null on the last page
+    - Optional filters: `department`, `location`, `employment_status`, `is_active`
     """
     service = IdentityService(db)
-    return service.get_all_identities()
+    try:
+        items, next_cursor = service.list_identities(
+            cursor, limit,
+            department=department,
+            location=location,
+            employment_status=employment_status,
+            is_active=is_active
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return IdentityPage(items=items, next_cursor=next_cursor)
+
+@router.get("/entitlements/holders", response_model=IdentityPage, summary="Get Holders of an Entitlement")
+def get_entitlement_holders(
+    application: str = Query(..., description='Target application, e.g. "slack", or "iga" for permissions'),
+    type: str = Query(..., description='Entitlement type, e.g. "channels" or "permissions"'),
+    value: str = Query(..., description='Entitlement value, e.g. "#devops" or "infrastructure_access"'),
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous page"),
+    limit: int = Query(settings.identity_page_size, ge=1, le=settings.identity_page_size_max),
+    db: Session = Depends(get_read_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Get Holders of an Entitlement** (HR Only)
+    
+    Lists the identities holding one entitlement, one page at a time, ordered by ID.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    **Examples:**
+    - Members of a Slack channel: `application=slack&type=channels&value=%23devops`
+    - Holders of a permission: `application=iga&type=permissions&value=infrastructure_access`
+    
+    **Pagination:**
+    - Pass the returned `next_cursor` as `cursor` to fetch the next page
+    - `next_cursor` is null on the last page
+    """
+    service = IdentityService(db)
+    try:
+        items, next_cursor = service.list_entitlement_holders(application, type, value, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return IdentityPage(items=items, next_cursor=next_cursor)
+
+@router.get("/export", summary="Export All Identities")
+def export_identities(
+    format: str = Query("ndjson", pattern="^(ndjson|json)$"),
+    db: Session = Depends(get_read_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Export All Identities** (HR Only)
+    
+    Streams every identity as NDJSON (one object per line) or as a JSON array.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    The export is written while the table is read, so it is safe on large directories.
+    """
+    return StreamingResponse(
+        stream_table(db, IdentityModel, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="identities.{format}"'}
+    )
+
+@router.get("/stats", summary="Identity Dashboard Statistics")
+def get_identity_stats(
+    # Primary, not a replica: the cache is dropped on the primary's commit, and a
+    # lagging replica read right after would be cached as current
+    db: Session = Depends(get_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Identity Dashboard Statistics** (HR Only)
+    
+    Headcount by role, department, status and location, plus how many identities of
+    each role hold each Slack channel and permission.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    Computed with `GROUP BY` in the database and cached for a few seconds; any
+    identity write drops the cached result.
+    """
+    return StatsService(db).identity_stats()
 
-@router.get("/role/{role}", response_model=List[Identity], summary="Get Identities by Role")
+@router.get("/role/{role}", response_model=IdentityPage, summary="Get Identities by Role")
 def get_identities_by_role(
     role: str, 
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="`next_cursor` from the previous page"),
+    limit: int = Query(settings.identity_page_size, ge=1, le=settings.identity_page_size_max),
+    department: Optional[str] = None,
+    location: Optional[str] = None,
+    employment_status: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    db: Session = Depends(get_read_db),
     _: bool = Depends(AuthService.verify_hr_access)
 ):
     """
     **Get All Identities by Business Role** (HR Only)
     
-    Retrieves all users with a specific business role.
+    Retrieves users with a specific business role one page at a time.
     **Restricted to HR personnel only.**
     
     **Required Header:**
     - `X-User-Role`: Must be "hr"
+    
+    Supports the same `cursor`, `limit` and filter parameters as `/employees/all`.
     """
     service = IdentityService(db)
-    return service.get_identities_by_role(role)
+    try:
+        items, next_cursor = service.list_identities(
+            cursor, limit,
+            business_role=role,
+            department=department,
+            location=location,
+            employment_status=employment_status,
+            is_active=is_active
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return IdentityPage(items=items, next_cursor=next_cursor)
+
+@router.get("/jobs/{job_id}", response_model=ProvisioningJob, summary="Get Provisioning Job Status")
+def get_provisioning_job(
+    job_id: int,
+    db: Session = Depends(get_read_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Get Provisioning Job Status** (HR Only)
+    
+    Returns the state of a queued provisioning job.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    **Job Status:**
+    - `pending`: Waiting for a worker (or for its next retry)
+    - `running`: Being processed
+    - `succeeded`: Provisioning finished, see `result`
+    - `dead`: All attempts failed, see `last_error`
+    """
+    service = IdentityService(db)
+    job = service.get_provisioning_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Provisioning job not found")
+    return job
+
+@router.get("/{identity_id}/jobs", response_model=List[ProvisioningJob], summary="Get Identity Provisioning Jobs")
+def get_identity_provisioning_jobs(
+    identity_id: int,
+    db: Session = Depends(get_read_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Get Provisioning Jobs for an Identity** (HR Only)
+    
+    Lists the provisioning jobs of an identity, newest first.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    service = IdentityService(db)
+    return service.get_provisioning_jobs(identity_id)
+
+@router.get("/{identity_id}/entitlements/explain", summary="Explain Identity Entitlements")
+def explain_identity_entitlements(
+    identity_id: int,
+    db: Session = Depends(get_read_db),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Explain Identity Entitlements** (HR Only)
+    
+    Evaluates the identity against the current policy and shows how its entitlements come about.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    **Returns:**
+    - `role` / `role_entitlements`: The role policy used as the starting point
+    - `fired`: Rules that matched, highest priority first
+    - `stopped`: Rules that matched but were cut off by a higher-priority `stop` rule
+    - `entitlements` vs `stored_entitlements`: Whether a re-evaluation would change the identity
+    """
+    service = IdentityService(db)
+    explanation = service.explain_entitlements(identity_id)
+    if not explanation:
+        raise HTTPException(status_code=404, detail="Identity not found")
+    return explanation
 
 @router.get("/{identity_id}", response_model=Identity, summary="Retrieve Identity Details")
 def get_identity(
     identity_id: int, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _: bool = Depends(AuthService.verify_hr_access)
 ):
     """
@@ -108,7 +422,8 @@ def get_identity(
 async def update_identity(
     identity_id: int,
     update_data: IdentityUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
+    slack_service: SlackService = Depends(get_slack_service),
     _: bool = Depends(AuthService.verify_hr_access)
 ):
     """
@@ -117,10 +432,13 @@ async def update_identity(
     Updates user identity information and re-provisions access if needed.
     **Restricted to HR personnel only.**
     
+    When the business role changes, only the entitlement delta is queued for Slack:
+    invites for added channels and removals for channels the old role had.
+    
     **Required Header:**
     - `X-User-Role`: Must be "hr"
     """
-    service = IdentityService(db)
+    service = AsyncIdentityService(db, slack_service)
     identity = await service.update_identity(identity_id, update_data)
     if not identity:
         raise HTTPException(status_code=404, detail="Identity not found")
@@ -1,18 +1,32 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
+from sqlalchemy.orm import Session
+from app.core.database import get_db
 from app.core.auth import AuthService
-from app.service.slack import SlackService
+from app.core.idempotency import IdempotencyGuard
+from app.core.config import settings
+from app.service.slack import SlackService, get_slack_service
+from app.service.reconciliation import ReconciliationService
+from typing import Optional
+import asyncio
 from app.schemas.identity import (
     SlackUserRequest, 
     SlackUserResponse, 
     SlackCreateUserRequest,
     SlackUserSearchResponse,
-    SlackDeleteResponse
+    SlackDeleteResponse,
+    SlackBulkInviteRequest,
+    SlackBulkInviteResponse
 )
 
 router = APIRouter()
 
 @router.post("/provision", response_model=SlackUserResponse, summary="Provision User to Slack")
-async def provision_slack_user(request: SlackUserRequest):
+async def provision_slack_user(
+    request: SlackUserRequest,
+    db: Session = Depends(get_db),
+    service: SlackService = Depends(get_slack_service),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     **Provision User to Slack Workspace**
     
@@ -34,29 +48,178 @@ async def provision_slack_user(request: SlackUserRequest):
     - `existing`: User already exists in Slack
     - `created`: New user created successfully
     - `failed`: User creation or provisioning failed
+    
+    **Optional Header:**
+    - `Idempotency-Key`: Replaying a request with the same key returns the stored
+      response without any Slack traffic
     """
-    service = SlackService()
-    result = await service.create_user_account(
-        request.email, 
-        request.first_name, 
-        request.last_name, 
-        request.channels
-    )
+    guard = IdempotencyGuard(db, "slack.provision", idempotency_key, request.model_dump(mode="json"))
+    replay = await asyncio.to_thread(guard.replay)
+    if replay is not None:
+        return replay
+    
+    try:
+        result = await service.create_user_account(
+            request.email, 
+            request.first_name, 
+            request.last_name, 
+            request.channels
+        )
+    except Exception:
+        await asyncio.to_thread(guard.release)
+        raise
     
     if result["status"] == "failed":
+        await asyncio.to_thread(guard.release)
         raise HTTPException(status_code=400, detail=result.get("error", "Slack provisioning failed"))
     
-    return SlackUserResponse(**result)
+    response = SlackUserResponse(**result)
+    await asyncio.to_thread(guard.complete, 200, response.model_dump(mode="json"))
+    return response
+
+@router.post("/bulk-invite", response_model=SlackBulkInviteResponse, summary="Bulk Invite Users to Channels")
+async def bulk_invite_slack_users(
+    request: SlackBulkInviteRequest,
+    service: SlackService = Depends(get_slack_service),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Bulk Invite Users to Slack Channels** (HR Only)
+    
+    Groups all users headed for the same channel into a single
+    `conversations.invite` call and reports the outcome per channel.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    **Request Fields:**
+    - `assignments`: Map of Slack user ID to the channels that user should join
+    """
+    results = await service.bulk_assign_channels(request.assignments)
+    return SlackBulkInviteResponse(channels=results)
+
+@router.get("/scheduler/stats", summary="Slack Rate Limit Scheduler Statistics")
+def slack_scheduler_stats(
+    service: SlackService = Depends(get_slack_service),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Slack Rate Limit Scheduler Statistics** (HR Only)
+    
+    Reports the per-method token buckets in front of the Slack API.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    **Response Fields:**
+    - `queue_depth`: Calls currently waiting for a rate limit token
+    - `retries`: Calls retried after a 429, 5xx or connection error
+    - `methods`: Rate, burst, queued calls and 429 count for each Slack API method
+    """
+    return service.scheduler.stats()
+
+@router.get("/cache/stats", summary="Slack User Cache Statistics")
+def slack_cache_stats(
+    service: SlackService = Depends(get_slack_service),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Slack User Cache Statistics** (HR Only)
+    
+    Reports size, hit and miss counters of the email to Slack user cache.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    return service.user_cache.stats()
+
+@router.post("/cache/warm", summary="Warm Slack User Cache")
+async def warm_slack_cache(
+    service: SlackService = Depends(get_slack_service),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Warm Slack User Cache** (HR Only)
+    
+    Pages through `users.list` and loads every workspace user into the cache.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    if not settings.slack_bot_token:
+        raise HTTPException(status_code=400, detail="Slack bot token is not configured")
+    cached = await service.warm_user_cache()
+    return {"cached_users": cached, "cache": service.user_cache.stats()}
+
+@router.post("/channels/refresh", summary="Refresh Slack Channel Index")
+async def refresh_slack_channels(
+    service: SlackService = Depends(get_slack_service),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Refresh Slack Channel Index** (HR Only)
+    
+    Re-pages `conversations.list` (public and private channels) and updates the
+    channel name to ID index used for invites.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    """
+    if not settings.slack_bot_token:
+        raise HTTPException(status_code=400, detail="Slack bot token is not configured")
+    await service.channels.refresh()
+    return service.channels.stats()
+
+@router.post("/reconcile", summary="Reconcile Identities with Slack")
+async def reconcile_slack(
+    apply: bool = False,
+    deactivate_orphans: bool = False,
+    db: Session = Depends(get_db),
+    service: SlackService = Depends(get_slack_service),
+    _: bool = Depends(AuthService.verify_hr_access)
+):
+    """
+    **Reconcile Identities with the Slack Workspace** (HR Only)
+    
+    Compares the identities table with Slack users and channel memberships.
+    **Restricted to HR personnel only.**
+    
+    **Required Header:**
+    - `X-User-Role`: Must be "hr"
+    
+    **Report:**
+    - `missing`: Active identities without a Slack account
+    - `orphaned`: Active Slack accounts without an identity
+    - `mismatched`: Accounts whose state or channel membership differs from the identity
+    - `channel_gaps`: Number of expected members missing from each channel
+    
+    **Query Parameters:**
+    - `apply`: Create missing users and invite missing channel members in batches
+    - `deactivate_orphans`: With `apply`, also deactivate orphaned Slack accounts
+    """
+    if not settings.slack_bot_token:
+        raise HTTPException(status_code=400, detail="Slack bot token is not configured")
+    try:
+        return await ReconciliationService(db, service).run(apply=apply, deactivate_orphans=deactivate_orphans)
+    except RuntimeError as e:
+        raise HTTPException(status_code=502, detail=str(e))
 
 @router.get("/user/{email}")
-async def get_slack_user(email: str):
-    service = SlackService()
+async def get_slack_user(email: str, service: SlackService = Depends(get_slack_service)):
     user = await service.get_user_by_email(email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 @router.post("/create-user", response_model=SlackUserResponse, summary="Create New Slack User")
-async def create_new_slack_user(request: SlackCreateUserRequest):
+async def create_new_slack_user(
+    request: SlackCreateUserRequest,
+    service: SlackService = Depends(get_slack_service)
+):
     """
     **Create New User in Slack**
     
@@ -72,7 +235,6 @@ async def create_new_slack_user(request: SlackCreateUserRequest):
     - `first_name`: User's first name (required)
     - `last_name`: User's last name (optional)
     """
-    service = SlackService()
     result = await service.create_new_user_only(
         request.email, 
         request.first_name, 
@@ -87,6 +249,7 @@ async def create_new_slack_user(request: SlackCreateUserRequest):
 @router.get("/search/{user_id}", response_model=SlackUserSearchResponse, summary="Search User by ID")
 async def search_slack_user(
     user_id: str,
+    service: SlackService = Depends(get_slack_service),
     _: bool = Depends(AuthService.verify_hr_access)
 ):
     """
@@ -98,7 +261,6 @@ async def search_slack_user(
     **Required Header:**
     - `X-User-Role`: Must be "hr"
     """
-    service = SlackService()
     user = await service.get_user_by_id(user_id)
     
     if not user:
@@ -116,6 +278,7 @@ async def search_slack_user(
 @router.delete("/delete/{user_id}", response_model=SlackDeleteResponse, summary="Delete Slack User")
 async def delete_slack_user(
     user_id: str,
+    service: SlackService = Depends(get_slack_service),
     _: bool = Depends(AuthService.verify_hr_access)
 ):
     """
@@ -129,7 +292,6 @@ async def delete_slack_user(
     
     **Warning:** This action may be irreversible depending on Slack configuration.
     """
-    service = SlackService()
     result = await service.delete_user(user_id)
     
     if result["status"] == "failed":
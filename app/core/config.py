@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
-from typing import Optional
+from typing import Optional, Dict, List
 import os
 
 class Settings(BaseSettings):
@@ -8,9 +8,108 @@ class Settings(BaseSettings):
     
     # Use persistent database path for production
     database_url: str = os.getenv("DATABASE_URL", "sqlite:///./data/iga.db")
+    async_database_url: Optional[str] = None  # defaults to database_url with its asyncio driver
+    
+    # Read replicas for read-only routes; empty means every read goes to the primary
+    read_replica_urls: List[str] = []
+    read_replica_sticky_seconds: float = 5.0  # reads stay on the primary this long after a client writes
+    
+    # Connection pool (per engine; the async engine gets its own pool of the same size)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0  # seconds to wait for a free connection
+    db_pool_recycle: int = 1800  # seconds before a connection is replaced, -1 disables
+    db_pool_pre_ping: bool = True
+    
+    # Schema migrations
+    migrate_on_startup: bool = True
+    migration_batch_size: int = 1000  # rows per backfill transaction
+    migration_batch_pause: float = 0.0  # seconds between backfill batches
     slack_bot_token: str = ""
     slack_signing_secret: str = ""
     secret_key: str = ""
     debug: bool = False
+    
+    # SQLite connection profile (applied to every new connection, ignored on other databases)
+    sqlite_profile_enabled: bool = True
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout: int = 5000  # milliseconds to wait on a locked database
+    sqlite_mmap_size: int = 268435456  # 256 MiB
+    sqlite_cache_size: int = -64000  # negative values are KiB, so 64 MB of page cache
+    sqlite_temp_store: str = "MEMORY"
+    
+    # Slack HTTP client (shared, pooled connection to slack.com)
+    slack_http_timeout: float = 10.0
+    slack_http_connect_timeout: float = 5.0
+    slack_max_connections: int = 20
+    slack_max_keepalive_connections: int = 10
+    slack_keepalive_expiry: float = 30.0
+    slack_http2: bool = False
+    
+    # Channel assignment
+    slack_invite_concurrency: int = 4
+    slack_invite_batch_size: int = 1000  # Slack accepts up to 1000 users per conversations.invite
+    
+    # Rate limiting (requests per minute per Slack API method, overrides the tier defaults)
+    slack_rate_limits: Dict[str, float] = {}
+    slack_rate_limit_max_retries: int = 3
+    slack_rate_limit_backoff_base: float = 0.5
+    slack_rate_limit_backoff_max: float = 30.0
+    
+    # Email -> Slack user cache
+    slack_user_cache_size: int = 10000
+    slack_user_cache_ttl: float = 900.0
+    slack_user_cache_warm_on_startup: bool = False
+    slack_user_cache_warm_interval: float = 0.0  # seconds between warm-ups, 0 disables the schedule
+    
+    # Channel name -> ID index
+    slack_channel_index_ttl: float = 3600.0
+    slack_channel_index_min_refresh: float = 60.0  # minimum seconds between refreshes triggered by unknown names
+    
+    # Provisioning outbox workers
+    provisioning_workers: int = 4
+    provisioning_poll_interval: float = 1.0
+    provisioning_max_attempts: int = 5
+    provisioning_retry_backoff: float = 5.0
+    provisioning_retry_backoff_max: float = 600.0
+    provisioning_job_timeout: float = 300.0  # running jobs older than this are requeued on startup
+    
+    # Bulk identity import
+    identity_import_chunk_size: int = 500
+    identity_import_max_errors: int = 1000  # per-row errors returned in the response
+    
+    # Identity <-> Slack reconciliation
+    reconcile_batch_size: int = 1000
+    reconcile_sample_size: int = 50
+    
+    # Idempotency-Key handling for provisioning endpoints
+    idempotency_ttl_seconds: float = 86400.0
+    idempotency_lock_timeout: float = 60.0  # an unfinished request older than this may be retried
+    idempotency_purge_interval: float = 3600.0  # seconds between deletions of expired keys; 0 disables
+    idempotency_purge_batch_size: int = 1000
+    
+    # Identity listing
+    identity_page_size: int = 100
+    identity_page_size_max: int = 500
+    
+    # Dashboard aggregations (cached, dropped when identities or employees are written)
+    stats_cache_ttl: float = 30.0
+    
+    # In-memory access review index (entitlement -> identity bitmap)
+    access_index_build_on_startup: bool = True
+    access_index_batch_size: int = 5000  # identities read per query while building or refreshing
+    
+    # Streaming exports
+    export_batch_size: int = 1000
+    
+    # Business role -> entitlements policy (JSON or YAML), re-read when the file changes
+    role_policy_path: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "policies", "roles.json")
+    role_policy_check_interval: float = 2.0  # seconds between file change checks
+    entitlement_reevaluate_batch_size: int = 1000  # identities per transaction when re-evaluating
+    entitlement_reevaluate_sample_size: int = 50
+    policy_simulation_batch_size: int = 5000  # identities fetched per round trip
+    policy_simulation_sample_size: int = 50  # diff groups returned
+    policy_simulation_bucket_sample: int = 5  # example identities per diff group
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,9 +1,83 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from fastapi import Depends, Request
+from itertools import cycle
+import time
 from app.core.config import settings
+from app.core.pool import PoolMonitor, pool_options
 
-engine = create_engine(settings.database_url)
+def sqlite_pragmas() -> dict:
+    """PRAGMA values from the configured SQLite profile."""
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout,
+        "mmap_size": settings.sqlite_mmap_size,
+        "cache_size": settings.sqlite_cache_size,
+        "temp_store": settings.sqlite_temp_store,
+    }
+
+def apply_sqlite_profile(engine, pragmas: dict = None):
+    """Run the SQLite PRAGMA profile on every new connection of a SQLite engine."""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = pragmas if pragmas is not None else sqlite_pragmas()
+    
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+# asyncio drivers used for the async engine when ASYNC_DATABASE_URL is not set
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def async_database_url(url: str) -> str:
+    """Swap the driver of a database URL for its asyncio counterpart."""
+    scheme, separator, rest = url.partition("://")
+    backend = scheme.split("+", 1)[0]
+    return f"{ASYNC_DRIVERS.get(backend, scheme)}{separator}{rest}"
+
+engine = create_engine(settings.database_url, **pool_options(settings.database_url))
+pool_monitor = PoolMonitor()
+pool_monitor.attach(engine)
+if settings.sqlite_profile_enabled:
+    apply_sqlite_profile(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Read replicas, used round-robin by get_read_db
+replica_engines = []
+replica_pool_monitors = []
+for _replica_url in settings.read_replica_urls:
+    _replica = create_engine(_replica_url, **pool_options(_replica_url))
+    _monitor = PoolMonitor()
+    _monitor.attach(_replica)
+    if settings.sqlite_profile_enabled:
+        apply_sqlite_profile(_replica)
+    replica_engines.append(_replica)
+    replica_pool_monitors.append(_monitor)
+ReplicaSessionLocals = [sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in replica_engines]
+_next_replica = cycle(ReplicaSessionLocals)
+
+# Cookie set after a client's write; its reads go to the primary until it expires
+PRIMARY_COOKIE = "iga_read_primary_until"
+
+# Async engine for routes that must not block the event loop
+_async_url = settings.async_database_url or async_database_url(settings.database_url)
+async_engine = create_async_engine(_async_url, **pool_options(_async_url, asyncio=True))
+async_pool_monitor = PoolMonitor()
+async_pool_monitor.attach(async_engine.sync_engine)
+if settings.sqlite_profile_enabled:
+    apply_sqlite_profile(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 def get_db():
@@ -11,4 +85,29 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def reads_pinned_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def get_read_db(request: Request, primary: Session = Depends(get_db)):
+    """
+    Session for read-only routes: a read replica when configured, otherwise the
+    primary. Clients that wrote within read_replica_sticky_seconds read from the
+    primary so they see their own writes.
+    """
+    if not ReplicaSessionLocals or reads_pinned_to_primary(request):
+        yield primary
+        return
+    db = next(_next_replica)()
+    try:
+        yield db
+    finally:
+        db.close()
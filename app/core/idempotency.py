@@ -0,0 +1,76 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.repository.idempotency import IdempotencyRepository
+from app.repository.provisioning import utcnow
+from datetime import timedelta
+from typing import Optional, Dict, Any
+import hashlib
+import json
+
+def purge_expired_keys() -> int:
+    """Delete expired Idempotency-Key records; run periodically from the app lifespan"""
+    db = SessionLocal()
+    try:
+        return IdempotencyRepository(db).purge_expired(settings.idempotency_lock_timeout, settings.idempotency_purge_batch_size)
+    finally:
+        db.close()
+
+class IdempotencyGuard:
+    """
+    Replays the stored response for a repeated Idempotency-Key.
+    
+    Usage in a route: return `guard.replay()` when it is not None, otherwise run the
+    operation and call `complete()` on success or `release()` on failure.
+    Without a key every call is a no-op.
+    """
+    
+    def __init__(self, db: Session, scope: str, key: Optional[str], payload: Dict[str, Any]):
+        self.repository = IdempotencyRepository(db)
+        self.scope = scope
+        self.key = key
+        self.request_hash = hashlib.sha256(
+            json.dumps(payload, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        self.record = None
+    
+    def replay(self) -> Optional[JSONResponse]:
+        if not self.key:
+            return None
+        ttl = settings.idempotency_ttl_seconds
+        record, reserved = self.repository.reserve(self.scope, self.key, self.request_hash, ttl)
+        if reserved:
+            self.record = record
+            return None
+        
+        now = utcnow()
+        abandoned = (
+            record.status == "in_progress"
+            and record.locked_at < now - timedelta(seconds=settings.idempotency_lock_timeout)
+        )
+        if record.expires_at <= now or abandoned:
+            if self.repository.take_over(record, self.request_hash, ttl):
+                self.record = record
+                return None
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+        
+        if record.request_hash != self.request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if record.status != "completed":
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is in progress")
+        return JSONResponse(
+            status_code=record.status_code,
+            content=record.response,
+            headers={"Idempotent-Replayed": "true"}
+        )
+    
+    def complete(self, status_code: int, response: Dict[str, Any]):
+        if self.record is not None:
+            self.repository.complete(self.record, status_code, response)
+    
+    def release(self):
+        if self.record is not None:
+            self.repository.release(self.record)
+            self.record = None
@@ -0,0 +1,203 @@
+"""
+Versioned schema migrations.
+
+Each migration has a version number and an `upgrade(engine)` function and is
+recorded in `schema_migrations` once applied. Pending migrations run in version
+order at startup (see `migrate_on_startup`) or with `python update_db.py`.
+
+Migrations must be safe to run again after a crash halfway through: use the
+helpers below, which skip tables, columns and indexes that already exist, and
+`backfill()` to rewrite data in short batches instead of one long transaction.
+A fresh database gets the current schema from the baseline, so later
+migrations find their changes already in place and only record themselves.
+"""
+from sqlalchemy import Column, Index, Table, delete, inspect, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import ColumnElement
+from app.core.config import settings
+from app.core.database import Base
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import time
+
+# Every model must be imported so the baseline sees the full schema
+from app.models.identity import Identity, IdentityEntitlement, TargetApplication
+from app.models.employee import Employee
+from app.models.provisioning import ProvisioningJob, ProvisioningJobIdentity
+from app.models.idempotency import IdempotencyKey
+from app.models.migration import SchemaMigration
+from app.repository.entitlements import entitlement_rows
+
+logger = logging.getLogger(__name__)
+
+class Migration:
+    def __init__(self, version: int, description: str, upgrade: Callable[[Engine], None]):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, description: str):
+    """Register an upgrade function as the migration with this version"""
+    def register(upgrade: Callable[[Engine], None]):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append(Migration(version, description, upgrade))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return upgrade
+    return register
+
+# Idempotent schema helpers
+
+def add_column(engine: Engine, table: Table, column: Column):
+    """ALTER TABLE ... ADD COLUMN unless the column exists"""
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    if column.name in existing:
+        return
+    column_type = column.type.compile(dialect=engine.dialect)
+    ddl = f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    with engine.begin() as conn:
+        conn.exec_driver_sql(ddl)
+
+def create_index(engine: Engine, index: Index):
+    """CREATE INDEX unless an index with this name exists"""
+    with engine.begin() as conn:
+        index.create(conn, checkfirst=True)
+
+def backfill(
+    engine: Engine,
+    table: Table,
+    values: Optional[Dict[str, Any]] = None,
+    where: Optional[ColumnElement] = None,
+    batch_size: Optional[int] = None,
+    pause: Optional[float] = None,
+    each_batch: Optional[Callable[[Connection, List[Any]], None]] = None
+) -> int:
+    """
+    UPDATE table SET values in primary-key order, one short transaction per batch.
+    
+    `values` may hold SQL expressions (e.g. another column) to copy data.
+    `each_batch(conn, ids)` runs in the same transaction for writes an UPDATE of
+    this table cannot express, e.g. filling another table from these rows. Locks
+    are held for one batch at a time, so live traffic interleaves with the
+    backfill. Returns the number of rows processed.
+    """
+    batch_size = batch_size or settings.migration_batch_size
+    pause = settings.migration_batch_pause if pause is None else pause
+    pk = table.primary_key.columns.values()[0]
+    last_id = None
+    total = 0
+    while True:
+        query = select(pk).order_by(pk).limit(batch_size)
+        if where is not None:
+            query = query.where(where)
+        if last_id is not None:
+            query = query.where(pk > last_id)
+        with engine.begin() as conn:
+            ids = conn.execute(query).scalars().all()
+            if not ids:
+                break
+            if values:
+                conn.execute(update(table).where(pk.in_(ids)).values(**values))
+            if each_batch is not None:
+                each_batch(conn, ids)
+        total += len(ids)
+        last_id = ids[-1]
+        logger.info(f"Backfilled {total} rows of {table.name}")
+        if pause:
+            time.sleep(pause)
+    return total
+
+# Migrations, oldest first
+
+@migration(1, "Baseline schema")
+def baseline(engine: Engine):
+    Base.metadata.create_all(bind=engine)
+
+@migration(2, "Keyset pagination indexes on identities")
+def identity_listing_indexes(engine: Engine):
+    names = {
+        "ix_identities_business_role_id",
+        "ix_identities_department_id",
+        "ix_identities_location_id",
+        "ix_identities_employment_status_id",
+        "ix_identities_is_active_id",
+    }
+    for index in Identity.__table__.indexes:
+        if index.name in names:
+            create_index(engine, index)
+
+@migration(3, "Role policy version on identities")
+def identity_policy_version(engine: Engine):
+    table = Identity.__table__
+    add_column(engine, table, table.c.policy_version)
+
+@migration(4, "Normalized identity_entitlements table")
+def identity_entitlements_table(engine: Engine):
+    table = IdentityEntitlement.__table__
+    table.create(bind=engine, checkfirst=True)
+    identities = Identity.__table__
+    
+    def copy_entitlements(conn: Connection, ids: List[int]):
+        # Existing rows of the batch are replaced, so a rerun after a crash is safe
+        batch = conn.execute(select(identities.c.id, identities.c.entitlements).where(identities.c.id.in_(ids))).all()
+        conn.execute(delete(table).where(table.c.identity_id.in_(ids)))
+        rows = [row for identity_id, entitlements in batch for row in entitlement_rows(identity_id, entitlements)]
+        if rows:
+            conn.execute(table.insert(), rows)
+    
+    backfill(engine, identities, each_batch=copy_entitlements)
+
+@migration(5, "Identities covered by bulk provisioning jobs")
+def provisioning_job_identities_table(engine: Engine):
+    ProvisioningJobIdentity.__table__.create(bind=engine, checkfirst=True)
+
+@migration(6, "Index idempotency keys by expiry for the purge")
+def idempotency_keys_expiry_index(engine: Engine):
+    for index in IdempotencyKey.__table__.indexes:
+        if index.name == "ix_idempotency_keys_expires_at":
+            create_index(engine, index)
+
+# Runner
+
+def applied_versions(engine: Engine) -> List[int]:
+    SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(SchemaMigration.version)).scalars().all())
+
+def pending_migrations(engine: Engine) -> List[Migration]:
+    applied = set(applied_versions(engine))
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+def run_migrations(engine: Engine) -> List[int]:
+    """Apply pending migrations in order; returns the versions applied"""
+    applied = []
+    for m in pending_migrations(engine):
+        logger.info(f"Applying migration {m.version}: {m.description}")
+        m.upgrade(engine)
+        try:
+            with engine.begin() as conn:
+                conn.execute(SchemaMigration.__table__.insert().values(version=m.version, description=m.description))
+        except IntegrityError:
+            # Another process applied it concurrently; the helpers made our run a no-op
+            logger.info(f"Migration {m.version} already recorded")
+            continue
+        applied.append(m.version)
+    return applied
+
+def migration_status(engine: Engine) -> Dict[str, Any]:
+    applied = applied_versions(engine)
+    return {
+        "current_version": applied[-1] if applied else None,
+        "applied": applied,
+        "pending": [{"version": m.version, "description": m.description} for m in MIGRATIONS if m.version not in applied]
+    }
+
+if __name__ == "__main__":
+    from app.core.database import engine
+    logging.basicConfig(level=logging.INFO)
+    print(f"Applied migrations: {run_migrations(engine) or 'none, schema is up to date'}")
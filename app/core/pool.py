@@ -0,0 +1,152 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from app.core.config import settings
+from typing import Dict, Any, Optional
+import threading
+import time
+
+class PoolMonitor:
+    """Checkout, wait and connection-age statistics for one engine's pool"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connected_at: Dict[int, float] = {}
+        self._checked_out_at: Dict[int, float] = {}
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.connections_invalidated = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.pool = None
+    
+    def attach(self, engine):
+        self.pool = engine.pool
+        engine.pool._monitor = self
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "close", self._on_close)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+    
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+    
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connections_opened += 1
+            self._connected_at[id(connection_record)] = time.monotonic()
+    
+    def _on_close(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connections_closed += 1
+            self._connected_at.pop(id(connection_record), None)
+    
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.connections_invalidated += 1
+    
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self._checked_out_at[id(connection_record)] = time.monotonic()
+    
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self._checked_out_at.pop(id(connection_record), None)
+    
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        pool = self.pool
+        with self._lock:
+            ages = [now - started for started in self._connected_at.values()]
+            holds = [now - started for started in self._checked_out_at.values()]
+            waits, wait_total, wait_max = self.waits, self.wait_total, self.wait_max
+            counters = {
+                "checkouts": self.checkouts,
+                "connections_opened": self.connections_opened,
+                "connections_closed": self.connections_closed,
+                "connections_invalidated": self.connections_invalidated,
+                "timeouts": self.timeouts,
+            }
+        
+        stats: Dict[str, Any] = {"pool_class": type(pool).__name__ if pool else None}
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            })
+        else:
+            stats["checked_out"] = len(holds)
+        stats.update(counters)
+        stats["wait_ms"] = {
+            "count": waits,
+            "avg": round(wait_total / waits * 1000, 3) if waits else 0.0,
+            "max": round(wait_max * 1000, 3),
+        }
+        stats["connection_age_s"] = {
+            "open": len(ages),
+            "avg": round(sum(ages) / len(ages), 1) if ages else 0.0,
+            "max": round(max(ages), 1) if ages else 0.0,
+        }
+        stats["longest_checkout_s"] = round(max(holds), 3) if holds else 0.0
+        return stats
+
+class _MonitoredPoolMixin:
+    """Times every pool get, including the wait when all connections are checked out"""
+    _monitor: Optional[PoolMonitor] = None
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self._monitor is not None:
+                self._monitor.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if self._monitor is not None:
+            self._monitor.record_wait(time.perf_counter() - started)
+        return connection
+    
+    def recreate(self):
+        pool = super().recreate()
+        pool._monitor = self._monitor
+        if self._monitor is not None:
+            self._monitor.pool = pool
+        return pool
+
+class MonitoredQueuePool(_MonitoredPoolMixin, QueuePool):
+    pass
+
+class MonitoredAsyncQueuePool(_MonitoredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+def pool_options(url: str, asyncio: bool = False) -> Dict[str, Any]:
+    """create_engine() pool arguments from Settings; in-memory SQLite keeps its default pool"""
+    if is_memory_sqlite(url):
+        return {}
+    return {
+        "poolclass": MonitoredAsyncQueuePool if asyncio else MonitoredQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
@@ -0,0 +1,34 @@
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.database import PRIMARY_COOKIE
+import time
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+class StickyPrimaryMiddleware:
+    """
+    After a successful write request, sets a short-lived cookie that makes
+    get_read_db route the client's reads to the primary (read-your-writes
+    while replicas catch up).
+    """
+    
+    def __init__(self, app: ASGIApp, sticky_seconds: float = None):
+        self.app = app
+        self.sticky_seconds = settings.read_replica_sticky_seconds if sticky_seconds is None else sticky_seconds
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_with_cookie(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.sticky_seconds
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{PRIMARY_COOKIE}={until:.3f}; Max-Age={int(self.sticky_seconds) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                )
+            await send(message)
+        
+        await self.app(scope, receive, send_with_cookie)
@@ -5,6 +5,16 @@ from app.api.identity import router as identity_router
 from app.api.slack import router as slack_router
 from app.api.employee import router as employee_router
 from app.api.database import router as database_router
+from app.api.access import router as access_router
+from app.service.slack import slack_service
+from app.service.provisioning import provisioning_workers
+from app.service.access_index import access_index
+from app.core.database import engine, async_engine, SessionLocal
+from app.core.migrations import run_migrations
+from app.core.idempotency import purge_expired_keys
+from app.core.replicas import StickyPrimaryMiddleware
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 import os
 
@@ -12,27 +22,59 @@ import os
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize database on startup
-try:
-    from app.core.database import engine, Base
-    from app.models.identity import Identity, TargetApplication
-    from sqlalchemy import inspect
-    import os
-    
+def build_access_index():
+    db = SessionLocal()
+    try:
+        access_index.build(db)
+    finally:
+        db.close()
+
+async def purge_idempotency_keys(interval: float):
+    """Delete expired Idempotency-Key records every `interval` seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            purged = await asyncio.to_thread(purge_expired_keys)
+            if purged:
+                logger.info(f"Purged {purged} expired idempotency keys")
+        except Exception as e:
+            logger.error(f"Idempotency key purge failed: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     # Create data directory if it doesn't exist
     os.makedirs("data", exist_ok=True)
+    if settings.migrate_on_startup:
+        # Off the event loop; pending migrations only, no per-table inspection
+        try:
+            applied = await asyncio.to_thread(run_migrations, engine)
+            logger.info(f"Applied database migrations: {applied}" if applied else "Database schema is up to date")
+        except Exception as e:
+            logger.error(f"Database migration error: {str(e)}")
     
-    inspector = inspect(engine)
-    existing_tables = inspector.get_table_names()
+    if settings.access_index_build_on_startup:
+        try:
+            await asyncio.to_thread(build_access_index)
+        except Exception as e:
+            # Built on first use instead
+            logger.error(f"Access index build failed: {str(e)}")
     
-    if 'identities' not in existing_tables:
-        logger.info("Initializing database tables...")
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database initialized successfully!")
-    else:
-        logger.info("Database tables already exist")
-except Exception as e:
-    logger.error(f"Database initialization error: {str(e)}")
+    # One pooled Slack client for the whole process
+    await slack_service.start()
+    if settings.slack_bot_token and settings.slack_user_cache_warm_on_startup:
+        slack_service.start_cache_warmer(settings.slack_user_cache_warm_interval)
+    await provisioning_workers.start()
+    purge_task = None
+    if settings.idempotency_purge_interval > 0:
+        purge_task = asyncio.create_task(purge_idempotency_keys(settings.idempotency_purge_interval))
+    try:
+        yield
+    finally:
+        if purge_task is not None:
+            purge_task.cancel()
+        await provisioning_workers.stop()
+        await slack_service.close()
+        await async_engine.dispose()
 
 app = FastAPI(
     title="IGA System - Identity Governance & Administration",
@@ -74,6 +116,7 @@ app = FastAPI(
     },
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
     openapi_tags=[
         {
             "name": "Identity Management",
@@ -87,6 +130,10 @@ app = FastAPI(
             "name": "Employee Management",
             "description": "Complete employee lifecycle management including personal information, skills, and leave management."
         },
+        {
+            "name": "Access Review",
+            "description": "Instant who-has-what queries and set operations over entitlements, served from an in-memory index."
+        },
         {
             "name": "Database Administration",
             "description": "Database initialization and management endpoints for system administrators."
@@ -98,10 +145,14 @@ app = FastAPI(
     ]
 )
 
+if settings.read_replica_urls:
+    app.add_middleware(StickyPrimaryMiddleware)
+
 app.include_router(identity_router, prefix="/api/v1/identity", tags=["Identity Management"])
 app.include_router(slack_router, prefix="/api/v1/slack", tags=["Slack Integration"])
 app.include_router(employee_router, prefix="/api/v1/employee", tags=["Employee Management"])
 app.include_router(database_router, prefix="/api/v1/admin", tags=["Database Administration"])
+app.include_router(access_router, prefix="/api/v1/access", tags=["Access Review"])
 
 @app.get("/", response_class=HTMLResponse, include_in_schema=False)
 async def homepage():
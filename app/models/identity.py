@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, Date, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -38,6 +38,7 @@ class Identity(Base):
     # Business Role & Entitlements (existing)
     business_role = Column(String, index=True)
     entitlements = Column(JSON)
+    policy_version = Column(String, nullable=True)  # role policy version the entitlements were derived from
     is_active = Column(Boolean, default=True)
     
     # Audit Fields
@@ -47,6 +48,36 @@ class Identity(Base):
     last_modified_by = Column(String, default="system")
     
     # Relationships - removed for simplicity
+    
+    # Keyset pagination: filter column first, then the id cursor
+    __table_args__ = (
+        Index("ix_identities_business_role_id", "business_role", "id"),
+        Index("ix_identities_department_id", "department", "id"),
+        Index("ix_identities_location_id", "location", "id"),
+        Index("ix_identities_employment_status_id", "employment_status", "id"),
+        Index("ix_identities_is_active_id", "is_active", "id"),
+    )
+
+class IdentityEntitlement(Base):
+    """
+    One entitlement of an identity, e.g. ("slack", "channels", "#devops") or
+    ("iga", "permissions", "write"). Mirrors Identity.entitlements, which stays
+    the document returned by the API; these rows make holder lookups an index scan.
+    """
+    __tablename__ = "identity_entitlements"
+    
+    id = Column(Integer, primary_key=True)
+    identity_id = Column(Integer, ForeignKey("identities.id", ondelete="CASCADE"), nullable=False)
+    application = Column(String, nullable=False)
+    type = Column(String, nullable=False)
+    value = Column(String, nullable=False)
+    
+    __table_args__ = (
+        # Entitlements of one identity; also keeps rows unique
+        Index("ux_identity_entitlements_identity", "identity_id", "application", "type", "value", unique=True),
+        # Holders of one entitlement, in id order for keyset pages
+        Index("ix_identity_entitlements_holders", "application", "type", "value", "identity_id"),
+    )
 
 class TargetApplication(Base):
     __tablename__ = "target_applications"
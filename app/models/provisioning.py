@@ -0,0 +1,45 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class ProvisioningJob(Base):
+    """Outbox row written in the same transaction as the identity change it provisions"""
+    __tablename__ = "provisioning_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    identity_id = Column(Integer, ForeignKey('identities.id', ondelete="SET NULL"), nullable=True)
+    operation = Column(String, nullable=False)  # provision, ...
+    payload = Column(JSON)
+    
+    # pending -> running -> succeeded | pending (retry) | dead
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    next_attempt_at = Column(DateTime, nullable=False)  # naive UTC
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(JSON, nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Identities a bulk job provisions; they are ordered like identity_id
+    identity_links = relationship("ProvisioningJobIdentity", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("ix_provisioning_jobs_status_next_attempt", "status", "next_attempt_at"),
+        Index("ix_provisioning_jobs_identity_status", "identity_id", "status"),
+    )
+
+class ProvisioningJobIdentity(Base):
+    """One identity covered by a multi-identity (bulk) provisioning job"""
+    __tablename__ = "provisioning_job_identities"
+    
+    job_id = Column(Integer, ForeignKey('provisioning_jobs.id', ondelete="CASCADE"), primary_key=True)
+    identity_id = Column(Integer, ForeignKey('identities.id', ondelete="CASCADE"), primary_key=True)
+    
+    __table_args__ = (
+        Index("ix_provisioning_job_identities_identity", "identity_id"),
+    )
@@ -0,0 +1,27 @@
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Any, Dict
+
+def changed_values(instance: Any, values: Dict[str, Any]) -> Dict[str, Any]:
+    """The submitted values that differ from the loaded row"""
+    return {field: value for field, value in values.items() if getattr(instance, field) != value}
+
+def update_returning(instance: Any, changes: Dict[str, Any]):
+    """
+    UPDATE of the changed columns only, returning them plus any onupdate columns
+    (e.g. updated_at) so the instance can be brought up to date without a refresh
+    """
+    table = type(instance).__table__
+    returned = [table.c[field] for field in changes]
+    returned += [column for column in table.c if column.onupdate is not None and column.name not in changes]
+    return (
+        update(table)
+        .where(table.c.id == instance.id)
+        .values(**changes)
+        .returning(*returned)
+    )
+
+def apply_returned(instance: Any, row) -> None:
+    """Store RETURNING values as the loaded state, so they are not flushed again"""
+    for field, value in row._mapping.items():
+        set_committed_value(instance, field, value)
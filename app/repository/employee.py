@@ -1,7 +1,11 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.employee import Employee, EmployeeSkill, EmployeeLeave, Department
 from app.schemas.employee import EmployeeCreate, EmployeeUpdate, EmployeeSkillCreate, EmployeeLeaveCreate
-from typing import Optional, List
+from app.repository.base import changed_values, update_returning, apply_returned
+from app.repository.hooks import mark_written
+from typing import Optional, List, Dict, Any
 
 class EmployeeRepository:
     def __init__(self, db: Session):
@@ -10,12 +14,14 @@ class EmployeeRepository:
     def create_employee(self, employee: EmployeeCreate) -> Employee:
         db_employee = Employee(**employee.model_dump())
         self.db.add(db_employee)
+        self.db.flush()
+        mark_written(self.db, "employees", [db_employee.id])
         self.db.commit()
         self.db.refresh(db_employee)
         return db_employee
     
     def get_employee_by_id(self, employee_id: int) -> Optional[Employee]:
-        return self.db.query(Employee).filter(Employee.id == employee_id).first()
+        return self.db.get(Employee, employee_id)
     
     def get_employee_by_emp_id(self, emp_id: str) -> Optional[Employee]:
         return self.db.query(Employee).filter(Employee.employee_id == emp_id).first()
@@ -29,13 +35,21 @@ class EmployeeRepository:
     def get_all_employees(self, skip: int = 0, limit: int = 100) -> List[Employee]:
         return self.db.query(Employee).filter(Employee.is_active == True).offset(skip).limit(limit).all()
     
+    def count_by(self, field: str) -> Dict[Any, int]:
+        """Number of employees per value of a column, one GROUP BY"""
+        column = getattr(Employee, field)
+        return dict(self.db.execute(select(column, func.count()).group_by(column)).all())
+    
     def update_employee(self, employee_id: int, update_data: EmployeeUpdate) -> Optional[Employee]:
+        """One UPDATE ... RETURNING of the changed columns, skipped when nothing changed"""
         employee = self.get_employee_by_id(employee_id)
-        if employee:
-            for field, value in update_data.model_dump(exclude_unset=True).items():
-                setattr(employee, field, value)
+        if not employee:
+            return None
+        changes = changed_values(employee, update_data.model_dump(exclude_unset=True))
+        if changes:
+            apply_returned(employee, self.db.execute(update_returning(employee, changes)).one())
+            mark_written(self.db, "employees", [employee_id])
             self.db.commit()
-            self.db.refresh(employee)
         return employee
     
     def deactivate_employee(self, employee_id: int) -> bool:
@@ -43,6 +57,7 @@ class EmployeeRepository:
         if employee:
             employee.is_active = False
             employee.employment_status = "Terminated"
+            mark_written(self.db, "employees", [employee_id])
             self.db.commit()
             return True
         return False
@@ -59,4 +74,19 @@ class EmployeeRepository:
         self.db.add(db_leave)
         self.db.commit()
         self.db.refresh(db_leave)
-        return db_leave
\ No newline at end of file
+        return db_leave
+
+class AsyncEmployeeRepository:
+    """EmployeeRepository on an AsyncSession, for async routes"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def create_employee(self, employee: EmployeeCreate) -> Employee:
+        db_employee = Employee(**employee.model_dump())
+        self.db.add(db_employee)
+        await self.db.flush()
+        mark_written(self.db, "employees", [db_employee.id])
+        await self.db.commit()
+        await self.db.refresh(db_employee)
+        return db_employee
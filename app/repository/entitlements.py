@@ -0,0 +1,107 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, delete, func
+from app.models.identity import Identity, IdentityEntitlement
+from typing import Optional, List, Dict, Any
+
+# Top-level lists in the entitlements document (e.g. "permissions") belong to the IGA itself
+CORE_APPLICATION = "iga"
+
+def entitlement_rows(identity_id: int, entitlements: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Flatten an entitlements document into identity_entitlements rows:
+    {"slack": {"channels": [...]}} -> ("slack", "channels", value),
+    {"permissions": [...]} -> ("iga", "permissions", value)
+    """
+    rows, seen = [], set()
+    for key, spec in (entitlements or {}).items():
+        if isinstance(spec, list):
+            groups = [(CORE_APPLICATION, key, spec)]
+        elif isinstance(spec, dict):
+            groups = [(key, kind, values) for kind, values in spec.items() if isinstance(values, list)]
+        else:
+            continue
+        for application, kind, values in groups:
+            for value in values:
+                entry = (application, kind, str(value))
+                if entry not in seen:
+                    seen.add(entry)
+                    rows.append({"identity_id": identity_id, "application": application, "type": kind, "value": str(value)})
+    return rows
+
+def _replace_statements(entitlements_by_identity: Dict[int, Optional[Dict[str, Any]]]):
+    table = IdentityEntitlement.__table__
+    rows = [
+        row
+        for identity_id, entitlements in entitlements_by_identity.items()
+        for row in entitlement_rows(identity_id, entitlements)
+    ]
+    return delete(table).where(table.c.identity_id.in_(list(entitlements_by_identity))), insert(table), rows
+
+class IdentityEntitlementRepository:
+    """Keeps identity_entitlements in step with Identity.entitlements and answers holder queries"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def replace(self, entitlements_by_identity: Dict[int, Optional[Dict[str, Any]]]):
+        """Rewrite the rows of the given identities in the current transaction; caller commits"""
+        if not entitlements_by_identity:
+            return
+        delete_stmt, insert_stmt, rows = _replace_statements(entitlements_by_identity)
+        self.db.execute(delete_stmt)
+        if rows:
+            self.db.execute(insert_stmt, rows)
+
+    def holders_page(self, application: str, type: str, value: str, after_id: Optional[int], limit: int) -> List[Identity]:
+        """
+        Keyset page of identities holding one entitlement, read from the holders index.
+        Fetches one extra row so the caller can tell whether another page exists.
+        """
+        query = (
+            select(Identity)
+            .join(IdentityEntitlement, IdentityEntitlement.identity_id == Identity.id)
+            .where(
+                IdentityEntitlement.application == application,
+                IdentityEntitlement.type == type,
+                IdentityEntitlement.value == value
+            )
+        )
+        if after_id is not None:
+            query = query.where(IdentityEntitlement.identity_id > after_id)
+        return self.db.execute(query.order_by(IdentityEntitlement.identity_id).limit(limit + 1)).scalars().all()
+
+    def stream_all(self, batch_size: int):
+        """Every (identity_id, application, type, value) row, fetched batch_size rows at a time"""
+        # Core rows on the session's connection, skipping ORM result processing
+        result = self.db.connection().execute(
+            select(
+                IdentityEntitlement.identity_id, IdentityEntitlement.application,
+                IdentityEntitlement.type, IdentityEntitlement.value
+            ).execution_options(yield_per=batch_size)
+        )
+        for partition in result.partitions():
+            yield from partition
+
+    def count_holders(self, application: str, type: str, value: str) -> int:
+        return self.db.execute(
+            select(func.count()).select_from(IdentityEntitlement).where(
+                IdentityEntitlement.application == application,
+                IdentityEntitlement.type == type,
+                IdentityEntitlement.value == value
+            )
+        ).scalar_one()
+
+class AsyncIdentityEntitlementRepository:
+    """IdentityEntitlementRepository writes on an AsyncSession"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def replace(self, entitlements_by_identity: Dict[int, Optional[Dict[str, Any]]]):
+        if not entitlements_by_identity:
+            return
+        delete_stmt, insert_stmt, rows = _replace_statements(entitlements_by_identity)
+        await self.db.execute(delete_stmt)
+        if rows:
+            await self.db.execute(insert_stmt, rows)
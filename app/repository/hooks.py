@@ -0,0 +1,45 @@
+"""
+Write hooks: callbacks that run after a transaction that wrote rows of a table commits.
+
+Repositories call `mark_written(db, table, ids)` next to each write, including
+Core INSERT/UPDATE statements that ORM events do not see. The IDs collect on the
+session and the hooks get them once the commit succeeds; a rollback drops them.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from typing import Callable, Dict, Iterable, List, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+WriteHook = Callable[[Set[int]], None]
+
+_hooks: Dict[str, List[WriteHook]] = {}
+
+def on_write(table: str):
+    """Register a function called with the written IDs after each commit touching `table`"""
+    def register(hook: WriteHook) -> WriteHook:
+        _hooks.setdefault(table, []).append(hook)
+        return hook
+    return register
+
+def mark_written(db, table: str, ids: Iterable[int]):
+    # AsyncSession keeps its state on the wrapped sync Session
+    session = getattr(db, "sync_session", db)
+    session.info.setdefault("written", {}).setdefault(table, set()).update(ids)
+
+@event.listens_for(Session, "after_commit")
+def _run_write_hooks(session: Session):
+    written = session.info.pop("written", None)
+    if not written:
+        return
+    for table, ids in written.items():
+        for hook in _hooks.get(table, []):
+            try:
+                hook(ids)
+            except Exception as e:
+                logger.error(f"Write hook {hook.__name__} for {table} failed: {str(e)}")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written(session: Session):
+    session.info.pop("written", None)
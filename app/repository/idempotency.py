@@ -0,0 +1,91 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, or_
+from sqlalchemy.exc import IntegrityError
+from app.models.idempotency import IdempotencyKey
+from app.repository.provisioning import utcnow
+from typing import Optional, Dict, Any, Tuple
+from datetime import timedelta
+
+class IdempotencyRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get(self, scope: str, key: str) -> Optional[IdempotencyKey]:
+        return self.db.query(IdempotencyKey).filter(IdempotencyKey.scope == scope, IdempotencyKey.key == key).first()
+    
+    def reserve(self, scope: str, key: str, request_hash: str, ttl_seconds: float) -> Tuple[IdempotencyKey, bool]:
+        """
+        Claim a key for a new request, returns (record, reserved).
+        
+        reserved is False when another request already holds or completed the key;
+        the unique constraint on (scope, key) settles concurrent first requests.
+        """
+        now = utcnow()
+        record = IdempotencyKey(
+            scope=scope,
+            key=key,
+            request_hash=request_hash,
+            status="in_progress",
+            locked_at=now,
+            expires_at=now + timedelta(seconds=ttl_seconds)
+        )
+        self.db.add(record)
+        try:
+            self.db.commit()
+            return record, True
+        except IntegrityError:
+            self.db.rollback()
+            return self.get(scope, key), False
+    
+    def take_over(self, record: IdempotencyKey, request_hash: str, ttl_seconds: float) -> bool:
+        """Reuse an expired or abandoned record for a new request"""
+        now = utcnow()
+        updated = self.db.query(IdempotencyKey).filter(
+            IdempotencyKey.id == record.id,
+            IdempotencyKey.locked_at == record.locked_at
+        ).update({
+            "request_hash": request_hash,
+            "status": "in_progress",
+            "status_code": None,
+            "response": None,
+            "locked_at": now,
+            "expires_at": now + timedelta(seconds=ttl_seconds)
+        }, synchronize_session="fetch")
+        self.db.commit()
+        return bool(updated)
+    
+    def complete(self, record: IdempotencyKey, status_code: int, response: Dict[str, Any]):
+        record.status = "completed"
+        record.status_code = status_code
+        record.response = response
+        self.db.commit()
+    
+    def release(self, record: IdempotencyKey):
+        """Forget a key whose request failed so the client can retry with it"""
+        self.db.delete(record)
+        self.db.commit()
+    
+    def purge_expired(self, lock_timeout: float, batch_size: int = 1000) -> int:
+        """
+        Delete expired records, one short transaction per batch; returns the number deleted.
+        Records of requests still running (locked within `lock_timeout`) are kept.
+        """
+        total = 0
+        while True:
+            now = utcnow()
+            ids = (
+                select(IdempotencyKey.id)
+                .where(
+                    IdempotencyKey.expires_at <= now,
+                    or_(
+                        IdempotencyKey.status != "in_progress",
+                        IdempotencyKey.locked_at < now - timedelta(seconds=lock_timeout)
+                    )
+                )
+                .limit(batch_size)
+            )
+            deleted = self.db.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids))).rowcount
+            self.db.commit()
+            total += deleted
+            if deleted < batch_size:
+                return total
@@ -1,21 +1,130 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, bindparam, or_, func, true
+from sqlalchemy.dialects import postgresql, sqlite
 from app.models.identity import Identity, TargetApplication
 from app.schemas.identity import IdentityCreate, IdentityUpdate
-from typing import Optional, List
+from app.repository.base import changed_values, update_returning, apply_returned
+from app.repository.hooks import mark_written
+from app.repository.entitlements import IdentityEntitlementRepository, AsyncIdentityEntitlementRepository
+from typing import Optional, List, Dict, Any, Tuple, Set
+
+def _update_values(update_data: IdentityUpdate, policy_version: Optional[str]) -> Dict[str, Any]:
+    values = update_data.model_dump(exclude_unset=True)
+    if policy_version is not None:
+        values["policy_version"] = policy_version
+    return values
 
 class IdentityRepository:
     def __init__(self, db: Session):
         self.db = db
     
-    def create(self, identity: IdentityCreate) -> Identity:
-        db_identity = Identity(**identity.model_dump())
+    def create(self, identity: IdentityCreate, commit: bool = True, policy_version: Optional[str] = None) -> Identity:
+        db_identity = Identity(**identity.model_dump(), policy_version=policy_version)
         self.db.add(db_identity)
+        # Flush so the ID is available within the transaction
+        self.db.flush()
+        IdentityEntitlementRepository(self.db).replace({db_identity.id: db_identity.entitlements})
+        mark_written(self.db, "identities", [db_identity.id])
+        if not commit:
+            return db_identity
         self.db.commit()
         self.db.refresh(db_identity)
         return db_identity
     
+    def bulk_create(self, rows: List[Dict[str, Any]]) -> List[Tuple[int, str]]:
+        """Insert rows with one multi-row INSERT, returns (id, primary_email) per row; caller commits"""
+        if not rows:
+            return []
+        result = self.db.execute(
+            insert(Identity).values(rows).returning(Identity.id, Identity.primary_email)
+        )
+        created = [tuple(row) for row in result]
+        entitlements = {row["primary_email"]: row.get("entitlements") for row in rows}
+        IdentityEntitlementRepository(self.db).replace({identity_id: entitlements[email] for identity_id, email in created})
+        mark_written(self.db, "identities", [identity_id for identity_id, _ in created])
+        return created
+    
+    def bulk_upsert(self, rows: List[Dict[str, Any]], chunk_size: int = 500) -> Dict[str, Dict[str, Any]]:
+        """
+        Insert or update rows keyed on employee_id with INSERT ... ON CONFLICT DO UPDATE.
+        
+        Rows must share the same keys. Each chunk is compared with the stored rows first:
+        unchanged rows are not written, and rows whose primary_email belongs to another
+        employee_id go to `conflicts`. Returns employee_id -> id for `inserted`, `updated`
+        and `unchanged`, employee_id -> message for `conflicts`, and the stored values of
+        updated rows in `previous`. Caller commits.
+        """
+        result = {"inserted": {}, "updated": {}, "unchanged": {}, "conflicts": {}, "previous": {}}
+        for start in range(0, len(rows), chunk_size):
+            self._upsert_chunk(rows[start:start + chunk_size], result)
+        return result
+    
+    def _upsert_chunk(self, rows: List[Dict[str, Any]], result: Dict[str, Dict[str, Any]]):
+        table = Identity.__table__
+        fields = list(rows[0])
+        stored = self.db.execute(
+            select(table.c.id, *[table.c[field] for field in fields if field not in ("employee_id", "primary_email")],
+                   table.c.employee_id, table.c.primary_email)
+            .where(or_(
+                table.c.employee_id.in_([row["employee_id"] for row in rows]),
+                table.c.primary_email.in_([row["primary_email"] for row in rows])
+            ))
+        ).all()
+        by_employee_id = {row.employee_id: row._mapping for row in stored}
+        email_owner = {row.primary_email: row.employee_id for row in stored}
+        
+        to_write = []
+        for row in rows:
+            employee_id = row["employee_id"]
+            owner = email_owner.get(row["primary_email"])
+            if owner is not None and owner != employee_id:
+                result["conflicts"][employee_id] = f"primary_email '{row['primary_email']}' belongs to employee_id '{owner}'"
+                continue
+            current = by_employee_id.get(employee_id)
+            if current is not None:
+                if all(current[field] == row[field] for field in fields):
+                    result["unchanged"][employee_id] = current["id"]
+                    continue
+                result["previous"][employee_id] = {field: current[field] for field in fields}
+            to_write.append(row)
+        
+        if not to_write:
+            return
+        stmt = self._dialect_insert().values(to_write)
+        updates = {field: stmt.excluded[field] for field in fields if field != "employee_id"}
+        updates["updated_at"] = func.now()
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.employee_id], set_=updates)
+        written = {}
+        for identity_id, employee_id in self.db.execute(stmt.returning(table.c.id, table.c.employee_id)):
+            bucket = "updated" if employee_id in result["previous"] else "inserted"
+            result[bucket][employee_id] = identity_id
+            written[employee_id] = identity_id
+        if "entitlements" in fields:
+            IdentityEntitlementRepository(self.db).replace({
+                written[row["employee_id"]]: row["entitlements"] for row in to_write if row["employee_id"] in written
+            })
+        mark_written(self.db, "identities", list(written.values()))
+    
+    def _dialect_insert(self):
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(Identity)
+        if dialect == "sqlite":
+            return sqlite.insert(Identity)
+        raise NotImplementedError(f"bulk_upsert is not supported on {dialect}")
+    
+    def find_existing_keys(self, employee_ids: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        """Return the employee IDs and emails from the given lists that are already taken"""
+        rows = self.db.execute(
+            select(Identity.employee_id, Identity.primary_email)
+            .where(or_(Identity.employee_id.in_(employee_ids), Identity.primary_email.in_(emails)))
+        ).all()
+        return {row.employee_id for row in rows}, {row.primary_email for row in rows}
+    
     def get_by_id(self, identity_id: int) -> Optional[Identity]:
-        return self.db.query(Identity).filter(Identity.id == identity_id).first()
+        # Session.get answers from the identity map when the row is already loaded
+        return self.db.get(Identity, identity_id)
     
     def get_by_email(self, email: str) -> Optional[Identity]:
         return self.db.query(Identity).filter(Identity.primary_email == email).first()
@@ -26,19 +135,158 @@ class IdentityRepository:
     def get_all(self) -> List[Identity]:
         return self.db.query(Identity).all()
     
-    def update(self, identity_id: int, update_data: IdentityUpdate) -> Optional[Identity]:
+    def count_by(self, field: str) -> Dict[Any, int]:
+        """Number of identities per value of a column, one GROUP BY"""
+        column = getattr(Identity, field)
+        return dict(self.db.execute(select(column, func.count()).group_by(column)).all())
+    
+    def count_entitlement_values_by_role(self, *path: str) -> Dict[Any, Dict[str, int]]:
+        """
+        Holders of each value of an entitlements list (e.g. "slack", "channels") per
+        business role, expanding the JSON array in the database
+        """
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "sqlite":
+            values = func.json_each(Identity.entitlements, "$." + ".".join(path)).table_valued("value")
+        elif dialect == "postgresql":
+            values = func.json_array_elements_text(Identity.entitlements[path]).table_valued("value")
+        else:
+            raise NotImplementedError(f"Entitlement aggregation is not supported on {dialect}")
+        rows = self.db.execute(
+            select(Identity.business_role, values.c.value, func.count())
+            .select_from(Identity)
+            .join(values, true())
+            .group_by(Identity.business_role, values.c.value)
+        ).all()
+        counts: Dict[Any, Dict[str, int]] = {}
+        for role, value, count in rows:
+            counts.setdefault(role, {})[value] = count
+        return counts
+    
+    def list_page(self, after_id: Optional[int], limit: int, **filters: Any) -> List[Identity]:
+        """
+        Keyset page ordered by id: rows with id > after_id matching the filters.
+        
+        Filters with a None value are ignored. Fetches one extra row so the caller
+        can tell whether another page exists.
+        """
+        query = select(Identity)
+        for field, value in filters.items():
+            if value is not None:
+                query = query.where(getattr(Identity, field) == value)
+        if after_id is not None:
+            query = query.where(Identity.id > after_id)
+        return self.db.execute(query.order_by(Identity.id).limit(limit + 1)).scalars().all()
+    
+    def _entitlement_query(self):
+        return select(
+            Identity.id, Identity.primary_email, Identity.first_name, Identity.last_name,
+            Identity.entitlements, Identity.policy_version, Identity.is_active,
+            Identity.business_role, Identity.department, Identity.location,
+            Identity.employment_type, Identity.employment_status
+        )
+    
+    def entitlement_batch(self, after_id: Optional[int], limit: int) -> List[Any]:
+        """Keyset batch of the columns entitlement evaluation and reprovisioning need, ordered by id"""
+        query = self._entitlement_query()
+        if after_id is not None:
+            query = query.where(Identity.id > after_id)
+        return self.db.execute(query.order_by(Identity.id).limit(limit)).all()
+    
+    def stream_attributes(self, batch_size: int):
+        """id, is_active and the rule attribute columns of every identity, fetched batch_size rows at a time"""
+        # Core rows on the session's connection, skipping ORM result processing
+        result = self.db.connection().execute(
+            select(
+                Identity.id, Identity.is_active,
+                Identity.business_role, Identity.department, Identity.location,
+                Identity.employment_type, Identity.employment_status
+            ).execution_options(yield_per=batch_size)
+        )
+        for partition in result.partitions():
+            yield from partition
+    
+    def entitlement_rows_by_ids(self, ids: List[int]) -> List[Any]:
+        """The entitlement_batch columns for the given identities (missing IDs are absent)"""
+        return self.db.execute(self._entitlement_query().where(Identity.id.in_(ids))).all()
+    
+    def update_entitlements(self, rows: List[Dict[str, Any]]):
+        """Write entitlements and policy_version for many identities with one executemany UPDATE; caller commits"""
+        if not rows:
+            return
+        table = Identity.__table__
+        self.db.execute(
+            update(table)
+            .where(table.c.id == bindparam("identity_id"))
+            .values(entitlements=bindparam("entitlements"), policy_version=bindparam("policy_version"), updated_at=func.now()),
+            rows
+        )
+        IdentityEntitlementRepository(self.db).replace({row["identity_id"]: row["entitlements"] for row in rows})
+        mark_written(self.db, "identities", [row["identity_id"] for row in rows])
+    
+    def update(self, identity_id: int, update_data: IdentityUpdate, commit: bool = True,
+               policy_version: Optional[str] = None) -> Optional[Identity]:
+        """
+        Write only the changed columns with one UPDATE ... RETURNING; no write at all
+        when the submitted values match the stored ones. `policy_version` is stored
+        along with recomputed entitlements.
+        """
         identity = self.get_by_id(identity_id)
-        if identity:
-            for field, value in update_data.model_dump(exclude_unset=True).items():
-                setattr(identity, field, value)
-            self.db.commit()
-            self.db.refresh(identity)
+        if not identity:
+            return None
+        changes = changed_values(identity, _update_values(update_data, policy_version))
+        if changes:
+            apply_returned(identity, self.db.execute(update_returning(identity, changes)).one())
+            if "entitlements" in changes:
+                IdentityEntitlementRepository(self.db).replace({identity_id: identity.entitlements})
+            mark_written(self.db, "identities", [identity_id])
+            if commit:
+                self.db.commit()
         return identity
     
     def delete(self, identity_id: int) -> bool:
         identity = self.get_by_id(identity_id)
         if identity:
+            IdentityEntitlementRepository(self.db).replace({identity_id: None})
             self.db.delete(identity)
+            mark_written(self.db, "identities", [identity_id])
             self.db.commit()
             return True
-        return False
\ No newline at end of file
+        return False
+
+class AsyncIdentityRepository:
+    """IdentityRepository on an AsyncSession, for the async write routes"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def create(self, identity: IdentityCreate, commit: bool = True, policy_version: Optional[str] = None) -> Identity:
+        db_identity = Identity(**identity.model_dump(), policy_version=policy_version)
+        self.db.add(db_identity)
+        await self.db.flush()
+        await AsyncIdentityEntitlementRepository(self.db).replace({db_identity.id: db_identity.entitlements})
+        mark_written(self.db, "identities", [db_identity.id])
+        if not commit:
+            return db_identity
+        await self.db.commit()
+        await self.db.refresh(db_identity)
+        return db_identity
+    
+    async def get_by_id(self, identity_id: int) -> Optional[Identity]:
+        return await self.db.get(Identity, identity_id)
+    
+    async def update(self, identity_id: int, update_data: IdentityUpdate, commit: bool = True,
+                     policy_version: Optional[str] = None) -> Optional[Identity]:
+        identity = await self.get_by_id(identity_id)
+        if not identity:
+            return None
+        changes = changed_values(identity, _update_values(update_data, policy_version))
+        if changes:
+            result = await self.db.execute(update_returning(identity, changes))
+            apply_returned(identity, result.one())
+            if "entitlements" in changes:
+                await AsyncIdentityEntitlementRepository(self.db).replace({identity_id: identity.entitlements})
+            mark_written(self.db, "identities", [identity_id])
+            if commit:
+                await self.db.commit()
+        return identity
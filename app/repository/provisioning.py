@@ -0,0 +1,143 @@
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, exists, and_, or_
+from app.models.provisioning import ProvisioningJob, ProvisioningJobIdentity
+from typing import Optional, List, Dict, Any, Iterable
+from datetime import datetime, timedelta, timezone
+
+ACTIVE_STATUSES = ("pending", "running")
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def new_job(operation: str, payload: Dict[str, Any], identity_id: Optional[int] = None, max_attempts: int = 5,
+            identity_ids: Iterable[int] = ()) -> ProvisioningJob:
+    return ProvisioningJob(
+        identity_id=identity_id,
+        operation=operation,
+        payload=payload,
+        status="pending",
+        attempts=0,
+        max_attempts=max_attempts,
+        next_attempt_at=utcnow(),
+        identity_links=[ProvisioningJobIdentity(identity_id=covered) for covered in dict.fromkeys(identity_ids)]
+    )
+
+class ProvisioningJobRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def enqueue(self, operation: str, payload: Dict[str, Any], identity_id: Optional[int] = None, max_attempts: int = 5,
+                identity_ids: Iterable[int] = ()) -> ProvisioningJob:
+        """
+        Add a job to the outbox; committed together with the caller's transaction.
+        `identity_ids` lists the identities of a job that provisions several.
+        """
+        job = new_job(operation, payload, identity_id, max_attempts, identity_ids)
+        self.db.add(job)
+        return job
+    
+    def get_by_id(self, job_id: int) -> Optional[ProvisioningJob]:
+        return self.db.query(ProvisioningJob).filter(ProvisioningJob.id == job_id).first()
+    
+    def get_by_identity(self, identity_id: int, limit: int = 50) -> List[ProvisioningJob]:
+        return (
+            self.db.query(ProvisioningJob)
+            .filter(ProvisioningJob.identity_id == identity_id)
+            .order_by(ProvisioningJob.id.desc())
+            .limit(limit)
+            .all()
+        )
+    
+    def claim_next(self, candidates: int = 10) -> Optional[ProvisioningJob]:
+        """
+        Claim the oldest runnable job.
+        
+        A job is runnable when it is due and no earlier job for the same identity
+        is still pending or running, which keeps per-identity ordering. Bulk jobs
+        cover the identities in provisioning_job_identities: a later job for any of
+        them waits for the bulk job, and the bulk job waits for earlier jobs of
+        each. The claim is a conditional UPDATE so concurrent workers never run the
+        same job twice.
+        """
+        now = utcnow()
+        earlier = aliased(ProvisioningJob)
+        earlier_link = aliased(ProvisioningJobIdentity)
+        link = aliased(ProvisioningJobIdentity)
+        blocked = exists().where(and_(
+            earlier.id < ProvisioningJob.id,
+            earlier.status.in_(ACTIVE_STATUSES),
+            or_(
+                earlier.identity_id == ProvisioningJob.identity_id,
+                # An earlier bulk job covers this job's identity
+                exists().where(earlier_link.job_id == earlier.id, earlier_link.identity_id == ProvisioningJob.identity_id)
+                .correlate_except(earlier_link),
+                # This bulk job covers an identity with an earlier job
+                exists().where(link.job_id == ProvisioningJob.id, link.identity_id == earlier.identity_id)
+                .correlate_except(link)
+            )
+        ))
+        job_ids = self.db.execute(
+            select(ProvisioningJob.id)
+            .where(ProvisioningJob.status == "pending", ProvisioningJob.next_attempt_at <= now, ~blocked)
+            .order_by(ProvisioningJob.id)
+            .limit(candidates)
+        ).scalars().all()
+        
+        for job_id in job_ids:
+            claimed = self.db.execute(
+                update(ProvisioningJob)
+                .where(ProvisioningJob.id == job_id, ProvisioningJob.status == "pending")
+                .values(status="running", attempts=ProvisioningJob.attempts + 1, locked_at=now)
+            ).rowcount
+            self.db.commit()
+            if claimed:
+                return self.get_by_id(job_id)
+        return None
+    
+    def mark_succeeded(self, job: ProvisioningJob, result: Dict[str, Any]):
+        job.status = "succeeded"
+        job.result = result
+        job.last_error = None
+        job.locked_at = None
+        job.completed_at = datetime.now(timezone.utc)
+        self.db.commit()
+    
+    def mark_failed(self, job: ProvisioningJob, error: str, retry_in: float):
+        """Schedule a retry, or move the job to the dead-letter state once attempts run out"""
+        job.last_error = error
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = "dead"
+            job.completed_at = datetime.now(timezone.utc)
+        else:
+            job.status = "pending"
+            job.next_attempt_at = utcnow() + timedelta(seconds=retry_in)
+        self.db.commit()
+    
+    def requeue_stale(self, older_than: float) -> int:
+        """Return jobs left running by a worker that died to the queue"""
+        cutoff = utcnow() - timedelta(seconds=older_than)
+        count = self.db.execute(
+            update(ProvisioningJob)
+            .where(ProvisioningJob.status == "running", ProvisioningJob.locked_at < cutoff)
+            .values(status="pending", locked_at=None)
+        ).rowcount
+        self.db.commit()
+        return count
+
+class AsyncProvisioningJobRepository:
+    """Outbox writes on an AsyncSession; the workers keep using the sync repository"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    def enqueue(self, operation: str, payload: Dict[str, Any], identity_id: Optional[int] = None, max_attempts: int = 5,
+                identity_ids: Iterable[int] = ()) -> ProvisioningJob:
+        """
+        Add a job to the outbox; committed together with the caller's transaction.
+        `identity_ids` lists the identities of a job that provisions several.
+        """
+        job = new_job(operation, payload, identity_id, max_attempts, identity_ids)
+        self.db.add(job)
+        return job
@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List, Union
+from app.core.config import settings
+
+class AccessQuery(BaseModel):
+    # A key such as "slack:channels:#alerts", or {"union" | "intersection" | "difference": [...]}
+    expression: Union[str, Dict[str, Any]]
+    cursor: Optional[str] = None
+    limit: int = Field(settings.identity_page_size, ge=1, le=settings.identity_page_size_max)
+
+class AccessQueryResult(BaseModel):
+    count: int
+    identity_ids: List[int]
+    next_cursor: Optional[str] = None
+
+class IdentityHoldings(BaseModel):
+    identity_id: int
+    keys: List[str]
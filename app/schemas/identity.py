@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime, date
 
 class IdentityBase(BaseModel):
@@ -71,12 +71,39 @@ class Identity(IdentityBase):
     model_config = ConfigDict(from_attributes=True)
     
     id: int
+    policy_version: Optional[str] = None  # role policy version the entitlements were derived from
     is_active: bool
     created_at: datetime
     created_by: str
     updated_at: Optional[datetime] = None
     last_modified_by: str
 
+class IdentityPage(BaseModel):
+    items: List[Identity]
+    next_cursor: Optional[str] = None
+
+class IdentityImportError(BaseModel):
+    row: int
+    error: str
+
+class IdentityImportResult(BaseModel):
+    received: int
+    imported: int
+    failed: int
+    errors: List[IdentityImportError] = []
+    errors_truncated: bool = False
+    job_ids: List[int] = []
+
+class IdentitySyncResult(BaseModel):
+    received: int
+    inserted: List[str] = []  # employee IDs
+    updated: List[str] = []
+    unchanged: int
+    failed: int
+    errors: List[IdentityImportError] = []
+    errors_truncated: bool = False
+    job_ids: List[int] = []
+
 class SlackUserRequest(BaseModel):
     email: str
     first_name: str
@@ -89,7 +116,20 @@ class SlackUserResponse(BaseModel):
     status: str
     name: Optional[str] = None
     channels_assigned: Optional[list[str]] = None
+    channels_failed: Optional[Dict[str, str]] = None
     error: Optional[str] = None
+
+class SlackBulkInviteRequest(BaseModel):
+    # Slack user ID -> channels to join
+    assignments: Dict[str, list[str]]
+
+class SlackChannelInviteResult(BaseModel):
+    invited: list[str] = []
+    failed: Dict[str, str] = {}
+
+class SlackBulkInviteResponse(BaseModel):
+    channels: Dict[str, SlackChannelInviteResult]
+
 class SlackCreateUserRequest(BaseModel):
     email: str
     first_name: str
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any, List
+
+class RolePolicyProposal(BaseModel):
+    # Roles to add or replace, by name; null removes a role
+    roles: Dict[str, Optional[Dict[str, Any]]] = {}
+    # Replace the default entitlements / the whole rule list when given
+    default: Optional[Dict[str, Any]] = None
+    rules: Optional[List[Dict[str, Any]]] = None
@@ -0,0 +1,281 @@
+"""
+In-process inverted index for access reviews: entitlement -> bitmap of identity IDs.
+
+Each posting is a Python int whose bit N is set when identity N holds the
+entitlement, so union, intersection and difference are single big-int `|`, `&`
+and `& ~` operations and counts are `int.bit_count()`. Keys are strings:
+
+- `application:type:value` for entitlements, e.g. `slack:channels:#devops`
+  or `iga:permissions:write` (see `entitlement_rows`)
+- `attribute:<rule attribute>:<value>` for identity attributes, lowercased,
+  e.g. `attribute:business_role:devops`, plus `attribute:is_active:true`
+- `*` for every indexed identity
+
+The index is built from the identities table and kept current by the
+`identities` write hook, which only records the written IDs; the next query
+re-reads those rows and patches their postings. Builds and refreshes run one at
+a time, each holding the maintenance lock from its read to its update of the
+index, so an older read is never applied over a newer one.
+
+The hook only fires in the process that made the write. Writes by other worker
+processes or by other services reach this process's index only on the next
+rebuild (`/access/rebuild` or a restart).
+"""
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.repository.identity import IdentityRepository
+from app.repository.entitlements import IdentityEntitlementRepository, entitlement_rows
+from app.repository.hooks import on_write
+from app.service.rules import rule_attributes
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ALL = "*"
+MAX_QUERY_TERMS = 100
+
+def attribute_keys(row: Any) -> List[str]:
+    keys = [f"attribute:{attribute}:{value}" for attribute, value in rule_attributes(row._mapping).items() if value]
+    keys.append(f"attribute:is_active:{str(row.is_active is not False).lower()}")
+    return keys
+
+def identity_keys(row: Any) -> Tuple[str, ...]:
+    """Index keys of one identity row (entitlement_batch columns)"""
+    keys = [f"{entry['application']}:{entry['type']}:{entry['value']}" for entry in entitlement_rows(row.id, row.entitlements)]
+    keys.extend(attribute_keys(row))
+    # Interned, so the per-identity tuples share one copy of each key
+    return tuple(sorted(sys.intern(key) for key in keys))
+
+def _bitmap(ids: Iterable[int]) -> int:
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for identity_id in ids:
+        bits[identity_id >> 3] |= 1 << (identity_id & 7)
+    return int.from_bytes(bits, "little")
+
+def bitmap_ids(bitmap: int, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[int]:
+    """Set bits in ascending order, starting after `after_id`"""
+    offset = 0
+    if after_id is not None:
+        offset = after_id + 1
+        bitmap >>= offset
+    ids: List[int] = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        if not byte:
+            continue
+        base = offset + index * 8
+        for bit in range(8):
+            if byte >> bit & 1:
+                ids.append(base + bit)
+                if limit is not None and len(ids) >= limit:
+                    return ids
+    return ids
+
+class AccessIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Serializes build and refresh; `_lock` only guards the structures queries read
+        self._maintenance_lock = threading.Lock()
+        self._postings: Dict[str, int] = {}
+        self._holdings: Dict[int, Tuple[str, ...]] = {}
+        self._pending: Set[int] = set()
+        self.built = False
+        self.built_at: Optional[float] = None
+        self.build_ms: Optional[float] = None
+        self.identities_refreshed = 0
+
+    # Maintenance
+
+    def build(self, db: Session) -> Dict[str, Any]:
+        """Scan identities and identity_entitlements and replace the whole index"""
+        with self._maintenance_lock:
+            return self._build(db)
+    
+    def _build(self, db: Session) -> Dict[str, Any]:
+        started = time.perf_counter()
+        with self._lock:
+            # IDs written while the scan runs stay pending and are re-read afterwards
+            self._pending.clear()
+        # Read from the normalized identity_entitlements rows, no JSON decoding
+        batch_size = settings.access_index_batch_size
+        keys_of: Dict[int, List[str]] = {}
+        attribute_cache: Dict[Tuple[Any, ...], List[str]] = {}
+        for row in IdentityRepository(db).stream_attributes(batch_size):
+            values = tuple(row)[1:]
+            keys = attribute_cache.get(values)
+            if keys is None:
+                keys = attribute_cache[values] = attribute_keys(row)
+            keys_of[row.id] = list(keys)
+        names: Dict[Tuple[str, str, str], str] = {}
+        for identity_id, application, kind, value in IdentityEntitlementRepository(db).stream_all(batch_size):
+            keys = keys_of.get(identity_id)
+            if keys is None:
+                continue
+            entry = (application, kind, value)
+            name = names.get(entry)
+            if name is None:
+                name = names[entry] = sys.intern(f"{application}:{kind}:{value}")
+            keys.append(name)
+        
+        postings: Dict[str, List[int]] = {}
+        holdings: Dict[int, Tuple[str, ...]] = {}
+        # Identities with the same access share one interned key tuple
+        shared: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        for identity_id, keys in keys_of.items():
+            key_tuple = tuple(sorted(keys))
+            key_tuple = shared.get(key_tuple) or shared.setdefault(key_tuple, tuple(sys.intern(key) for key in key_tuple))
+            holdings[identity_id] = key_tuple
+            for key in key_tuple:
+                postings.setdefault(key, []).append(identity_id)
+        keys_of.clear()
+        bitmaps = {key: _bitmap(ids) for key, ids in postings.items()}
+        bitmaps[ALL] = _bitmap(holdings)
+        with self._lock:
+            self._postings, self._holdings = bitmaps, holdings
+            self.built = True
+            self.built_at = time.time()
+            self.build_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Access index built: {len(holdings)} identities, {len(bitmaps)} keys in {self.build_ms} ms")
+        return self.stats()
+
+    def mark_stale(self, ids: Iterable[int]):
+        with self._lock:
+            self._pending.update(ids)
+
+    def refresh(self, db: Session):
+        """Build on first use, then re-read identities written since the last query"""
+        with self._maintenance_lock:
+            if not self.built:
+                self._build(db)
+                return
+            self._refresh(db)
+    
+    def _refresh(self, db: Session):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = sorted(self._pending), set()
+        repository = IdentityRepository(db)
+        chunk = settings.access_index_batch_size
+        for start in range(0, len(pending), chunk):
+            ids = pending[start:start + chunk]
+            current = {row.id: identity_keys(row) for row in repository.entitlement_rows_by_ids(ids)}
+            with self._lock:
+                for identity_id in ids:
+                    self._move(identity_id, current.get(identity_id, ()))
+        self.identities_refreshed += len(pending)
+
+    def _move(self, identity_id: int, keys: Tuple[str, ...]):
+        old = self._holdings.pop(identity_id, ())
+        bit = 1 << identity_id
+        if keys:
+            self._holdings[identity_id] = keys
+        for key in set(old) - set(keys):
+            remaining = self._postings.get(key, 0) & ~bit
+            if remaining:
+                self._postings[key] = remaining
+            else:
+                self._postings.pop(key, None)
+        for key in set(keys) - set(old):
+            self._postings[key] = self._postings.get(key, 0) | bit
+        if keys:
+            self._postings[ALL] = self._postings.get(ALL, 0) | bit
+        else:
+            self._postings[ALL] = self._postings.get(ALL, 0) & ~bit
+
+    # Queries
+
+    def evaluate(self, expression: Any) -> int:
+        """
+        Bitmap of an expression: a key string, or {"union": [...]},
+        {"intersection": [...]} or {"difference": [first, *others]} (first minus
+        all others), nested freely
+        """
+        terms = [0]
+
+        def walk(node: Any) -> int:
+            terms[0] += 1
+            if terms[0] > MAX_QUERY_TERMS:
+                raise ValueError(f"Query has more than {MAX_QUERY_TERMS} terms")
+            if isinstance(node, str):
+                return self._postings.get(node, 0)
+            if not isinstance(node, dict) or len(node) != 1:
+                raise ValueError("Each query node must be a key or an object with one of: union, intersection, difference")
+            op, args = next(iter(node.items()))
+            if not isinstance(args, list) or not args:
+                raise ValueError(f"'{op}' needs a non-empty list")
+            bitmaps = [walk(arg) for arg in args]
+            if op == "union":
+                result = 0
+                for bitmap in bitmaps:
+                    result |= bitmap
+                return result
+            if op == "intersection":
+                result = bitmaps[0]
+                for bitmap in bitmaps[1:]:
+                    result &= bitmap
+                return result
+            if op == "difference":
+                others = 0
+                for bitmap in bitmaps[1:]:
+                    others |= bitmap
+                return bitmaps[0] & ~others
+            raise ValueError(f"Unknown operation '{op}'")
+
+        with self._lock:
+            return walk(expression)
+
+    def query(self, expression: Any, after_id: Optional[int], limit: int) -> Tuple[int, List[int]]:
+        """Total matches and one page of identity IDs (one extra to detect the next page)"""
+        bitmap = self.evaluate(expression)
+        return bitmap.bit_count(), bitmap_ids(bitmap, after_id, limit + 1)
+
+    def holdings(self, identity_id: int) -> Optional[List[str]]:
+        with self._lock:
+            keys = self._holdings.get(identity_id)
+        return sorted(keys) if keys is not None else None
+
+    def keys(self, prefix: str = "") -> Dict[str, int]:
+        """Keys starting with `prefix` and their holder counts"""
+        with self._lock:
+            items = [(key, bitmap) for key, bitmap in self._postings.items() if key.startswith(prefix) and key != ALL]
+        return {key: bitmap.bit_count() for key, bitmap in sorted(items)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            postings, holdings = self._postings, self._holdings
+            bitmap_bytes = sum((bitmap.bit_length() + 7) // 8 for bitmap in postings.values())
+            bitmap_objects = sum(sys.getsizeof(bitmap) for bitmap in postings.values())
+            key_bytes = sum(sys.getsizeof(key) for key in postings)
+            # Identities with the same access share one tuple, count each once
+            distinct = {id(keys): keys for keys in holdings.values()}
+            holdings_bytes = sys.getsizeof(holdings) + sum(sys.getsizeof(keys) for keys in distinct.values())
+            return {
+                "built": self.built,
+                "built_at": self.built_at,
+                "build_ms": self.build_ms,
+                "identities": len(holdings),
+                "keys": max(len(postings) - 1, 0),
+                "pending_refresh": len(self._pending),
+                "identities_refreshed": self.identities_refreshed,
+                "memory_bytes": {
+                    "bitmaps": bitmap_bytes,
+                    # Including Python object headers, the posting dict and key strings
+                    "postings": bitmap_objects + key_bytes + sys.getsizeof(postings),
+                    # identity -> keys map answering "what does this identity hold" (tuples share the key strings)
+                    "holdings": holdings_bytes
+                }
+            }
+
+access_index = AccessIndex()
+
+@on_write("identities")
+def _mark_identities_stale(ids: Set[int]):
+    access_index.mark_stale(ids)
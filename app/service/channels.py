@@ -0,0 +1,144 @@
+from app.core.config import settings
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import httpx
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Public (C...) and private (G...) channel IDs are passed through without a lookup
+CHANNEL_ID_PATTERN = re.compile(r"^[CG][A-Z0-9]{6,}$")
+
+# Error for names that could not be looked up because conversations.list failed;
+# unlike channel_not_found it is retryable
+CHANNEL_INDEX_UNAVAILABLE = "channel_index_unavailable"
+
+def normalize_channel_name(name: str) -> str:
+    return name.strip().lstrip("#").lower()
+
+class ChannelResolver:
+    """Channel name -> ID index built by paging conversations.list"""
+    
+    def __init__(self, slack_service):
+        self.slack_service = slack_service
+        self.ttl = settings.slack_channel_index_ttl
+        self.min_refresh_interval = settings.slack_channel_index_min_refresh
+        self._ids_by_name: Dict[str, str] = {}
+        self._names_by_id: Dict[str, str] = {}
+        self.refreshed_at: Optional[float] = None
+        self.attempted_at: Optional[float] = None
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.last_error: Optional[str] = None
+        self._refresh_lock = asyncio.Lock()
+    
+    def _age(self) -> float:
+        return float("inf") if self.refreshed_at is None else time.monotonic() - self.refreshed_at
+    
+    def _may_refresh(self) -> bool:
+        # Failed passes count too, so a failing conversations.list is not re-paged on every call
+        return self.attempted_at is None or time.monotonic() - self.attempted_at > self.min_refresh_interval
+    
+    def _index(self, channel_id: str, name: str):
+        previous = self._names_by_id.get(channel_id)
+        if previous and previous != name and self._ids_by_name.get(previous) == channel_id:
+            # Channel was renamed
+            del self._ids_by_name[previous]
+        self._names_by_id[channel_id] = name
+        self._ids_by_name[name] = channel_id
+    
+    async def refresh(self) -> int:
+        """
+        Page through conversations.list (public and private channels).
+        
+        Each page is merged into the live index as it arrives so lookups see new
+        and renamed channels immediately; channels not seen by the end of the pass
+        (archived or deleted) are dropped afterwards. A pass that fails keeps the
+        previous index and sets `last_error` until the next complete pass.
+        """
+        async with self._refresh_lock:
+            self.attempted_at = time.monotonic()
+            seen = set()
+            cursor = None
+            while True:
+                params = {
+                    "types": "public_channel,private_channel",
+                    "exclude_archived": "true",
+                    "limit": 1000
+                }
+                if cursor:
+                    params["cursor"] = cursor
+                try:
+                    response = await self.slack_service.request("GET", "conversations.list", params=params)
+                    data = response.json() if response.status_code == 200 else {}
+                    error = None if data.get("ok") else data.get("error", f"http_{response.status_code}")
+                except httpx.HTTPError as e:
+                    error = str(e) or e.__class__.__name__
+                if error:
+                    self.refresh_errors += 1
+                    self.last_error = error
+                    logger.warning(f"Slack channel index refresh stopped: {error}")
+                    return len(self._ids_by_name)
+                
+                for channel in data.get("channels", []):
+                    channel_id, name = channel.get("id"), channel.get("name")
+                    if channel_id and name:
+                        self._index(channel_id, normalize_channel_name(name))
+                        seen.add(channel_id)
+                
+                cursor = data.get("response_metadata", {}).get("next_cursor")
+                if not cursor:
+                    break
+            
+            for channel_id in set(self._names_by_id) - seen:
+                name = self._names_by_id.pop(channel_id)
+                if self._ids_by_name.get(name) == channel_id:
+                    del self._ids_by_name[name]
+            
+            self.refreshed_at = time.monotonic()
+            self.refreshes += 1
+            self.last_error = None
+            return len(self._ids_by_name)
+    
+    def _lookup(self, channels: List[str]) -> Tuple[Dict[str, str], List[str]]:
+        resolved, unknown = {}, []
+        for channel in channels:
+            if CHANNEL_ID_PATTERN.match(channel):
+                resolved[channel] = channel
+                continue
+            channel_id = self._ids_by_name.get(normalize_channel_name(channel))
+            if channel_id:
+                resolved[channel] = channel_id
+            else:
+                unknown.append(channel)
+        return resolved, unknown
+    
+    async def resolve_many(self, channels: List[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Resolve a list of channel names to IDs, returns (name -> ID, unresolved name -> error).
+        The error is channel_not_found, or channel_index_unavailable while conversations.list fails.
+        """
+        if not channels:
+            return {}, {}
+        if self._age() > self.ttl and self._may_refresh():
+            await self.refresh()
+        
+        resolved, unknown = self._lookup(channels)
+        if unknown and self._may_refresh():
+            # A channel may have been created since the last pass
+            await self.refresh()
+            retried, unknown = self._lookup(unknown)
+            resolved.update(retried)
+        error = CHANNEL_INDEX_UNAVAILABLE if self.last_error else "channel_not_found"
+        return resolved, {channel: error for channel in unknown}
+    
+    def stats(self) -> Dict[str, object]:
+        return {
+            "channels": len(self._ids_by_name),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "last_error": self.last_error,
+            "age_seconds": None if self.refreshed_at is None else round(self._age(), 1)
+        }
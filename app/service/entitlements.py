@@ -0,0 +1,25 @@
+from typing import Dict, Any, List
+
+def slack_channels(entitlements: Dict[str, Any]) -> List[str]:
+    return list((entitlements or {}).get("slack", {}).get("channels", []))
+
+def permissions(entitlements: Dict[str, Any]) -> List[str]:
+    return list((entitlements or {}).get("permissions", []))
+
+def _added(old: List[str], new: List[str]) -> List[str]:
+    old_set = set(old)
+    return [item for item in dict.fromkeys(new) if item not in old_set]
+
+def diff_entitlements(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Compute what changes between two entitlement documents"""
+    old_channels, new_channels = slack_channels(old), slack_channels(new)
+    old_permissions, new_permissions = permissions(old), permissions(new)
+    return {
+        "channels_added": _added(old_channels, new_channels),
+        "channels_removed": _added(new_channels, old_channels),
+        "permissions_added": _added(old_permissions, new_permissions),
+        "permissions_removed": _added(new_permissions, old_permissions),
+    }
+
+def has_changes(delta: Dict[str, List[str]]) -> bool:
+    return any(delta.values())
@@ -0,0 +1,62 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from app.core.config import settings
+from typing import Any, Iterator, List
+from datetime import date, datetime
+from decimal import Decimal
+import json
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the standard library encoder
+    orjson = None
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def dumps(row: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(row, default=_default)
+    return json.dumps(row, default=_default, separators=(",", ":")).encode()
+
+def stream_table(db: Session, model, fmt: str = "ndjson") -> Iterator[bytes]:
+    """
+    Stream every row of a table as NDJSON or a JSON array.
+    
+    Rows are read with yield_per (a server-side cursor where the driver supports one)
+    and written out in chunks, so memory stays flat however large the table is.
+    """
+    batch_size = settings.export_batch_size
+    columns: List = list(model.__table__.columns)
+    try:
+        rows = db.execute(
+            select(*columns).order_by(model.id).execution_options(yield_per=batch_size)
+        )
+        separator = b"\n" if fmt == "ndjson" else b","
+        if fmt == "json":
+            yield b"["
+        
+        first = True
+        for partition in rows.partitions():
+            encoded = [dumps(dict(row._mapping)) for row in partition]
+            chunk = separator.join(encoded)
+            if fmt == "ndjson":
+                chunk += b"\n"
+            elif not first:
+                chunk = b"," + chunk
+            first = False
+            yield chunk
+        
+        if fmt == "json":
+            yield b"]"
+    finally:
+        db.close()
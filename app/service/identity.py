@@ -1,34 +1,428 @@
 from sqlalchemy.orm import Session
-from app.repository.identity import IdentityRepository
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
+from app.repository.identity import IdentityRepository, AsyncIdentityRepository
+from app.repository.provisioning import ProvisioningJobRepository, AsyncProvisioningJobRepository
+from app.repository.entitlements import IdentityEntitlementRepository
+from app.models.provisioning import ProvisioningJob
+from app.core.config import settings
 from app.schemas.identity import IdentityCreate, IdentityUpdate, Identity
-from app.service.slack import SlackService
-from typing import List, Optional, Dict, Any
+from app.service.slack import SlackService, slack_service as shared_slack_service
+from app.service.provisioning import provisioning_workers
+from app.service.identity_import import ImportRecord
+from app.service.entitlements import diff_entitlements
+from app.service.reconciliation import DriftBucket
+from app.service.policy import role_policies
+from app.service.rules import RULE_ATTRIBUTES, normalize_value, rule_attributes
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
+import asyncio
+import base64
+import binascii
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-class IdentityService:
-    def __init__(self, db: Session):
+def encode_cursor(identity_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{identity_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, identity_id = value.split(":", 1)
+        if prefix != "id":
+            raise ValueError
+        return int(identity_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+class BaseIdentityService:
+    """Entitlement mapping and outbox helpers shared by the sync and async services"""
+    
+    def _prepare_update(self, current: Identity, update_data: IdentityUpdate) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Recompute entitlements when a rule attribute changes; returns the entitlements
+        before the update and the policy version to store (None when not recomputed)
+        """
+        before = rule_attributes(current)
+        after = dict(before)
+        for attribute in RULE_ATTRIBUTES:
+            value = getattr(update_data, attribute)
+            if value is not None:
+                after[attribute] = normalize_value(value)
+        policy_version = None
+        if after != before and update_data.entitlements is None:
+            policy_version = self._apply_entitlement_policy(update_data, after)
+        return current.entitlements or {}, policy_version
+    
+    def _apply_entitlement_policy(self, identity_data, attributes: Optional[Dict[str, Optional[str]]] = None) -> str:
+        """Set entitlements from the role policy and rules; returns the version of the snapshot used"""
+        attributes = attributes or rule_attributes(identity_data)
+        if not attributes["business_role"]:
+            raise ValueError("Business role is required")
+        snapshot = role_policies.snapshot
+        identity_data.entitlements = snapshot.evaluate(attributes)
+        return snapshot.version
+    
+    def _enqueue_provisioning(self, identity: Identity, identity_id: Optional[int] = None):
+        """
+        Queue provisioning to target applications in the current transaction.
+        `identity_id` is needed when `identity` is a schema rather than a stored row.
+        """
+        identity_id = identity_id if identity_id is not None else identity.id
+        entitlements = identity.entitlements or {}
+        if "slack" not in entitlements:
+            return None
+        return self.jobs.enqueue(
+            "provision",
+            {
+                "email": identity.primary_email,
+                "first_name": identity.first_name,
+                "last_name": identity.last_name,
+                "channels": entitlements["slack"].get("channels", [])
+            },
+            identity_id=identity_id,
+            max_attempts=settings.provisioning_max_attempts
+        )
+    
+    def _enqueue_bulk_provisioning(self, identities: List[Tuple[int, IdentityCreate]]) -> ProvisioningJob:
+        """
+        Queue one job provisioning all newly inserted (id, identity) pairs, grouped by
+        channel when it runs, in the current transaction. The job lists the identity IDs
+        so later jobs for any of them wait for it.
+        """
+        return self.jobs.enqueue(
+            "bulk_provision",
+            {
+                "users": [
+                    {
+                        "email": identity.primary_email,
+                        "first_name": identity.first_name,
+                        "last_name": identity.last_name,
+                        "channels": (identity.entitlements or {}).get("slack", {}).get("channels", [])
+                    }
+                    for _, identity in identities
+                ]
+            },
+            max_attempts=settings.provisioning_max_attempts,
+            identity_ids=[identity_id for identity_id, _ in identities]
+        )
+    
+    def _enqueue_reprovisioning(self, identity: Identity, delta: Dict[str, List[str]], identity_id: Optional[int] = None):
+        """
+        Queue the Slack part of an entitlement delta in the current transaction.
+        `identity_id` is needed when `identity` is a schema rather than a stored row.
+        """
+        identity_id = identity_id if identity_id is not None else identity.id
+        if delta["permissions_added"] or delta["permissions_removed"]:
+            logger.info(
+                f"Identity {identity_id} permissions changed: "
+                f"+{delta['permissions_added']} -{delta['permissions_removed']}"
+            )
+        if not delta["channels_added"] and not delta["channels_removed"]:
+            return None
+        return self.jobs.enqueue(
+            "reprovision",
+            {
+                "email": identity.primary_email,
+                "first_name": identity.first_name,
+                "last_name": identity.last_name,
+                "channels_added": delta["channels_added"],
+                "channels_removed": delta["channels_removed"]
+            },
+            identity_id=identity_id,
+            max_attempts=settings.provisioning_max_attempts
+        )
+
+class IdentityService(BaseIdentityService):
+    def __init__(self, db: Session, slack_service: Optional[SlackService] = None):
+        self.db = db
         self.repository = IdentityRepository(db)
-        self.slack_service = SlackService()
+        self.jobs = ProvisioningJobRepository(db)
+        self.slack_service = slack_service or shared_slack_service
     
     async def create_identity(self, identity_data: IdentityCreate) -> Identity:
         try:
             # Apply business role mapping
-            entitlements = self._map_business_role_to_entitlements(identity_data.business_role)
-            identity_data.entitlements = entitlements
-            
-            # Create identity
-            identity = self.repository.create(identity_data)
+            policy_version = self._apply_entitlement_policy(identity_data)
             
-            # Provision to target applications
-            await self._provision_to_targets(identity)
+            # Create identity and its provisioning job in one transaction;
+            # the outbox workers talk to the target applications
+            identity = self.repository.create(identity_data, commit=False, policy_version=policy_version)
+            self._enqueue_provisioning(identity)
+            self.db.commit()
+            self.db.refresh(identity)
+            provisioning_workers.notify()
             
             return identity
         except Exception as e:
+            self.db.rollback()
             logger.error(f"Error creating identity: {str(e)}")
             raise
     
+    async def import_identities(self, records: AsyncIterator[ImportRecord]) -> Dict[str, Any]:
+        """
+        Import a stream of identity records in chunks.
+        
+        Each chunk is validated against IdentityCreate, inserted with one multi-row
+        statement and committed together with one bulk provisioning job. Bad rows are
+        reported and skipped; only one chunk is held in memory at a time.
+        """
+        summary = {"received": 0, "imported": 0, "failed": 0, "errors": [], "errors_truncated": False, "job_ids": []}
+        async for chunk in self._record_chunks(records, summary):
+            await self._flush_import_chunk(chunk, summary)
+        return summary
+    
+    async def sync_identities(self, records: AsyncIterator[ImportRecord]) -> Dict[str, Any]:
+        """
+        Apply a full HR snapshot: insert new identities, update changed ones, skip the rest.
+        
+        Rows are keyed on employee_id and upserted per chunk. New identities get one bulk
+        provisioning job per chunk; updated identities get a reprovisioning job only when
+        their Slack channels changed. Unchanged rows cause no writes at all.
+        """
+        summary = {
+            "received": 0, "inserted": [], "updated": [], "unchanged": 0, "failed": 0,
+            "errors": [], "errors_truncated": False, "job_ids": []
+        }
+        async for chunk in self._record_chunks(records, summary):
+            valid = self._validate_import_chunk(chunk, summary)
+            if not valid:
+                continue
+            result, errors, job_ids = await asyncio.to_thread(self._write_sync_chunk, valid)
+            summary["inserted"].extend(result["inserted"])
+            summary["updated"].extend(result["updated"])
+            summary["unchanged"] += len(result["unchanged"])
+            for row, error in errors:
+                self._record_import_error(summary, row, error)
+            if job_ids:
+                summary["job_ids"].extend(job_ids)
+                provisioning_workers.notify()
+        return summary
+    
+    async def _record_chunks(self, records: AsyncIterator[ImportRecord], summary: Dict[str, Any]) -> AsyncIterator[List[Tuple[int, Dict[str, Any]]]]:
+        """Group parsed records into chunks, recording parse errors as they arrive"""
+        chunk: List[Tuple[int, Dict[str, Any]]] = []
+        async for row, record, error in records:
+            summary["received"] += 1
+            if error:
+                self._record_import_error(summary, row, error)
+                continue
+            chunk.append((row, record))
+            if len(chunk) >= settings.identity_import_chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def _record_import_error(self, summary: Dict[str, Any], row: int, error: str):
+        summary["failed"] += 1
+        if len(summary["errors"]) < settings.identity_import_max_errors:
+            summary["errors"].append({"row": row, "error": error})
+        else:
+            summary["errors_truncated"] = True
+    
+    def _validate_import_chunk(self, chunk: List[Tuple[int, Dict[str, Any]]], summary: Dict[str, Any]) -> List[Tuple[int, IdentityCreate]]:
+        valid: List[Tuple[int, IdentityCreate]] = []
+        for row, record in chunk:
+            try:
+                valid.append((row, IdentityCreate.model_validate(record)))
+            except ValidationError as e:
+                message = "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors())
+                self._record_import_error(summary, row, message)
+        return valid
+    
+    async def _flush_import_chunk(self, chunk: List[Tuple[int, Dict[str, Any]]], summary: Dict[str, Any]):
+        valid = self._validate_import_chunk(chunk, summary)
+        if not valid:
+            return
+        imported, errors, job_ids = await asyncio.to_thread(self._write_import_chunk, valid)
+        summary["imported"] += imported
+        for row, error in errors:
+            self._record_import_error(summary, row, error)
+        if job_ids:
+            summary["job_ids"].extend(job_ids)
+            provisioning_workers.notify()
+    
+    def _write_import_chunk(self, chunk: List[Tuple[int, IdentityCreate]]) -> Tuple[int, List[Tuple[int, str]], List[int]]:
+        taken_ids, taken_emails = self.repository.find_existing_keys(
+            [identity.employee_id for _, identity in chunk],
+            [identity.primary_email for _, identity in chunk]
+        )
+        
+        rows, errors = [], []
+        versions: Dict[str, str] = {}
+        for row, identity in chunk:
+            if identity.employee_id in taken_ids:
+                errors.append((row, f"employee_id '{identity.employee_id}' already exists"))
+                continue
+            if identity.primary_email in taken_emails:
+                errors.append((row, f"primary_email '{identity.primary_email}' already exists"))
+                continue
+            taken_ids.add(identity.employee_id)
+            taken_emails.add(identity.primary_email)
+            versions[identity.employee_id] = self._apply_entitlement_policy(identity)
+            rows.append((row, identity))
+        
+        if not rows:
+            return 0, errors, []
+        
+        try:
+            created = self.repository.bulk_create([{**identity.model_dump(), "policy_version": versions[identity.employee_id]} for _, identity in rows])
+            by_email = {identity.primary_email: identity for _, identity in rows}
+            job = self._enqueue_bulk_provisioning([(identity_id, by_email[email]) for identity_id, email in created])
+            self.db.commit()
+        except IntegrityError as e:
+            self.db.rollback()
+            logger.error(f"Identity import chunk rejected: {str(e.orig)}")
+            return 0, errors + [(row, "Chunk rejected by database constraint, retry these rows") for row, _ in rows], []
+        
+        return len(rows), errors, [job.id]
+    
+    def _write_sync_chunk(self, chunk: List[Tuple[int, IdentityCreate]]) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[int, str]], List[int]]:
+        rows: Dict[str, Tuple[int, IdentityCreate]] = {}
+        errors: List[Tuple[int, str]] = []
+        versions: Dict[str, str] = {}
+        emails: Dict[str, str] = {}
+        for row, identity in chunk:
+            if identity.employee_id in rows:
+                errors.append((row, f"employee_id '{identity.employee_id}' appears more than once in the snapshot"))
+                continue
+            owner = emails.get(identity.primary_email)
+            if owner is not None:
+                errors.append((row, f"primary_email '{identity.primary_email}' belongs to employee_id '{owner}'"))
+                continue
+            emails[identity.primary_email] = identity.employee_id
+            versions[identity.employee_id] = self._apply_entitlement_policy(identity)
+            rows[identity.employee_id] = (row, identity)
+        
+        empty = {"inserted": {}, "updated": {}, "unchanged": {}}
+        try:
+            result = self.repository.bulk_upsert(
+                [{**identity.model_dump(), "policy_version": versions[employee_id]} for employee_id, (_, identity) in rows.items()],
+                chunk_size=settings.identity_import_chunk_size
+            )
+            jobs = []
+            if result["inserted"]:
+                jobs.append(self._enqueue_bulk_provisioning(
+                    [(identity_id, rows[employee_id][1]) for employee_id, identity_id in result["inserted"].items()]
+                ))
+            for employee_id, identity_id in result["updated"].items():
+                identity = rows[employee_id][1]
+                old_entitlements = result["previous"][employee_id].get("entitlements") or {}
+                job = self._enqueue_reprovisioning(
+                    identity, diff_entitlements(old_entitlements, identity.entitlements), identity_id=identity_id
+                )
+                if job is not None:
+                    jobs.append(job)
+            self.db.commit()
+        except IntegrityError as e:
+            self.db.rollback()
+            logger.error(f"Identity sync chunk rejected: {str(e.orig)}")
+            return empty, errors + [(row, "Chunk rejected by database constraint, retry these rows") for row, _ in rows.values()], []
+        
+        for employee_id, message in result["conflicts"].items():
+            errors.append((rows[employee_id][0], message))
+        return result, errors, [job.id for job in jobs]
+    
+    def explain_entitlements(self, identity_id: int) -> Optional[Dict[str, Any]]:
+        """Evaluate an identity against the current policy and report which rules fired"""
+        identity = self.repository.get_by_id(identity_id)
+        if not identity:
+            return None
+        explanation = role_policies.snapshot.explain(rule_attributes(identity))
+        explanation["identity_id"] = identity_id
+        explanation["stored_policy_version"] = identity.policy_version
+        explanation["stored_entitlements"] = identity.entitlements or {}
+        explanation["up_to_date"] = explanation["entitlements"] == (identity.entitlements or {})
+        return explanation
+    
+    def reevaluate_entitlements(self, apply: bool = False) -> Dict[str, Any]:
+        """
+        Re-evaluate every identity against the current policy in keyset batches.
+        
+        The whole run uses one policy snapshot, and each distinct combination of rule
+        attributes is evaluated once. With `apply`, changed identities are written with
+        one UPDATE per batch and reprovisioned when their channels changed, in the same
+        transaction. Inactive identities get the new entitlements but no Slack changes.
+        Entitlements set by hand are replaced as well.
+        """
+        snapshot = role_policies.snapshot
+        batch_size = settings.entitlement_reevaluate_batch_size
+        report: Dict[str, Any] = {
+            "policy_version": snapshot.version,
+            "applied": apply,
+            "scanned": 0,
+            "unchanged": 0,
+            "changed": DriftBucket(settings.entitlement_reevaluate_sample_size),
+            "restamped": 0,  # same entitlements, older policy version
+            "skipped_without_role": 0,
+            "job_ids": []
+        }
+        decisions: Dict[Tuple[Optional[str], ...], Dict[str, Any]] = {}
+        started = time.perf_counter()
+        after_id = None
+        while True:
+            rows = self.repository.entitlement_batch(after_id, batch_size)
+            if not rows:
+                break
+            after_id = rows[-1].id
+            updates, jobs = [], []
+            for row in rows:
+                report["scanned"] += 1
+                attributes = rule_attributes(row._mapping)
+                if not attributes["business_role"]:
+                    report["skipped_without_role"] += 1
+                    continue
+                key = tuple(attributes.values())
+                entitlements = decisions.get(key)
+                if entitlements is None:
+                    entitlements = decisions[key] = snapshot.evaluate(attributes)
+                stored = row.entitlements or {}
+                if entitlements == stored:
+                    if row.policy_version == snapshot.version:
+                        report["unchanged"] += 1
+                        continue
+                    report["restamped"] += 1
+                    delta = None
+                else:
+                    delta = diff_entitlements(stored, entitlements)
+                    report["changed"].add({"identity_id": row.id, "email": row.primary_email, **delta})
+                if apply:
+                    updates.append({"identity_id": row.id, "entitlements": entitlements, "policy_version": snapshot.version})
+                    # Deactivated people are not invited back into channels
+                    job = self._enqueue_reprovisioning(row, delta, identity_id=row.id) if delta and row.is_active is not False else None
+                    if job is not None:
+                        jobs.append(job)
+            if updates:
+                try:
+                    self.repository.update_entitlements(updates)
+                    self.db.commit()
+                except Exception:
+                    self.db.rollback()
+                    raise
+                report["job_ids"].extend(job.id for job in jobs)
+        
+        if report["job_ids"]:
+            provisioning_workers.notify()
+        elapsed = time.perf_counter() - started
+        report["changed"] = report["changed"].as_dict()
+        report["distinct_attribute_sets"] = len(decisions)
+        report["duration_s"] = round(elapsed, 3)
+        report["identities_per_second"] = round(report["scanned"] / elapsed) if elapsed > 0 else None
+        logger.info(
+            f"Re-evaluated {report['scanned']} identities against policy {snapshot.version}: "
+            f"{report['changed']['count']} changed, {report['restamped']} restamped (applied: {apply})"
+        )
+        return report
+    
+    def get_provisioning_job(self, job_id: int):
+        return self.jobs.get_by_id(job_id)
+    
+    def get_provisioning_jobs(self, identity_id: int):
+        return self.jobs.get_by_identity(identity_id)
+    
     def get_identity(self, identity_id: int) -> Optional[Identity]:
         return self.repository.get_by_id(identity_id)
     
@@ -38,96 +432,84 @@ class IdentityService:
     def get_all_identities(self) -> List[Identity]:
         return self.repository.get_all()
     
-    async def update_identity(self, identity_id: int, update_data: IdentityUpdate) -> Optional[Identity]:
-        identity = self.repository.update(identity_id, update_data)
-        if identity and update_data.business_role:
-            # Re-provision if business role changed
-            await self._provision_to_targets(identity)
-        return identity
+    def list_identities(self, cursor: Optional[str], limit: int, **filters: Any) -> Tuple[List[Identity], Optional[str]]:
+        """Return one keyset page and the cursor for the next one (None on the last page)"""
+        after_id = decode_cursor(cursor) if cursor else None
+        rows = self.repository.list_page(after_id, limit, **filters)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_cursor(rows[-1].id)
+        return rows, None
     
-    def _map_business_role_to_entitlements(self, business_role: str) -> Dict[str, Any]:
-        """Map business roles to entitlements"""
-        if not business_role:
-            raise ValueError("Business role is required")
-            
-        role_mappings = {
-            "developer": {
-                "slack": {"channels": ["#dev-team", "#general", "#tech-updates"]},
-                "permissions": ["read", "write", "code_access"]
-            },
-            "tester": {
-                "slack": {"channels": ["#qa-team", "#general", "#bug-reports"]},
-                "permissions": ["read", "write", "test_access"]
-            },
-            "manager": {
-                "slack": {"channels": ["#management", "#general", "#leadership"]},
-                "permissions": ["read", "write", "admin", "team_management"]
-            },
-            "hr": {
-                "slack": {"channels": ["#hr", "#general", "#announcements"]},
-                "permissions": ["read", "write", "user_management", "employee_data"]
-            },
-            "designer": {
-                "slack": {"channels": ["#design-team", "#general", "#creative"]},
-                "permissions": ["read", "write", "design_tools"]
-            },
-            "analyst": {
-                "slack": {"channels": ["#analytics", "#general", "#data-insights"]},
-                "permissions": ["read", "write", "data_access", "reports"]
-            },
-            "devops": {
-                "slack": {"channels": ["#devops", "#general", "#infrastructure", "#alerts"]},
-                "permissions": ["read", "write", "admin", "infrastructure_access"]
-            },
-            "sales": {
-                "slack": {"channels": ["#sales", "#general", "#customer-updates"]},
-                "permissions": ["read", "write", "crm_access"]
-            },
-            "marketing": {
-                "slack": {"channels": ["#marketing", "#general", "#campaigns"]},
-                "permissions": ["read", "write", "marketing_tools"]
-            },
-            "support": {
-                "slack": {"channels": ["#support", "#general", "#customer-issues"]},
-                "permissions": ["read", "write", "support_tools"]
-            },
-            "intern": {
-                "slack": {"channels": ["#general", "#interns"]},
-                "permissions": ["read"]
-            },
-            "contractor": {
-                "slack": {"channels": ["#general", "#contractors"]},
-                "permissions": ["read", "limited_write"]
-            }
-        }
+    def list_entitlement_holders(
+        self, application: str, type: str, value: str, cursor: Optional[str], limit: int
+    ) -> Tuple[List[Identity], Optional[str]]:
+        """One keyset page of the identities holding an entitlement, and the next cursor"""
+        after_id = decode_cursor(cursor) if cursor else None
+        rows = IdentityEntitlementRepository(self.db).holders_page(application, type, value, after_id, limit)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_cursor(rows[-1].id)
+        return rows, None
+    
+    async def update_identity(self, identity_id: int, update_data: IdentityUpdate) -> Optional[Identity]:
+        current = self.repository.get_by_id(identity_id)
+        if not current:
+            return None
+        old_entitlements, policy_version = self._prepare_update(current, update_data)
         
-        # Check if role exists, if not, log warning and return default
-        role_lower = business_role.lower()
-        if role_lower not in role_mappings:
-            logger.warning(f"Unknown business role '{business_role}', using default entitlements")
-            return {
-                "slack": {"channels": ["#general"]},
-                "permissions": ["read"]
-            }
+        try:
+            identity = self.repository.update(identity_id, update_data, commit=False, policy_version=policy_version)
+            # Only the channel delta goes to Slack; no job at all when nothing changed
+            job = self._enqueue_reprovisioning(identity, diff_entitlements(old_entitlements, identity.entitlements or {}))
+            # The UPDATE returned the changed columns, no refresh needed
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
         
-        return role_mappings[role_lower]
+        if job is not None:
+            provisioning_workers.notify()
+        return identity
+
+class AsyncIdentityService(BaseIdentityService):
+    """Identity writes on an AsyncSession, so the routes never block the event loop"""
+    
+    def __init__(self, db: AsyncSession, slack_service: Optional[SlackService] = None):
+        self.db = db
+        self.repository = AsyncIdentityRepository(db)
+        self.jobs = AsyncProvisioningJobRepository(db)
+        self.slack_service = slack_service or shared_slack_service
     
-    async def _provision_to_targets(self, identity: Identity):
-        """Provision identity to target applications"""
+    async def create_identity(self, identity_data: IdentityCreate) -> Identity:
         try:
-            entitlements = identity.entitlements or {}
-            
-            # Provision to Slack
-            if "slack" in entitlements:
-                slack_config = entitlements["slack"]
-                channels = slack_config.get("channels", [])
-                await self.slack_service.create_user_account(
-                    identity.primary_email, 
-                    identity.first_name, 
-                    identity.last_name, 
-                    channels
-                )
+            policy_version = self._apply_entitlement_policy(identity_data)
+            identity = await self.repository.create(identity_data, commit=False, policy_version=policy_version)
+            self._enqueue_provisioning(identity)
+            await self.db.commit()
+            await self.db.refresh(identity)
         except Exception as e:
-            logger.error(f"Error provisioning to targets: {str(e)}")
-            # Don't fail the whole operation if provisioning fails
-            pass
\ No newline at end of file
+            await self.db.rollback()
+            logger.error(f"Error creating identity: {str(e)}")
+            raise
+        
+        provisioning_workers.notify()
+        return identity
+    
+    async def update_identity(self, identity_id: int, update_data: IdentityUpdate) -> Optional[Identity]:
+        current = await self.repository.get_by_id(identity_id)
+        if not current:
+            return None
+        old_entitlements, policy_version = self._prepare_update(current, update_data)
+        
+        try:
+            identity = await self.repository.update(identity_id, update_data, commit=False, policy_version=policy_version)
+            job = self._enqueue_reprovisioning(identity, diff_entitlements(old_entitlements, identity.entitlements or {}))
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        
+        if job is not None:
+            provisioning_workers.notify()
+        return identity
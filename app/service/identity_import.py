@@ -0,0 +1,100 @@
+from typing import AsyncIterator, Deque, Dict, Any, List, Optional, Tuple
+from collections import deque
+import codecs
+import csv
+import json
+
+# (row number, parsed record or None, parse error or None)
+ImportRecord = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a streamed request body into text lines without buffering the whole upload"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[ImportRecord]:
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row, None, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(record, dict):
+            yield row, None, "Expected a JSON object"
+            continue
+        yield row, record, None
+
+class _LineFeed:
+    """Line source for one csv.reader; lines are appended as they arrive"""
+    def __init__(self):
+        self.lines: Deque[str] = deque()
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[ImportRecord]:
+    """
+    CSV with a header row; empty cells are treated as missing.
+    
+    One csv.reader parses the whole stream, so quoted fields may span lines.
+    It is only advanced once a record's quotes are balanced, i.e. the lines it
+    needs have arrived.
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header = None
+    row = 0
+    in_quotes = False
+    
+    def parse() -> Tuple[Optional[List[str]], Optional[str]]:
+        try:
+            return next(reader), None
+        except csv.Error as e:
+            feed.lines.clear()
+            return None, f"Invalid CSV: {str(e)}"
+    
+    async def records() -> AsyncIterator[Tuple[Optional[List[str]], Optional[str]]]:
+        nonlocal in_quotes
+        async for line in lines:
+            if not in_quotes and not line.strip():
+                continue
+            feed.lines.append(line + "\n")
+            if line.count('"') % 2:
+                in_quotes = not in_quotes
+            if not in_quotes:
+                yield parse()
+        if feed.lines:
+            # Unterminated quoted field at the end of the upload
+            yield parse()
+    
+    async for values, error in records():
+        if header is None:
+            if values is None:
+                return
+            header = [name.strip() for name in values]
+            continue
+        row += 1
+        if error is not None:
+            yield row, None, error
+            continue
+        if len(values) != len(header):
+            yield row, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row, {name: value for name, value in zip(header, values) if value != ""}, None
@@ -0,0 +1,209 @@
+from app.core.config import settings
+from app.service.rules import RuleIndex, apply_rules, entitlement_lists, normalize_value
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import yaml
+except ImportError:  # optional, only needed for YAML policy files
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+class RolePolicy:
+    """Entitlements of one business role; channels and permissions keep their file order"""
+    __slots__ = ("name", "channels", "channel_set", "permissions", "permission_set")
+
+    def __init__(self, name: str, channels: Tuple[str, ...], permissions: Tuple[str, ...]):
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "channels", channels)
+        object.__setattr__(self, "channel_set", frozenset(channels))
+        object.__setattr__(self, "permissions", permissions)
+        object.__setattr__(self, "permission_set", frozenset(permissions))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RolePolicy is immutable")
+
+    def entitlements(self) -> Dict[str, Any]:
+        """A fresh entitlements dict in the shape stored on identities"""
+        return {"slack": {"channels": list(self.channels)}, "permissions": list(self.permissions)}
+
+class PolicySnapshot:
+    """One loaded version of the role policy; never modified after it is built"""
+
+    def __init__(self, roles: Mapping[str, RolePolicy], default: RolePolicy, version: str, source: str,
+                 rules: Optional[RuleIndex] = None):
+        self.roles = MappingProxyType(dict(roles))
+        self.default = default
+        self.rules = rules if rules is not None else RuleIndex()
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+
+    def resolve(self, business_role: str) -> RolePolicy:
+        policy = self.roles.get(normalize_value(business_role))
+        if policy is None:
+            logger.warning(f"Unknown business role '{business_role}', using default entitlements")
+            return self.default
+        return policy
+
+    def evaluate(self, attributes: Mapping[str, Optional[str]]) -> Dict[str, Any]:
+        """Entitlements for normalized identity attributes (see `rule_attributes`): role policy, then rules"""
+        base = self.resolve(attributes.get("business_role") or "")
+        if not self.rules:
+            return base.entitlements()
+        fired, _, _ = self.rules.match(attributes)
+        return apply_rules(base.channels, base.permissions, fired)
+
+    def explain(self, attributes: Mapping[str, Optional[str]]) -> Dict[str, Any]:
+        """Which role policy and rules produced an identity's entitlements"""
+        base = self.resolve(attributes.get("business_role") or "")
+        fired, stopped, candidates = self.rules.match(attributes)
+        return {
+            "policy_version": self.version,
+            "attributes": dict(attributes),
+            "role": base.name,
+            "role_entitlements": base.entitlements(),
+            "rules_evaluated": candidates,
+            "rules_total": len(self.rules),
+            "fired": [rule.canonical() for rule in fired],
+            "stopped": [
+                {"name": rule.name, "priority": rule.priority, "stopped_by": next(r.name for r in fired if r.stop)}
+                for rule in stopped
+            ],
+            "entitlements": apply_rules(base.channels, base.permissions, fired)
+        }
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "default": self.default.entitlements(),
+            "roles": {name: policy.entitlements() for name, policy in self.roles.items()},
+            "rules": [rule.canonical() for rule in self.rules.rules],
+            "rule_index": self.rules.describe()
+        }
+
+def _role_policy(name: str, spec: Any) -> RolePolicy:
+    channels, permissions = entitlement_lists(spec, f"Role '{name}'")
+    return RolePolicy(name, channels, permissions)
+
+def parse_policy(document: Dict[str, Any], source: str) -> PolicySnapshot:
+    """
+    Build a snapshot from a policy document: {"default": {...}, "roles": {name: {...}}, "rules": [...]}.
+    Raises ValueError for a document of the wrong shape.
+    """
+    if not isinstance(document, dict):
+        raise ValueError("Role policy must be a mapping")
+    roles_spec = document.get("roles")
+    if not isinstance(roles_spec, dict) or not roles_spec:
+        raise ValueError("Role policy needs a non-empty 'roles' mapping")
+    roles: Dict[str, RolePolicy] = {}
+    for name, spec in roles_spec.items():
+        key = str(name).strip().lower()
+        if key in roles:
+            raise ValueError(f"Role '{name}' is defined more than once")
+        roles[key] = _role_policy(key, spec)
+    default = _role_policy("default", document.get("default"))
+    rules_spec = document.get("rules") or []
+    if not isinstance(rules_spec, list):
+        raise ValueError("Role policy 'rules' must be a list")
+    rules = RuleIndex(rules_spec)
+
+    canonical = json.dumps(
+        {
+            "default": default.entitlements(),
+            "roles": {name: roles[name].entitlements() for name in sorted(roles)},
+            "rules": [rule.canonical() for rule in rules.rules]
+        },
+        sort_keys=True
+    )
+    version = hashlib.sha256(canonical.encode()).hexdigest()[:12]
+    return PolicySnapshot(roles, default, version, source, rules)
+
+def load_policy_file(path: str) -> PolicySnapshot:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuntimeError("PyYAML is required for YAML role policy files")
+            document = yaml.safe_load(f)
+        else:
+            document = json.load(f)
+    return parse_policy(document or {}, path)
+
+class RolePolicyRegistry:
+    """
+    Role policy loaded from a JSON or YAML file.
+
+    Readers take `snapshot` and use it for the whole operation. The file's mtime is
+    checked at most every `check_interval` seconds; a changed file is parsed into a new
+    snapshot that replaces the old one in a single assignment. A file that fails to
+    parse is logged and the previous snapshot stays in use.
+    """
+
+    def __init__(self, path: Optional[str] = None, check_interval: Optional[float] = None):
+        self.path = path or settings.role_policy_path
+        self.check_interval = settings.role_policy_check_interval if check_interval is None else check_interval
+        self._lock = threading.Lock()
+        self._snapshot: Optional[PolicySnapshot] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def snapshot(self) -> PolicySnapshot:
+        if self._snapshot is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload()
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self.snapshot.version
+
+    def reload(self, force: bool = False) -> bool:
+        """Re-read the file if it changed (or always with force); returns True when a new snapshot was loaded"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                if self._snapshot is None:
+                    raise
+                self.last_error = str(e)
+                logger.error(f"Role policy file unavailable, keeping version {self._snapshot.version}: {str(e)}")
+                return False
+            if not force and self._snapshot is not None and mtime == self._mtime:
+                return False
+
+            try:
+                snapshot = load_policy_file(self.path)
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                # Remember the broken mtime so it is not re-parsed until the file changes again
+                self._mtime = mtime
+                self.reload_errors += 1
+                self.last_error = str(e)
+                logger.error(f"Role policy reload failed, keeping version {self._snapshot.version}: {str(e)}")
+                return False
+
+            self._mtime = mtime
+            self.last_error = None
+            if self._snapshot is not None and snapshot.version == self._snapshot.version:
+                return False
+            previous = self._snapshot.version if self._snapshot else None
+            self._snapshot = snapshot
+            self.reloads += 1
+            logger.info(f"Loaded role policy version {snapshot.version} (previous: {previous})")
+            return True
+
+role_policies = RolePolicyRegistry()
@@ -0,0 +1,210 @@
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.provisioning import ProvisioningJob
+from app.repository.provisioning import ProvisioningJobRepository
+from app.service.slack import SlackService, slack_service as shared_slack_service
+from typing import Dict, Any, Optional, List, Callable
+import asyncio
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+# Channel errors that a retry cannot fix; the job succeeds and records them
+PERMANENT_CHANNEL_ERRORS = {
+    "channel_not_found",
+    "is_archived",
+    "cant_invite_self",
+    "user_is_restricted",
+    "user_is_ultra_restricted",
+    "not_in_channel",
+    "cant_kick_self",
+    "cant_kick_from_general",
+}
+
+class RetryableProvisioningError(Exception):
+    pass
+
+async def run_provision(slack: SlackService, payload: Dict[str, Any]) -> Dict[str, Any]:
+    result = await slack.create_user_account(
+        payload["email"],
+        payload.get("first_name"),
+        payload.get("last_name"),
+        payload.get("channels", [])
+    )
+    if not result.get("user_id"):
+        raise RetryableProvisioningError(result.get("error") or f"Slack user {result.get('status')}")
+    
+    transient = {
+        channel: error for channel, error in (result.get("channels_failed") or {}).items()
+        if error not in PERMANENT_CHANNEL_ERRORS
+    }
+    if transient:
+        raise RetryableProvisioningError(f"Channel assignment failed: {transient}")
+    return result
+
+async def run_reprovision(slack: SlackService, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply an entitlement delta: invite to added channels, kick from removed ones"""
+    result = await slack.apply_channel_delta(
+        payload["email"],
+        payload.get("first_name"),
+        payload.get("last_name"),
+        payload.get("channels_added", []),
+        payload.get("channels_removed", [])
+    )
+    if not result.get("user_id") and payload.get("channels_added"):
+        raise RetryableProvisioningError(result.get("error") or f"Slack user {result.get('status')}")
+    
+    transient = {
+        channel: error for channel, error in (result.get("channels_failed") or {}).items()
+        if error not in PERMANENT_CHANNEL_ERRORS
+    }
+    if transient:
+        raise RetryableProvisioningError(f"Channel delta failed: {transient}")
+    return result
+
+async def run_bulk_provision(slack: SlackService, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Provision a batch of users, inviting everyone headed for a channel in one call"""
+    users = payload.get("users", [])
+    if not settings.slack_bot_token:
+        return {"status": "mocked", "users": len(users)}
+    
+    semaphore = asyncio.Semaphore(settings.slack_invite_concurrency)
+    
+    async def get_account(user: Dict[str, Any]):
+        async with semaphore:
+            account = await slack.get_or_create_user(user["email"], user.get("first_name"), user.get("last_name"))
+        return user, account
+    
+    accounts = await asyncio.gather(*(get_account(user) for user in users))
+    failed_users = {
+        user["email"]: account.get("error") or account.get("status")
+        for user, account in accounts if not account.get("user_id")
+    }
+    assignments = {
+        account["user_id"]: user.get("channels", [])
+        for user, account in accounts if account.get("user_id")
+    }
+    channels = await slack.bulk_assign_channels(assignments)
+    
+    transient = {
+        channel: errors for channel, outcome in channels.items()
+        if (errors := {user_id: error for user_id, error in outcome["failed"].items() if error not in PERMANENT_CHANNEL_ERRORS})
+    }
+    if failed_users or transient:
+        raise RetryableProvisioningError(f"Bulk provisioning incomplete: users={failed_users} channels={transient}")
+    
+    return {
+        "status": "completed",
+        "users": {user["email"]: account["user_id"] for user, account in accounts},
+        "channels": channels
+    }
+
+JOB_HANDLERS = {
+    "provision": run_provision,
+    "reprovision": run_reprovision,
+    "bulk_provision": run_bulk_provision,
+}
+
+class ProvisioningWorkerPool:
+    """Pool of async workers that drain the provisioning outbox"""
+    
+    def __init__(
+        self,
+        slack: Optional[SlackService] = None,
+        session_factory: Callable[[], Session] = SessionLocal,
+        workers: Optional[int] = None
+    ):
+        self.slack = slack or shared_slack_service
+        self.session_factory = session_factory
+        self.workers = workers if workers is not None else settings.provisioning_workers
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _run_in_session(self, fn: Callable[[ProvisioningJobRepository], Any]) -> Any:
+        db = self.session_factory()
+        try:
+            return fn(ProvisioningJobRepository(db))
+        finally:
+            db.close()
+    
+    async def _db(self, fn: Callable[[ProvisioningJobRepository], Any]) -> Any:
+        # The outbox uses the synchronous session, keep it off the event loop
+        return await asyncio.to_thread(self._run_in_session, fn)
+    
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(settings.provisioning_retry_backoff_max, settings.provisioning_retry_backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def process_next(self) -> Optional[int]:
+        """Claim and run one job, returns its ID or None when the outbox is empty"""
+        job: Optional[ProvisioningJob] = await self._db(lambda repo: repo.claim_next())
+        if job is None:
+            return None
+        
+        handler = JOB_HANDLERS.get(job.operation)
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown provisioning operation '{job.operation}'")
+            result = await handler(self.slack, job.payload or {})
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+            retry_in = self._retry_delay(job.attempts)
+            logger.warning(f"Provisioning job {job.id} attempt {job.attempts} failed: {error}")
+            
+            def fail(repo: ProvisioningJobRepository):
+                repo.mark_failed(repo.get_by_id(job.id), error, retry_in)
+            await self._db(fail)
+        else:
+            def succeed(repo: ProvisioningJobRepository):
+                repo.mark_succeeded(repo.get_by_id(job.id), result)
+            await self._db(succeed)
+        return job.id
+    
+    async def _worker(self, number: int):
+        while True:
+            try:
+                job_id = await self.process_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Provisioning worker {number} error: {str(e)}")
+                job_id = None
+            
+            if job_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.provisioning_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+    
+    def notify(self):
+        """Wake idle workers after a job was committed (safe to call from any thread)"""
+        if self._wakeup is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+    
+    async def start(self):
+        if self._tasks:
+            return
+        try:
+            requeued = await self._db(lambda repo: repo.requeue_stale(settings.provisioning_job_timeout))
+            if requeued:
+                logger.info(f"Requeued {requeued} stale provisioning jobs")
+        except Exception as e:
+            logger.error(f"Could not requeue stale provisioning jobs: {str(e)}")
+        
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(number)) for number in range(self.workers)]
+    
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+        self._loop = None
+
+provisioning_workers = ProvisioningWorkerPool()
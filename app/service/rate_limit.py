@@ -0,0 +1,142 @@
+import httpx
+from app.core.config import settings
+from typing import Dict, Any, Optional
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# Requests per minute for each Slack API method, taken from Slack's rate limit tiers
+# (Tier 2: 20+/min, Tier 3: 50+/min, Tier 4: 100+/min). Unknown methods use Tier 2.
+SLACK_METHOD_LIMITS = {
+    "users.lookupByEmail": 50,
+    "users.info": 100,
+    "users.list": 20,
+    "conversations.invite": 50,
+    "conversations.kick": 50,
+    "conversations.list": 20,
+    "conversations.members": 100,
+    "scim/v1/Users": 20,
+    "admin.users.setInactive": 20,
+}
+DEFAULT_METHOD_LIMIT = 20
+
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class TokenBucket:
+    """Token bucket for a single Slack API method; waiters are served in FIFO order"""
+    
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None):
+        self.rate_per_minute = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        # Roughly ten seconds worth of calls, so a burst never trips the per-minute window
+        self.capacity = burst or max(1, int(rate_per_minute // 6))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self.throttled = 0
+        self._lock = asyncio.Lock()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = self.blocked_until - now
+                    if delay <= 0:
+                        if self.tokens >= 1:
+                            self.tokens -= 1
+                            return
+                        delay = (1 - self.tokens) / self.rate
+                    await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+    
+    def penalize(self, retry_after: float):
+        """Stop issuing calls until Slack's Retry-After window has passed"""
+        now = time.monotonic()
+        self.throttled += 1
+        self.tokens = 0.0
+        self.updated = now
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+class SlackRequestScheduler:
+    """Routes every Slack call through a per-method token bucket with 429-aware retries"""
+    
+    def __init__(self, limits: Optional[Dict[str, float]] = None):
+        self.limits = {**SLACK_METHOD_LIMITS, **settings.slack_rate_limits, **(limits or {})}
+        self.max_retries = settings.slack_rate_limit_max_retries
+        self.backoff_base = settings.slack_rate_limit_backoff_base
+        self.backoff_max = settings.slack_rate_limit_backoff_max
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.retries = 0
+    
+    def bucket(self, api_method: str) -> TokenBucket:
+        bucket = self.buckets.get(api_method)
+        if bucket is None:
+            bucket = TokenBucket(self.limits.get(api_method, DEFAULT_METHOD_LIMIT))
+            self.buckets[api_method] = bucket
+        return bucket
+    
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter so retrying callers do not wake up together
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+    
+    async def request(self, client: httpx.AsyncClient, http_method: str, api_method: str, url: str, **kwargs) -> httpx.Response:
+        bucket = self.bucket(api_method)
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                response = await client.request(http_method, url, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"Slack {api_method} connection error, retrying: {str(e)}")
+            else:
+                if response.status_code == 429:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"), self._backoff(attempt))
+                    bucket.penalize(retry_after)
+                    logger.warning(f"Slack {api_method} rate limited, retry after {retry_after}s")
+                    if attempt >= self.max_retries:
+                        return response
+                elif response.status_code >= 500 and attempt < self.max_retries:
+                    logger.warning(f"Slack {api_method} returned {response.status_code}, retrying")
+                else:
+                    return response
+            
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(self._backoff(attempt))
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": sum(bucket.waiting for bucket in self.buckets.values()),
+            "retries": self.retries,
+            "methods": {
+                api_method: {
+                    "rate_per_minute": bucket.rate_per_minute,
+                    "burst": bucket.capacity,
+                    "queued": bucket.waiting,
+                    "tokens": round(bucket.tokens, 2),
+                    "throttled": bucket.throttled,
+                    "blocked_for": round(max(bucket.blocked_until - time.monotonic(), 0.0), 2)
+                }
+                for api_method, bucket in self.buckets.items()
+            }
+        }
@@ -0,0 +1,189 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from app.core.config import settings
+from app.models.identity import Identity
+from app.service.slack import SlackService, normalize_email
+from app.service.entitlements import slack_channels
+from typing import Dict, Any, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DriftBucket:
+    """Counts every drifted account but only keeps a bounded sample (unless all items are needed)"""
+    
+    def __init__(self, sample_size: int, keep_all: bool = False):
+        self.sample_size = sample_size
+        self.count = 0
+        self.sample: List[Dict[str, Any]] = []
+        self.items: Optional[List[Dict[str, Any]]] = [] if keep_all else None
+    
+    def add(self, item: Dict[str, Any]):
+        self.count += 1
+        if len(self.sample) < self.sample_size:
+            self.sample.append(item)
+        if self.items is not None:
+            self.items.append(item)
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "sample": self.sample}
+
+class ReconciliationService:
+    """Diff the identities table against the Slack workspace in one pass over each side"""
+    
+    def __init__(self, db: Session, slack: SlackService):
+        self.db = db
+        self.slack = slack
+    
+    async def _page(self, api_method: str, key: str, params: Dict[str, Any]):
+        cursor = None
+        while True:
+            page_params = dict(params)
+            if cursor:
+                page_params["cursor"] = cursor
+            response = await self.slack.request("GET", api_method, params=page_params)
+            data = response.json() if response.status_code == 200 else {}
+            if not data.get("ok"):
+                raise RuntimeError(f"Slack {api_method} failed: {data.get('error', response.status_code)}")
+            yield data.get(key, [])
+            cursor = data.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                return
+    
+    async def _load_slack_users(self) -> Dict[str, Tuple[str, bool]]:
+        """Normalized email -> (Slack user ID, deleted) for every human account"""
+        users: Dict[str, Tuple[str, bool]] = {}
+        async for members in self._page("users.list", "members", {"limit": 200}):
+            for user in members:
+                email = user.get("profile", {}).get("email")
+                if not email or user.get("is_bot") or user.get("id") == "USLACKBOT":
+                    continue
+                users[normalize_email(email)] = (user["id"], bool(user.get("deleted")))
+        return users
+    
+    def _diff_identities(self, slack_users: Dict[str, Tuple[str, bool]], report: Dict[str, Any]) -> Dict[str, Set[str]]:
+        """
+        Stream identities and match them against the Slack users by email.
+        
+        Matched Slack users are popped from the map, so whatever remains at the end
+        has no identity. Returns channel -> Slack user IDs expected in that channel.
+        """
+        missing, mismatched = report["missing"], report["mismatched"]
+        expected_members: Dict[str, Set[str]] = {}
+        rows = self.db.execute(
+            select(
+                Identity.id, Identity.primary_email, Identity.first_name, Identity.last_name,
+                Identity.is_active, Identity.entitlements
+            )
+            .execution_options(yield_per=settings.reconcile_batch_size)
+        )
+        for identity_id, email, first_name, last_name, is_active, entitlements in rows:
+            report["identities_scanned"] += 1
+            if not email:
+                continue
+            slack_user = slack_users.pop(normalize_email(email), None)
+            
+            if is_active is False:
+                if slack_user and not slack_user[1]:
+                    mismatched.add({"identity_id": identity_id, "email": email, "user_id": slack_user[0], "issue": "active_in_slack"})
+                continue
+            if slack_user is None:
+                missing.add({
+                    "identity_id": identity_id,
+                    "email": email,
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "channels": slack_channels(entitlements)
+                })
+                continue
+            if slack_user[1]:
+                mismatched.add({"identity_id": identity_id, "email": email, "user_id": slack_user[0], "issue": "deactivated_in_slack"})
+                continue
+            for channel in slack_channels(entitlements):
+                expected_members.setdefault(channel, set()).add(slack_user[0])
+        return expected_members
+    
+    async def _channel_gaps(self, expected_members: Dict[str, Set[str]], report: Dict[str, Any]) -> Dict[str, List[str]]:
+        """Page each channel's members once and return Slack user ID -> channels they are missing"""
+        resolved, unknown = await self.slack.channels.resolve_many(list(expected_members))
+        report["unknown_channels"] = list(unknown)
+        gaps: Dict[str, List[str]] = {}
+        
+        for channel, channel_id in resolved.items():
+            members: Set[str] = set()
+            async for page in self._page("conversations.members", "members", {"channel": channel_id, "limit": 1000}):
+                members.update(page)
+            absent = expected_members[channel] - members
+            report["channel_gaps"][channel] = len(absent)
+            for user_id in absent:
+                gaps.setdefault(user_id, []).append(channel)
+                report["mismatched"].add({"user_id": user_id, "issue": "missing_channel", "channel": channel})
+        return gaps
+    
+    async def _apply(self, missing: List[Dict[str, Any]], gaps: Dict[str, List[str]], orphans: List[str]) -> Dict[str, Any]:
+        """Batch the corrective calls: create missing users, then one invite per channel"""
+        semaphore = asyncio.Semaphore(settings.slack_invite_concurrency)
+        
+        async def create(item: Dict[str, Any]):
+            async with semaphore:
+                account = await self.slack.get_or_create_user(
+                    item["email"], item["first_name"] or item["email"].split("@")[0], item["last_name"]
+                )
+            return item, account
+        
+        created = await asyncio.gather(*(create(item) for item in missing))
+        assignments = {user_id: list(channels) for user_id, channels in gaps.items()}
+        for item, account in created:
+            if account.get("user_id"):
+                assignments.setdefault(account["user_id"], []).extend(item["channels"])
+        invites = await self.slack.bulk_assign_channels(assignments) if assignments else {}
+        
+        async def deactivate(user_id: str):
+            async with semaphore:
+                return await self.slack.delete_user(user_id)
+        
+        deactivated = await asyncio.gather(*(deactivate(user_id) for user_id in orphans))
+        return {
+            "users_created": sum(1 for _, account in created if account.get("user_id")),
+            "users_failed": [item["email"] for item, account in created if not account.get("user_id")],
+            "invites": {
+                channel: {"invited": len(outcome["invited"]), "failed": outcome["failed"]}
+                for channel, outcome in invites.items()
+            },
+            "orphans_deactivated": sum(1 for result in deactivated if result["status"] != "failed")
+        }
+    
+    async def run(self, apply: bool = False, deactivate_orphans: bool = False) -> Dict[str, Any]:
+        sample_size = settings.reconcile_sample_size
+        report: Dict[str, Any] = {
+            "identities_scanned": 0,
+            "slack_users_scanned": 0,
+            # When applying, the missing accounts are needed in full, not just a sample
+            "missing": DriftBucket(sample_size, keep_all=apply),
+            "orphaned": DriftBucket(sample_size, keep_all=apply and deactivate_orphans),
+            "mismatched": DriftBucket(sample_size),
+            "channel_gaps": {},
+            "unknown_channels": [],
+            "applied": None
+        }
+        
+        slack_users = await self._load_slack_users()
+        report["slack_users_scanned"] = len(slack_users)
+        
+        expected_members = await asyncio.to_thread(self._diff_identities, slack_users, report)
+        
+        for email, (user_id, deleted) in slack_users.items():
+            if not deleted:
+                report["orphaned"].add({"email": email, "user_id": user_id})
+        slack_users.clear()
+        
+        gaps = await self._channel_gaps(expected_members, report)
+        
+        if apply:
+            orphans = [item["user_id"] for item in report["orphaned"].items or []]
+            report["applied"] = await self._apply(report["missing"].items, gaps, orphans)
+        
+        for key in ("missing", "orphaned", "mismatched"):
+            report[key] = report[key].as_dict()
+        return report
@@ -0,0 +1,202 @@
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+# Identity columns rules may test
+RULE_ATTRIBUTES = ("business_role", "department", "location", "employment_type", "employment_status")
+
+def normalize_value(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip().lower()
+    return value or None
+
+def rule_attributes(source: Any) -> Dict[str, Optional[str]]:
+    """Normalized rule attributes of an identity row, schema or dict"""
+    if isinstance(source, Mapping):
+        return {attribute: normalize_value(source.get(attribute)) for attribute in RULE_ATTRIBUTES}
+    return {attribute: normalize_value(getattr(source, attribute, None)) for attribute in RULE_ATTRIBUTES}
+
+def _mapping(spec: Any, where: str) -> Dict[str, Any]:
+    if spec is None:
+        return {}
+    if not isinstance(spec, dict):
+        raise ValueError(f"{where} must be a mapping")
+    return spec
+
+def _ordered(items: Any, where: str) -> Tuple[str, ...]:
+    # Deduplicated, order kept
+    if items is None:
+        return ()
+    if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+        raise ValueError(f"{where} must be a list of strings")
+    return tuple(dict.fromkeys(item.strip() for item in items if item.strip()))
+
+def entitlement_lists(spec: Any, where: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Slack channels and permissions of an entitlements block: {"slack": {"channels": [...]}, "permissions": [...]}"""
+    spec = _mapping(spec, where)
+    slack = _mapping(spec.get("slack"), f"{where}: 'slack'")
+    return (
+        _ordered(slack.get("channels"), f"{where}: 'slack.channels'"),
+        _ordered(spec.get("permissions"), f"{where}: 'permissions'")
+    )
+
+def _predicates(name: str, spec: Any, key: str) -> Mapping[str, FrozenSet[str]]:
+    predicates = {}
+    for attribute, values in _mapping(spec, f"Rule '{name}': '{key}'").items():
+        if attribute not in RULE_ATTRIBUTES:
+            raise ValueError(f"Rule '{name}' tests unknown attribute '{attribute}'")
+        values = values if isinstance(values, list) else [values]
+        if not all(isinstance(value, (str, int)) for value in values):
+            raise ValueError(f"Rule '{name}': '{key}.{attribute}' must be a value or a list of values")
+        normalized = frozenset(filter(None, (normalize_value(value) for value in values)))
+        if not normalized:
+            raise ValueError(f"Rule '{name}' has no values for '{attribute}'")
+        predicates[attribute] = normalized
+    return MappingProxyType(predicates)
+
+class Rule:
+    """
+    Grant and/or revoke entitlements when every `when` predicate holds and no `unless`
+    predicate does. A predicate is an attribute with one value or a list of values.
+    """
+    __slots__ = (
+        "name", "priority", "position", "when", "unless", "stop",
+        "grant_channels", "grant_permissions", "revoke_channels", "revoke_permissions"
+    )
+
+    def __init__(self, spec: Dict[str, Any], position: int):
+        spec = _mapping(spec, f"Rule #{position + 1}")
+        name = str(spec.get("name") or "").strip()
+        if not name:
+            raise ValueError(f"Rule #{position + 1} needs a name")
+        try:
+            priority = int(spec.get("priority", 0))
+        except (TypeError, ValueError):
+            raise ValueError(f"Rule '{name}': 'priority' must be an integer")
+        self.name = name
+        self.priority = priority
+        self.position = position
+        self.when = _predicates(name, spec.get("when"), "when")
+        self.unless = _predicates(name, spec.get("unless"), "unless")
+        self.stop = bool(spec.get("stop", False))
+        self.grant_channels, self.grant_permissions = entitlement_lists(spec.get("grant"), f"Rule '{name}' grant")
+        revoke_channels, revoke_permissions = entitlement_lists(spec.get("revoke"), f"Rule '{name}' revoke")
+        self.revoke_channels = frozenset(revoke_channels)
+        self.revoke_permissions = frozenset(revoke_permissions)
+
+    def matches(self, attributes: Mapping[str, Optional[str]]) -> bool:
+        for attribute, values in self.when.items():
+            if attributes.get(attribute) not in values:
+                return False
+        for attribute, values in self.unless.items():
+            if attributes.get(attribute) in values:
+                return False
+        return True
+
+    def canonical(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "priority": self.priority,
+            "when": {attribute: sorted(values) for attribute, values in self.when.items()},
+            "unless": {attribute: sorted(values) for attribute, values in self.unless.items()},
+            "stop": self.stop,
+            "grant": {"slack": {"channels": list(self.grant_channels)}, "permissions": list(self.grant_permissions)},
+            "revoke": {"slack": {"channels": sorted(self.revoke_channels)}, "permissions": sorted(self.revoke_permissions)}
+        }
+
+class RuleIndex:
+    """
+    Rules compiled for lookup instead of a scan.
+
+    Rules are ordered by priority (highest first, file order on ties). Each rule is
+    filed in a hash keyed on one of its `when` attributes: the one with the most
+    distinct values across the rule set, i.e. the one expected to match the fewest
+    identities. Evaluating an identity costs one hash lookup per indexed attribute
+    plus a full predicate check of the few candidates found there. Rules without
+    `when` predicates apply to everyone and are always candidates.
+    """
+
+    def __init__(self, specs: Iterable[Dict[str, Any]] = ()):
+        rules = [Rule(spec, position) for position, spec in enumerate(specs)]
+        names = [rule.name for rule in rules]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate rule names: {', '.join(duplicates)}")
+        rules.sort(key=lambda rule: (-rule.priority, rule.position))
+        for order, rule in enumerate(rules):
+            rule.position = order
+        self.rules: Tuple[Rule, ...] = tuple(rules)
+
+        cardinality: Dict[str, set] = {}
+        for rule in rules:
+            for attribute, values in rule.when.items():
+                cardinality.setdefault(attribute, set()).update(values)
+        self.cardinality = {attribute: len(values) for attribute, values in cardinality.items()}
+
+        index: Dict[str, Dict[str, List[Rule]]] = {}
+        unconditional: List[Rule] = []
+        self.key_attribute: Dict[str, Optional[str]] = {}
+        for rule in rules:
+            if not rule.when:
+                unconditional.append(rule)
+                self.key_attribute[rule.name] = None
+                continue
+            key = max(rule.when, key=lambda attribute: (self.cardinality[attribute], -RULE_ATTRIBUTES.index(attribute)))
+            self.key_attribute[rule.name] = key
+            buckets = index.setdefault(key, {})
+            for value in rule.when[key]:
+                buckets.setdefault(value, []).append(rule)
+        self.index = {
+            attribute: {value: tuple(bucket) for value, bucket in buckets.items()}
+            for attribute, buckets in index.items()
+        }
+        self.unconditional = tuple(unconditional)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def candidates(self, attributes: Mapping[str, Optional[str]]) -> List[Rule]:
+        found = list(self.unconditional)
+        for attribute, buckets in self.index.items():
+            bucket = buckets.get(attributes.get(attribute))
+            if bucket:
+                found.extend(bucket)
+        found.sort(key=lambda rule: rule.position)
+        return found
+
+    def match(self, attributes: Mapping[str, Optional[str]]) -> Tuple[List[Rule], List[Rule], int]:
+        """Fired rules in priority order, matching rules cut off by a `stop` rule, and the candidate count"""
+        candidates = self.candidates(attributes)
+        fired: List[Rule] = []
+        stopped: List[Rule] = []
+        for rule in candidates:
+            if not rule.matches(attributes):
+                continue
+            if stopped or (fired and fired[-1].stop):
+                stopped.append(rule)
+                continue
+            fired.append(rule)
+        return fired, stopped, len(candidates)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "rules": len(self.rules),
+            "cardinality": self.cardinality,
+            "indexed_on": {attribute: len(buckets) for attribute, buckets in self.index.items()},
+            "unconditional": [rule.name for rule in self.unconditional]
+        }
+
+def apply_rules(channels: Tuple[str, ...], permissions: Tuple[str, ...], fired: List[Rule]) -> Dict[str, Any]:
+    """
+    Apply fired rules to base channels/permissions, lowest priority first, so a
+    higher-priority rule has the last word on anything two rules disagree on.
+    """
+    channels, permissions = dict.fromkeys(channels), dict.fromkeys(permissions)
+    for rule in reversed(fired):
+        for channel in rule.revoke_channels:
+            channels.pop(channel, None)
+        for permission in rule.revoke_permissions:
+            permissions.pop(permission, None)
+        channels.update(dict.fromkeys(rule.grant_channels))
+        permissions.update(dict.fromkeys(rule.grant_permissions))
+    return {"slack": {"channels": list(channels)}, "permissions": list(permissions)}
@@ -1,64 +1,330 @@
 import httpx
 from app.core.config import settings
-from typing import Dict, Any, Optional
+from app.service.rate_limit import SlackRequestScheduler
+from app.service.cache import TTLCache, SingleFlight
+from app.service.channels import ChannelResolver
+from typing import Dict, Any, Optional, List
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+def build_slack_client() -> httpx.AsyncClient:
+    """Build a pooled keep-alive HTTP client for the Slack API"""
+    http2 = settings.slack_http2
+    if http2 and not _http2_available():
+        logger.warning("SLACK_HTTP2 is enabled but the 'h2' package is not installed, falling back to HTTP/1.1")
+        http2 = False
+    
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.slack_max_connections,
+            max_keepalive_connections=settings.slack_max_keepalive_connections,
+            keepalive_expiry=settings.slack_keepalive_expiry
+        ),
+        timeout=httpx.Timeout(
+            settings.slack_http_timeout,
+            connect=settings.slack_http_connect_timeout
+        )
+    )
+
 class SlackService:
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, scheduler: Optional[SlackRequestScheduler] = None):
         self.base_url = "https://slack.com/api"
         self.headers = {
             "Authorization": f"Bearer {settings.slack_bot_token}",
             "Content-Type": "application/json"
         }
+        self._client = client
+        self.scheduler = scheduler or SlackRequestScheduler()
+        self.user_cache = TTLCache(settings.slack_user_cache_size, settings.slack_user_cache_ttl)
+        self.channels = ChannelResolver(self)
+        self._inflight_users = SingleFlight()
+        self._cache_warmer: Optional[asyncio.Task] = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared HTTP client, created lazily if the service was not started"""
+        if self._client is None or self._client.is_closed:
+            self._client = build_slack_client()
+        return self._client
+    
+    async def start(self):
+        """Open the pooled HTTP client (called on application startup)"""
+        if self._client is None or self._client.is_closed:
+            self._client = build_slack_client()
+    
+    async def close(self):
+        """Close the pooled HTTP client (called on application shutdown)"""
+        if self._cache_warmer is not None:
+            self._cache_warmer.cancel()
+            self._cache_warmer = None
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+    
+    async def request(self, http_method: str, api_method: str, path: Optional[str] = None, **kwargs) -> httpx.Response:
+        """Send a Slack API call through the rate-limit scheduler"""
+        return await self.scheduler.request(
+            self.client,
+            http_method,
+            api_method,
+            f"{self.base_url}/{path or api_method}",
+            headers=self.headers,
+            **kwargs
+        )
     
     async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/users.lookupByEmail",
-                headers=self.headers,
-                params={"email": email}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("user") if data.get("ok") else None
-            return None
+        key = normalize_email(email)
+        user = self.user_cache.get(key)
+        if user is not None:
+            return user
+        
+        response = await self.request("GET", "users.lookupByEmail", params={"email": email})
+        if response.status_code == 200:
+            data = response.json()
+            user = data.get("user") if data.get("ok") else None
+            if user:
+                self.user_cache.set(key, user)
+            return user
+        return None
+    
+    async def warm_user_cache(self) -> int:
+        """
+        Page through users.list and load every active human user with an email into
+        the cache. Deactivated accounts and bots are left out, so lookups for them go
+        to Slack instead of reporting an existing user.
+        """
+        cached = 0
+        cursor = None
+        while cached < self.user_cache.maxsize:
+            params = {"limit": 200}
+            if cursor:
+                params["cursor"] = cursor
+            response = await self.request("GET", "users.list", params=params)
+            data = response.json() if response.status_code == 200 else {}
+            if not data.get("ok"):
+                logger.warning(f"Slack user cache warm-up stopped: {data.get('error', response.status_code)}")
+                break
+            
+            for user in data.get("members", []):
+                if user.get("deleted") or user.get("is_bot"):
+                    continue
+                email = user.get("profile", {}).get("email")
+                if email:
+                    self.user_cache.set(normalize_email(email), user)
+                    cached += 1
+            
+            cursor = data.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                break
+        
+        logger.info(f"Slack user cache warmed with {cached} users")
+        return cached
+    
+    def start_cache_warmer(self, interval: float = 0.0):
+        """Warm the user cache in the background, then again every `interval` seconds if set"""
+        async def run():
+            while True:
+                try:
+                    await self.warm_user_cache()
+                except Exception as e:
+                    logger.error(f"Slack user cache warm-up failed: {str(e)}")
+                if interval <= 0:
+                    return
+                await asyncio.sleep(interval)
+        
+        if self._cache_warmer is None or self._cache_warmer.done():
+            self._cache_warmer = asyncio.create_task(run())
+    
+    async def _invite_to_channel(self, channel_id: str, user_ids: List[str]) -> Dict[str, Any]:
+        """Invite one or more users to a channel with a single conversations.invite call"""
+        payload = {"channel": channel_id, "users": ",".join(user_ids)}
+        if len(user_ids) > 1:
+            # Keep inviting the valid users when some IDs are rejected
+            payload["force"] = True
+        
+        try:
+            response = await self.request("POST", "conversations.invite", json=payload)
+        except httpx.HTTPError as e:
+            return {"ok": False, "error": str(e) or e.__class__.__name__}
+        
+        if response.status_code != 200:
+            return {"ok": False, "error": f"http_{response.status_code}"}
+        
+        data = response.json()
+        if data.get("ok") or data.get("error") == "already_in_channel":
+            return {"ok": True, "errors": data.get("errors", [])}
+        return {"ok": False, "error": data.get("error", "unknown_error")}
     
     async def invite_user_to_channel(self, user_id: str, channel_id: str) -> bool:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/conversations.invite",
-                headers=self.headers,
-                json={"channel": channel_id, "users": user_id}
-            )
-            return response.status_code == 200 and response.json().get("ok", False)
+        result = await self._invite_to_channel(channel_id, [user_id])
+        return result["ok"]
     
-    async def create_slack_user(self, email: str, first_name: str, last_name: str = None) -> Dict[str, Any]:
-        """Create new user in Slack workspace"""
-        async with httpx.AsyncClient() as client:
-            user_data = {
+    async def assign_channels(self, user_id: str, channels: List[str]) -> Dict[str, Optional[str]]:
+        """Invite a user to several channels concurrently, returns channel -> error (None on success)"""
+        resolved, unknown = await self.channels.resolve_many(list(dict.fromkeys(channels)))
+        semaphore = asyncio.Semaphore(settings.slack_invite_concurrency)
+        
+        async def invite(channel: str, channel_id: str):
+            async with semaphore:
+                result = await self._invite_to_channel(channel_id, [user_id])
+            return channel, None if result["ok"] else result["error"]
+        
+        results = await asyncio.gather(*(invite(channel, channel_id) for channel, channel_id in resolved.items()))
+        outcome = dict(results)
+        outcome.update(unknown)
+        return outcome
+    
+    async def _kick_from_channel(self, channel_id: str, user_id: str) -> Dict[str, Any]:
+        try:
+            response = await self.request("POST", "conversations.kick", json={"channel": channel_id, "user": user_id})
+        except httpx.HTTPError as e:
+            return {"ok": False, "error": str(e) or e.__class__.__name__}
+        
+        if response.status_code != 200:
+            return {"ok": False, "error": f"http_{response.status_code}"}
+        
+        data = response.json()
+        if data.get("ok") or data.get("error") == "not_in_channel":
+            return {"ok": True}
+        return {"ok": False, "error": data.get("error", "unknown_error")}
+    
+    async def remove_channels(self, user_id: str, channels: List[str]) -> Dict[str, Optional[str]]:
+        """Remove a user from several channels concurrently, returns channel -> error (None on success)"""
+        resolved, unknown = await self.channels.resolve_many(list(dict.fromkeys(channels)))
+        semaphore = asyncio.Semaphore(settings.slack_invite_concurrency)
+        
+        async def kick(channel: str, channel_id: str):
+            async with semaphore:
+                result = await self._kick_from_channel(channel_id, user_id)
+            return channel, None if result["ok"] else result["error"]
+        
+        results = await asyncio.gather(*(kick(channel, channel_id) for channel, channel_id in resolved.items()))
+        outcome = dict(results)
+        outcome.update(unknown)
+        return outcome
+    
+    async def apply_channel_delta(self, email: str, first_name: str, last_name: str = None,
+                                  channels_added: list = None, channels_removed: list = None) -> Dict[str, Any]:
+        """Invite a user to added channels and remove them from removed ones, nothing else"""
+        channels_added, channels_removed = channels_added or [], channels_removed or []
+        if not settings.slack_bot_token:
+            return {
+                "user_id": "mock_user_id",
                 "email": email,
-                "name": {
-                    "given_name": first_name,
-                    "family_name": last_name or ""
-                },
-                "userName": email.split('@')[0],
-                "active": True
+                "status": "mocked",
+                "channels_added": channels_added,
+                "channels_removed": channels_removed,
+                "channels_failed": {}
             }
-            
-            response = await client.post(
-                f"{self.base_url}/scim/v1/Users",
-                headers=self.headers,
-                json=user_data
-            )
-            
-            if response.status_code == 201:
-                return response.json()
-            return None
+        
+        if channels_added:
+            result = await self.get_or_create_user(email, first_name, last_name)
+        else:
+            user = await self.get_user_by_email(email)
+            result = {"user_id": user["id"] if user else None, "email": email, "status": "existing" if user else "not_found"}
+        
+        result.update({"channels_added": [], "channels_removed": [], "channels_failed": {}})
+        if not result["user_id"]:
+            return result
+        
+        added, removed = await asyncio.gather(
+            self.assign_channels(result["user_id"], channels_added),
+            self.remove_channels(result["user_id"], channels_removed)
+        )
+        result["channels_added"] = [channel for channel, error in added.items() if error is None]
+        result["channels_removed"] = [channel for channel, error in removed.items() if error is None]
+        result["channels_failed"] = {
+            channel: error for channel, error in {**added, **removed}.items() if error is not None
+        }
+        return result
+    
+    async def bulk_assign_channels(self, assignments: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Invite many users with one conversations.invite call per channel.
+        
+        `assignments` maps Slack user ID to channels. Users headed for the same
+        channel are sent together as a comma-separated `users` list.
+        Returns channel -> {"invited": [...], "failed": {user_id: error}}.
+        """
+        by_channel: Dict[str, Dict[str, None]] = {}
+        for user_id, channels in assignments.items():
+            for channel in channels:
+                by_channel.setdefault(channel, {})[user_id] = None
+        
+        if not settings.slack_bot_token:
+            return {
+                channel: {"invited": list(user_ids), "failed": {}}
+                for channel, user_ids in by_channel.items()
+            }
+        
+        resolved, unknown = await self.channels.resolve_many(list(by_channel))
+        semaphore = asyncio.Semaphore(settings.slack_invite_concurrency)
+        batch_size = settings.slack_invite_batch_size
+        
+        async def invite(channel: str, user_ids: List[str]):
+            invited, failed = [], {}
+            for start in range(0, len(user_ids), batch_size):
+                batch = user_ids[start:start + batch_size]
+                async with semaphore:
+                    result = await self._invite_to_channel(resolved[channel], batch)
+                if not result["ok"]:
+                    failed.update({user_id: result["error"] for user_id in batch})
+                    continue
+                rejected = {err.get("user"): err.get("error") for err in result.get("errors", [])}
+                failed.update({user_id: error for user_id, error in rejected.items() if user_id})
+                invited.extend(user_id for user_id in batch if user_id not in rejected)
+            return channel, {"invited": invited, "failed": failed}
+        
+        results = await asyncio.gather(
+            *(invite(channel, list(by_channel[channel])) for channel in resolved)
+        )
+        outcome = dict(results)
+        for channel, error in unknown.items():
+            outcome[channel] = {"invited": [], "failed": {user_id: error for user_id in by_channel[channel]}}
+        return outcome
+    
+    async def create_slack_user(self, email: str, first_name: str, last_name: str = None) -> Dict[str, Any]:
+        """Create new user in Slack workspace"""
+        user_data = {
+            "email": email,
+            "name": {
+                "given_name": first_name,
+                "family_name": last_name or ""
+            },
+            "userName": email.split('@')[0],
+            "active": True
+        }
+        
+        response = await self.request("POST", "scim/v1/Users", json=user_data)
+        
+        if response.status_code == 201:
+            self.user_cache.pop(normalize_email(email))
+            return response.json()
+        return None
     
     async def get_or_create_user(self, email: str, first_name: str, last_name: str = None) -> Dict[str, Any]:
-        """Get existing user or create new one"""
+        """Get existing user or create new one; concurrent calls for one email share a single operation"""
+        result = await self._inflight_users.do(
+            normalize_email(email),
+            lambda: self._get_or_create_user(email, first_name, last_name)
+        )
+        # Each caller gets its own copy, callers add channel results to it
+        return dict(result)
+    
+    async def _get_or_create_user(self, email: str, first_name: str, last_name: str = None) -> Dict[str, Any]:
         try:
             # First try to get existing user
             user = await self.get_user_by_email(email)
@@ -105,7 +371,8 @@ class SlackService:
                 "email": email,
                 "status": "mocked",
                 "name": f"{first_name} {last_name or ''}".strip(),
-                "channels_assigned": channels or []
+                "channels_assigned": channels or [],
+                "channels_failed": {}
             }
         
         # Get or create user
@@ -113,47 +380,41 @@ class SlackService:
         
         # If user exists or was created successfully, assign to channels
         if result["user_id"] and channels:
-            for channel in channels:
-                await self.invite_user_to_channel(result["user_id"], channel)
-            result["channels_assigned"] = channels
+            outcome = await self.assign_channels(result["user_id"], channels)
+            result["channels_assigned"] = [channel for channel, error in outcome.items() if error is None]
+            result["channels_failed"] = {channel: error for channel, error in outcome.items() if error is not None}
+            if result["channels_failed"]:
+                logger.warning(f"Channel assignment failed for {email}: {result['channels_failed']}")
         
         return result
     async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user details by Slack user ID"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/users.info",
-                headers=self.headers,
-                params={"user": user_id}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("user") if data.get("ok") else None
-            return None
+        response = await self.request("GET", "users.info", params={"user": user_id})
+        if response.status_code == 200:
+            data = response.json()
+            return data.get("user") if data.get("ok") else None
+        return None
+    
+    def _invalidate_user(self, user_id: str):
+        self.user_cache.discard_where(lambda user: user.get("id") == user_id)
     
     async def delete_user(self, user_id: str) -> Dict[str, Any]:
         """Delete/deactivate user from Slack workspace"""
-        async with httpx.AsyncClient() as client:
-            # First try SCIM API for deletion
-            response = await client.delete(
-                f"{self.base_url}/scim/v1/Users/{user_id}",
-                headers=self.headers
-            )
-            
-            if response.status_code == 204:
-                return {"status": "deleted", "user_id": user_id}
-            
-            # If SCIM fails, try deactivating user
-            response = await client.post(
-                f"{self.base_url}/admin.users.setInactive",
-                headers=self.headers,
-                json={"user": user_id}
-            )
-            
-            if response.status_code == 200 and response.json().get("ok"):
-                return {"status": "deactivated", "user_id": user_id}
-            
-            return {"status": "failed", "user_id": user_id, "error": "Could not delete user"}
+        # First try SCIM API for deletion
+        response = await self.request("DELETE", "scim/v1/Users", path=f"scim/v1/Users/{user_id}")
+        
+        if response.status_code == 204:
+            self._invalidate_user(user_id)
+            return {"status": "deleted", "user_id": user_id}
+        
+        # If SCIM fails, try deactivating user
+        response = await self.request("POST", "admin.users.setInactive", json={"user": user_id})
+        
+        if response.status_code == 200 and response.json().get("ok"):
+            self._invalidate_user(user_id)
+            return {"status": "deactivated", "user_id": user_id}
+        
+        return {"status": "failed", "user_id": user_id, "error": "Could not delete user"}
     
     async def create_new_user_only(self, email: str, first_name: str, last_name: str = None) -> Dict[str, Any]:
         """Create new user without checking if exists"""
@@ -172,4 +433,10 @@ class SlackService:
             "email": email,
             "status": "failed",
             "error": "Could not create user in Slack"
-        }
\ No newline at end of file
+        }
+
+# Shared instance; its HTTP client is opened and closed by the application lifespan
+slack_service = SlackService()
+
+def get_slack_service() -> SlackService:
+    return slack_service
@@ -0,0 +1,83 @@
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.repository.identity import IdentityRepository
+from app.repository.employee import EmployeeRepository
+from app.repository.hooks import on_write
+from app.service.cache import TTLCache
+from typing import Any, Dict, Set
+
+# Dashboard aggregates, keyed by table
+stats_cache = TTLCache(maxsize=8, ttl=settings.stats_cache_ttl)
+
+IDENTITY_DIMENSIONS = {
+    "by_role": "business_role",
+    "by_department": "department",
+    "by_status": "employment_status",
+    "by_location": "location",
+}
+
+EMPLOYEE_DIMENSIONS = {
+    "by_role": "business_role",
+    "by_department": "department",
+    "by_status": "employment_status",
+    "by_location": "location",
+    "by_employment_type": "employment_type",
+}
+
+UNASSIGNED = "unassigned"
+
+@on_write("identities")
+def _invalidate_identity_stats(ids: Set[int]):
+    stats_cache.pop("identities")
+
+@on_write("employees")
+def _invalidate_employee_stats(ids: Set[int]):
+    stats_cache.pop("employees")
+
+def _labelled(counts: Dict[Any, int]) -> Dict[str, int]:
+    labelled: Dict[str, int] = {}
+    for value, count in counts.items():
+        key = UNASSIGNED if value is None else str(value)
+        labelled[key] = labelled.get(key, 0) + count
+    return labelled
+
+class StatsService:
+    def __init__(self, db: Session):
+        self.identities = IdentityRepository(db)
+        self.employees = EmployeeRepository(db)
+    
+    def identity_stats(self) -> Dict[str, Any]:
+        """Headcount per dimension and entitlement holders per role, computed with GROUP BY"""
+        stats = stats_cache.get("identities")
+        if stats is not None:
+            return stats
+        
+        stats = {name: _labelled(self.identities.count_by(field)) for name, field in IDENTITY_DIMENSIONS.items()}
+        stats["total"] = sum(stats["by_role"].values())
+        active = self.identities.count_by("is_active")
+        stats["active"] = active.get(True, 0)
+        
+        channels = self.identities.count_entitlement_values_by_role("slack", "channels")
+        permissions = self.identities.count_entitlement_values_by_role("permissions")
+        stats["entitlements_by_role"] = {
+            role: {
+                "identities": count,
+                "channels": channels.get(None if role == UNASSIGNED else role, {}),
+                "permissions": permissions.get(None if role == UNASSIGNED else role, {})
+            }
+            for role, count in stats["by_role"].items()
+        }
+        stats_cache.set("identities", stats)
+        return stats
+    
+    def employee_stats(self) -> Dict[str, Any]:
+        """Employee headcount per dimension, computed with GROUP BY"""
+        stats = stats_cache.get("employees")
+        if stats is not None:
+            return stats
+        
+        stats = {name: _labelled(self.employees.count_by(field)) for name, field in EMPLOYEE_DIMENSIONS.items()}
+        stats["total"] = sum(stats["by_role"].values())
+        stats["active"] = self.employees.count_by("is_active").get(True, 0)
+        stats_cache.set("employees", stats)
+        return stats
@@ -0,0 +1,97 @@
+"""
+Build time, memory and query latency of the in-memory access index.
+
+Loads synthetic identities (role entitlements from the shipped policy) into a
+temporary SQLite database, builds the index and times a few review queries
+against the equivalent SQL on identity_entitlements.
+
+Usage: python -m benchmarks.access_index [--identities 50000]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models.identity import Identity, IdentityEntitlement
+from app.repository.entitlements import entitlement_rows
+from app.service.access_index import AccessIndex
+from app.service.policy import role_policies
+
+QUERIES = {
+    "holders of #alerts": "slack:channels:#alerts",
+    "#general but inactive": {"difference": ["slack:channels:#general", "attribute:is_active:true"]},
+    "write in platform or infra": {"intersection": [
+        "iga:permissions:write",
+        {"union": ["attribute:department:platform", "attribute:department:infrastructure"]}
+    ]},
+}
+
+def timed(fn, runs: int = 200) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--identities", type=int, default=50000)
+    args = parser.parse_args()
+    rng = random.Random(11)
+    snapshot = role_policies.snapshot
+    roles = sorted(snapshot.roles)
+    departments = ["Platform", "Infrastructure", "Sales", "Finance", "Research", "Support"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'access.db')}")
+        Base.metadata.create_all(bind=engine)
+        rows = []
+        for n in range(args.identities):
+            role = rng.choice(roles)
+            rows.append({
+                "id": n + 1, "employee_id": f"E{n}", "primary_email": f"user{n}@example.com",
+                "first_name": "User", "display_name": f"User {n}", "business_role": role,
+                "department": rng.choice(departments), "is_active": rng.random() > 0.05,
+                "entitlements": snapshot.roles[role].entitlements()
+            })
+        with engine.begin() as conn:
+            for start in range(0, len(rows), 5000):
+                chunk = rows[start:start + 5000]
+                conn.execute(insert(Identity), chunk)
+                conn.execute(insert(IdentityEntitlement), [e for row in chunk for e in entitlement_rows(row["id"], row["entitlements"])])
+
+        db = sessionmaker(bind=engine)()
+        index = AccessIndex()
+        stats = index.build(db)
+        memory = stats["memory_bytes"]
+        print(f"{stats['identities']} identities, {stats['keys']} keys, built in {stats['build_ms']} ms")
+        print(f"memory: bitmaps {memory['bitmaps'] / 1024:.0f} KiB, postings {memory['postings'] / 1024:.0f} KiB, "
+              f"holdings {memory['holdings'] / 1024:.0f} KiB")
+
+        for name, expression in QUERIES.items():
+            count = index.evaluate(expression).bit_count()
+            ms = timed(lambda: index.query(expression, None, 100))
+            print(f"{name:28s} {count:6d} holders  index {ms:.3f} ms")
+
+        holders = select(IdentityEntitlement.identity_id).where(
+            IdentityEntitlement.application == "slack", IdentityEntitlement.type == "channels",
+            IdentityEntitlement.value == "#general"
+        )
+        ms = timed(lambda: db.execute(select(Identity.id).where(Identity.id.in_(holders), Identity.is_active.is_(False))).all(), runs=20)
+        print(f"{'#general but inactive':28s} {'':6s}         SQL   {ms:.3f} ms")
+
+        ids = rng.sample(range(1, args.identities + 1), 500)
+        index.mark_stale(ids)
+        started = time.perf_counter()
+        index.refresh(db)
+        print(f"refresh after 500 writes: {(time.perf_counter() - started) * 1000:.1f} ms")
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Identity creation under concurrent load: sync Session vs AsyncSession.
+
+Runs --concurrency creators inside one event loop, the way uvicorn serves
+POST /api/v1/identity/, while a probe measures how late the loop wakes up
+(the delay every other in-flight request, e.g. a Slack await, would see).
+Alongside, --concurrency "other" requests each await a simulated 20 ms Slack
+call in a loop; their throughput is what the blocking path takes away.
+
+Usage: python -m benchmarks.async_load [--rows 1000] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, apply_sqlite_profile
+from app.models.identity import Identity
+from app.models.provisioning import ProvisioningJob
+from app.schemas.identity import IdentityCreate
+from app.service.identity import IdentityService, AsyncIdentityService
+
+PROBE_INTERVAL = 0.005
+SLACK_CALL = 0.02
+
+def identity(n: int) -> IdentityCreate:
+    return IdentityCreate(
+        employee_id=f"LOAD{n:07d}",
+        first_name="Load",
+        display_name=f"Load {n}",
+        primary_email=f"load{n}@example.com",
+        business_role="developer"
+    )
+
+async def probe(lags: list, done: asyncio.Event):
+    while not done.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+async def other_requests(completed: list, done: asyncio.Event):
+    while not done.is_set():
+        await asyncio.sleep(SLACK_CALL)
+        completed.append(1)
+
+async def run(mode: str, path: str, rows: int, concurrency: int) -> dict:
+    sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    apply_sqlite_profile(sync_engine)
+    apply_sqlite_profile(async_engine.sync_engine)
+    Base.metadata.create_all(bind=sync_engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+    AsyncSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    
+    queue = iter(range(rows))
+    latencies = []
+    
+    async def creator():
+        for n in queue:
+            started = time.perf_counter()
+            if mode == "sync":
+                db = Session()
+                try:
+                    await IdentityService(db).create_identity(identity(n))
+                finally:
+                    db.close()
+            else:
+                async with AsyncSession() as db:
+                    await AsyncIdentityService(db).create_identity(identity(n))
+            latencies.append(time.perf_counter() - started)
+    
+    lags, done = [], asyncio.Event()
+    other_completed = []
+    background = [asyncio.create_task(probe(lags, done))]
+    background += [asyncio.create_task(other_requests(other_completed, done)) for _ in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(creator() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*background)
+    
+    await async_engine.dispose()
+    sync_engine.dispose()
+    latencies.sort()
+    lags.sort()
+    ms = lambda seconds: round(seconds * 1000, 1)
+    return {
+        "mode": mode,
+        "rows_per_second": round(rows / elapsed, 1),
+        "other_requests_per_second": round(len(other_completed) / elapsed, 1),
+        "create_p50_ms": ms(latencies[len(latencies) // 2]),
+        "create_p99_ms": ms(latencies[int(len(latencies) * 0.99)]),
+        "loop_lag_p50_ms": ms(statistics.median(lags)),
+        "loop_lag_p99_ms": ms(lags[int(len(lags) * 0.99)]),
+        "loop_lag_max_ms": ms(lags[-1]),
+        "probe_samples": len(lags),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    for mode in ("sync", "async"):
+        with tempfile.TemporaryDirectory() as tmp:
+            print(asyncio.run(run(mode, os.path.join(tmp, "load.db"), args.rows, args.concurrency)))
+
+if __name__ == "__main__":
+    main()
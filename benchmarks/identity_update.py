@@ -0,0 +1,87 @@
+"""
+Round trips and latency of IdentityRepository.update: old path vs UPDATE ... RETURNING.
+
+The old path is SELECT, setattr per field, flush + COMMIT, then refresh (another
+SELECT). Each update runs in its own session like a request does, with
+expire_on_commit=False as in AsyncSessionLocal.
+
+Usage: python -m benchmarks.identity_update [--updates 2000]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, apply_sqlite_profile
+from app.models.identity import Identity
+from app.repository.identity import IdentityRepository
+from app.schemas.identity import IdentityUpdate
+
+def legacy_update(db, identity_id: int, update_data: IdentityUpdate):
+    identity = db.query(Identity).filter(Identity.id == identity_id).first()
+    if identity:
+        for field, value in update_data.model_dump(exclude_unset=True).items():
+            setattr(identity, field, value)
+        db.commit()
+        db.refresh(identity)
+    return identity
+
+def new_update(db, identity_id: int, update_data: IdentityUpdate):
+    return IdentityRepository(db).update(identity_id, update_data)
+
+def run(engine, Session, name: str, update_fn, payloads, rows: int) -> dict:
+    round_trips = [0]
+    count = lambda *args: round_trips.__setitem__(0, round_trips[0] + 1)
+    event.listen(engine, "before_cursor_execute", count)
+    event.listen(engine, "commit", count)
+    latencies = []
+    for n, payload in enumerate(payloads):
+        db = Session()
+        started = time.perf_counter()
+        identity = update_fn(db, n % rows + 1, payload)
+        identity.updated_at, identity.department  # read back like the response model does
+        latencies.append(time.perf_counter() - started)
+        db.close()
+    event.remove(engine, "before_cursor_execute", count)
+    event.remove(engine, "commit", count)
+    return {
+        "path": name,
+        "round_trips_per_update": round(round_trips[0] / len(payloads), 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(sorted(latencies)[int(len(latencies) * 0.99)] * 1000, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--rows", type=int, default=500)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'update.db')}")
+        apply_sqlite_profile(engine)
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(insert(Identity), [
+                {"employee_id": f"UPD{n}", "primary_email": f"upd{n}@example.com", "first_name": "Upd",
+                 "department": "Engineering", "entitlements": {"slack": {"channels": ["#general"]}}}
+                for n in range(args.rows)
+            ])
+        Session = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+        
+        # Each pass over the rows flips the department, so every update changes a column
+        changed = [IdentityUpdate(department=f"Dept {n // args.rows % 2}", location="Remote") for n in range(args.updates)]
+        unchanged = [IdentityUpdate(department="Dept 1", location="Remote") for _ in range(args.updates)]
+        for scenario, payloads in (("changed", changed), ("unchanged", unchanged)):
+            for name, update_fn in (("old", legacy_update), ("new", new_update)):
+                if scenario == "unchanged":
+                    # Bring every row to the submitted values first
+                    run(engine, Session, name, new_update, unchanged[:args.rows], args.rows)
+                print({"scenario": scenario, **run(engine, Session, name, update_fn, payloads, args.rows)})
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
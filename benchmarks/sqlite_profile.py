@@ -0,0 +1,82 @@
+"""
+Write throughput of identity creation with the SQLite profile on and off.
+
+Usage: python -m benchmarks.sqlite_profile [--rows 2000] [--threads 4]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, apply_sqlite_profile
+from app.models.identity import Identity
+from app.models.provisioning import ProvisioningJob
+from app.models.idempotency import IdempotencyKey
+from app.repository.provisioning import ProvisioningJobRepository
+
+def make_session_factory(path: str, profile: bool):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    if profile:
+        apply_sqlite_profile(engine)
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def create_identities(Session, start: int, count: int, written: list, errors: list):
+    # One transaction per identity, like POST /api/v1/identity/ (identity row + outbox job)
+    for n in range(start, start + count):
+        db = Session()
+        try:
+            identity = Identity(
+                employee_id=f"BENCH{n:07d}",
+                first_name="Bench",
+                last_name=str(n),
+                display_name=f"Bench {n}",
+                primary_email=f"bench{n}@example.com",
+                business_role="Developer",
+                entitlements={"slack": {"channels": ["general", "dev-team"]}},
+            )
+            db.add(identity)
+            db.flush()
+            ProvisioningJobRepository(db).enqueue("provision", {"identity_id": identity.id}, identity_id=identity.id)
+            db.commit()
+            written.append(n)
+        except OperationalError as e:
+            db.rollback()
+            errors.append(str(e.orig))
+        finally:
+            db.close()
+
+def run(profile: bool, rows: int, threads: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, Session = make_session_factory(os.path.join(tmp, "bench.db"), profile)
+        written, errors = [], []
+        per_thread = rows // threads
+        workers = [
+            threading.Thread(target=create_identities, args=(Session, i * per_thread, per_thread, written, errors))
+            for i in range(threads)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        engine.dispose()
+    return {"profile": "on" if profile else "off", "threads": threads, "written": len(written),
+            "locked_errors": len(errors), "seconds": round(elapsed, 2),
+            "rows_per_second": round(len(written) / elapsed, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+    for threads in sorted({1, args.threads}):
+        for profile in (False, True):
+            print(run(profile, args.rows, threads))
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,9 @@
-from app.core.database import engine, Base
-from app.models.identity import Identity, TargetApplication
-from app.models.employee import Employee, EmployeeDocument, EmployeeSkill, EmployeeLeave, EmployeePerformance, Department
+from app.core.database import engine
+from app.core.migrations import run_migrations
 
 def create_all_tables():
-    # Drop existing tables to recreate with new schema
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    # Creates missing tables and applies pending migrations, existing rows are kept
+    run_migrations(engine)
     print("All database tables created successfully!")
     print("Tables created:")
     print("- identities (Identity Management)")
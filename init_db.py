@@ -1,9 +1,9 @@
-from app.core.database import engine, Base
-from app.models.identity import Identity, TargetApplication
+from app.core.database import engine
+from app.core.migrations import run_migrations
 
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     print("Database tables created successfully!")
 
 if __name__ == "__main__":
-    create_tables()
\ No newline at end of file
+    create_tables()
@@ -10,16 +10,16 @@ from sqlalchemy import create_engine, text
 # Add current directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.core.database import Base, engine
-from app.models.identity import Identity, TargetApplication
+from app.core.database import engine
+from app.core.migrations import run_migrations
 
 def init_production_db():
     """Initialize production database"""
     try:
         print("Creating database tables...")
         
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
+        # Create all tables and apply pending migrations
+        run_migrations(engine)
         
         print("✅ Database tables created successfully!")
         
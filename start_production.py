@@ -4,25 +4,19 @@ Production startup script with database initialization
 """
 import os
 import uvicorn
-from sqlalchemy import create_engine, inspect
 
 # Initialize database on startup
 def init_db_if_needed():
-    """Initialize database if tables don't exist"""
+    """Apply pending schema migrations (creates the tables on a new database)"""
     try:
-        from app.core.database import engine, Base
-        from app.models.identity import Identity, TargetApplication
+        from app.core.database import engine
+        from app.core.migrations import run_migrations
         
-        # Check if tables exist
-        inspector = inspect(engine)
-        existing_tables = inspector.get_table_names()
-        
-        if 'identities' not in existing_tables:
-            print("🔧 Initializing database tables...")
-            Base.metadata.create_all(bind=engine)
-            print("✅ Database initialized successfully!")
+        applied = run_migrations(engine)
+        if applied:
+            print(f"✅ Applied database migrations: {applied}")
         else:
-            print("✅ Database tables already exist")
+            print("✅ Database schema is up to date")
             
     except Exception as e:
         print(f"⚠️ Database initialization warning: {str(e)}")
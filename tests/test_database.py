@@ -0,0 +1,139 @@
+import pytest
+from sqlalchemy import create_engine, text
+from app.core.database import apply_sqlite_profile
+
+
+def test_sqlite_profile_applied_on_connect(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    apply_sqlite_profile(engine, {"journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 1234})
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+    engine.dispose()
+
+
+def test_pool_monitor_reports_checkouts_waits_and_timeouts(tmp_path):
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+    from app.core.pool import PoolMonitor, MonitoredQueuePool
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=MonitoredQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    monitor = PoolMonitor()
+    monitor.attach(engine)
+    held = engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+
+    stats = monitor.stats()
+    assert stats["checked_out"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["wait_ms"]["max"] >= 50
+    assert stats["connection_age_s"]["open"] == 1
+    held.close()
+    assert monitor.stats()["checked_out"] == 0
+    engine.dispose()
+
+
+def test_migrations_upgrade_existing_database_in_place(tmp_path):
+    from sqlalchemy import inspect, insert, select
+    from app.core.migrations import run_migrations, migration_status, backfill, MIGRATIONS
+    from app.models.identity import Identity, IdentityEntitlement
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    # A database from before migrations: identities table without the listing indexes
+    Identity.__table__.create(engine)
+    with engine.connect() as conn:
+        for index in inspect(conn).get_indexes("identities"):
+            if index["name"] == "ix_identities_department_id":
+                conn.exec_driver_sql("DROP INDEX ix_identities_department_id")
+        conn.execute(insert(Identity).values([
+            {"employee_id": f"E{n}", "primary_email": f"e{n}@example.com", "first_name": "Old", "entitlements": {"permissions": ["read"]}}
+            for n in range(5)
+        ]))
+        conn.commit()
+
+    assert run_migrations(engine) == [m.version for m in MIGRATIONS]
+    assert run_migrations(engine) == []
+    assert migration_status(engine)["pending"] == []
+    assert "ix_identities_department_id" in {i["name"] for i in inspect(engine).get_indexes("identities")}
+    with engine.connect() as conn:
+        # Migration 4 copied the entitlement documents into identity_entitlements
+        assert conn.execute(select(IdentityEntitlement.value)).scalars().all() == ["read"] * 5
+
+    table = Identity.__table__
+    assert backfill(engine, table, {"display_name": table.c.first_name}, batch_size=2) == 5
+    with engine.connect() as conn:
+        assert set(conn.execute(select(table.c.display_name)).scalars()) == {"Old"}
+    engine.dispose()
+
+
+def test_read_db_uses_replica_until_client_writes(monkeypatch, tmp_path):
+    from itertools import cycle
+    from fastapi import FastAPI, Depends
+    from fastapi.testclient import TestClient
+    from sqlalchemy.orm import sessionmaker
+    from app.core import database
+    from app.core.replicas import StickyPrimaryMiddleware
+
+    replica = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'replica.db'}"))
+    primary = sessionmaker(bind=create_engine(f"sqlite:///{tmp_path / 'primary.db'}"))
+    monkeypatch.setattr(database, "ReplicaSessionLocals", [replica])
+    monkeypatch.setattr(database, "_next_replica", cycle([replica]))
+
+    app = FastAPI()
+    app.add_middleware(StickyPrimaryMiddleware, sticky_seconds=60)
+
+    def override_get_db():
+        db = primary()
+        try:
+            yield db
+        finally:
+            db.close()
+    app.dependency_overrides[database.get_db] = override_get_db
+
+    @app.get("/read")
+    def read(db=Depends(database.get_read_db)):
+        return db.get_bind().url.database.rsplit("/", 1)[-1]
+
+    @app.post("/write")
+    def write():
+        return {}
+
+    client = TestClient(app)
+    assert client.get("/read").json() == "replica.db"
+    client.post("/write")
+    assert database.PRIMARY_COOKIE in client.cookies
+    assert client.get("/read").json() == "primary.db"
+
+
+def test_purge_expired_idempotency_keys_keeps_live_and_running_ones():
+    from datetime import timedelta
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app.core.database import Base
+    from app.models.idempotency import IdempotencyKey
+    from app.repository.idempotency import IdempotencyRepository
+    from app.repository.provisioning import utcnow
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    now = utcnow()
+    past, future = now - timedelta(hours=1), now + timedelta(hours=1)
+    for key, status, locked_at, expires_at in [
+        ("expired-1", "completed", past, past),
+        ("expired-2", "completed", past, past),
+        ("expired-3", "in_progress", past, past),
+        ("live", "completed", now, future),
+        ("running", "in_progress", now, past),
+    ]:
+        db.add(IdempotencyKey(scope="test", key=key, request_hash="x", status=status, locked_at=locked_at, expires_at=expires_at))
+    db.commit()
+
+    assert IdempotencyRepository(db).purge_expired(lock_timeout=60, batch_size=2) == 3
+    assert sorted(record.key for record in db.query(IdempotencyKey)) == ["live", "running"]
+    db.close()
+    engine.dispose()
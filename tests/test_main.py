@@ -1,9 +1,12 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 from app.main import app
-from app.core.database import get_db, Base
+from app.core.database import get_db, get_async_db, Base
 from app.models.identity import Identity
 
 # Test database
@@ -18,7 +21,16 @@ def override_get_db():
     finally:
         db.close()
 
+# Same file for the async routes; NullPool so no connection outlives the test client's loop
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 @pytest.fixture(scope="module")
 def client():
@@ -77,7 +89,7 @@ def test_get_identities_by_role(client):
     headers = {"X-User-Role": "hr"}
     response = client.get("/api/v1/identity/role/developer", headers=headers)
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert isinstance(response.json()["items"], list)
 
 def test_update_identity(client):
     # Create identity first
@@ -112,4 +124,217 @@ async def test_slack_service():
     # Test with mock data since we don't have real Slack tokens
     result = await service.create_user_account("test@example.com")
     assert "user_id" in result
-    assert "status" in result
\ No newline at end of file
+    assert "status" in result
+def test_import_identities_reports_row_errors(client):
+    headers = {"X-User-Role": "hr", "Content-Type": "text/csv"}
+    body = (
+        "employee_id,first_name,display_name,primary_email,business_role\n"
+        "IMP001,Ada,Ada L,ada@example.com,developer\n"
+        "IMP002,Bob,Bob B,not-an-email,tester\n"
+        "IMP001,Dup,Dup D,dup@example.com,developer\n"
+        "IMP003,Cy,Cy C,cy@example.com,devops\n"
+    )
+    response = client.post("/api/v1/identity/import", content=body, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["received"] == 4
+    assert data["imported"] == 2
+    assert [error["row"] for error in data["errors"]] == [2, 3]
+    assert len(data["job_ids"]) == 1
+
+def test_import_identities_parses_quoted_multiline_fields(client):
+    headers = {"X-User-Role": "hr", "Content-Type": "text/csv"}
+    body = (
+        "employee_id,first_name,display_name,primary_email,business_role\r\n"
+        "IMP010,Ida,\"Ida\r\nof \"\"Ops\"\"\",ida@example.com,devops\r\n"
+        "IMP011,Ian,Ian I,ian@example.com,tester\r\n"
+    )
+    data = client.post("/api/v1/identity/import", content=body, headers=headers).json()
+    assert data["received"] == 2
+    assert data["imported"] == 2
+    assert data["errors"] == []
+
+def test_sync_identities_upserts_snapshot(client):
+    headers = {"X-User-Role": "hr", "Content-Type": "text/csv"}
+    header = "employee_id,first_name,display_name,primary_email,business_role\n"
+    first = client.post("/api/v1/identity/sync", headers=headers, content=(
+        header
+        + "SYN001,Sam,Sam S,sam@example.com,developer\n"
+        + "SYN002,Sue,Sue S,sue@example.com,tester\n"
+    ))
+    assert first.json()["inserted"] == ["SYN001", "SYN002"]
+
+    second = client.post("/api/v1/identity/sync", headers=headers, content=(
+        header
+        + "SYN001,Sam,Sam S,sam@example.com,developer\n"
+        + "SYN002,Sue,Sue S,sue@example.com,manager\n"
+        + "SYN003,Sal,Sal S,sam@example.com,developer\n"
+    ))
+    data = second.json()
+    assert data["inserted"] == []
+    assert data["updated"] == ["SYN002"]
+    assert data["unchanged"] == 1
+    assert [error["row"] for error in data["errors"]] == [3]
+    assert len(data["job_ids"]) == 1
+
+def test_sync_reports_duplicate_email_in_chunk_per_row(client):
+    headers = {"X-User-Role": "hr", "Content-Type": "text/csv"}
+    response = client.post("/api/v1/identity/sync", headers=headers, content=(
+        "employee_id,first_name,display_name,primary_email,business_role\n"
+        "DUP001,Ann,Ann A,dup-sync@example.com,developer\n"
+        "DUP002,Abe,Abe A,dup-sync@example.com,developer\n"
+        "DUP003,Amy,Amy A,amy-sync@example.com,tester\n"
+    ))
+    data = response.json()
+    assert data["inserted"] == ["DUP001", "DUP003"]
+    assert data["failed"] == 1
+    assert [error["row"] for error in data["errors"]] == [2]
+
+def test_identity_stats_refresh_after_write(client):
+    headers = {"X-User-Role": "hr"}
+    before = client.get("/api/v1/identity/stats", headers=headers).json()
+    client.post("/api/v1/identity/", headers=headers, json={
+        "employee_id": "STAT001",
+        "primary_email": "stat@example.com",
+        "business_role": "designer",
+        "first_name": "Stat",
+        "display_name": "Stat S"
+    })
+    after = client.get("/api/v1/identity/stats", headers=headers).json()
+    assert after["total"] == before["total"] + 1
+    assert after["by_role"]["designer"] == before["by_role"].get("designer", 0) + 1
+    designers = after["entitlements_by_role"]["designer"]
+    assert designers["channels"]["#design-team"] == designers["identities"]
+    assert designers["permissions"]["design_tools"] == designers["identities"]
+
+def test_create_identity_replays_idempotency_key(client):
+    identity_data = {
+        "employee_id": "EMP010",
+        "primary_email": "idem@example.com",
+        "business_role": "developer",
+        "first_name": "Idem",
+        "display_name": "Idem Potent"
+    }
+    headers = {"X-User-Role": "hr", "Idempotency-Key": "create-emp010"}
+    first = client.post("/api/v1/identity/", json=identity_data, headers=headers)
+    replayed = client.post("/api/v1/identity/", json=identity_data, headers=headers)
+    assert first.status_code == 201
+    assert replayed.status_code == 201
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert replayed.json()["id"] == first.json()["id"]
+
+    conflicting = client.post("/api/v1/identity/", json={**identity_data, "first_name": "Other"}, headers=headers)
+    assert conflicting.status_code == 422
+
+def test_list_employees_pages_with_cursor(client):
+    headers = {"X-User-Role": "hr"}
+    for number in range(3):
+        client.post("/api/v1/identity/", json={
+            "employee_id": f"PAGE{number}",
+            "primary_email": f"page{number}@example.com",
+            "business_role": "analyst",
+            "department": "Research",
+            "first_name": "Page",
+            "display_name": f"Page {number}"
+        }, headers=headers)
+
+    params = {"department": "Research", "limit": 2}
+    first = client.get("/api/v1/identity/employees/all", params=params, headers=headers).json()
+    assert [item["employee_id"] for item in first["items"]] == ["PAGE0", "PAGE1"]
+
+    second = client.get(
+        "/api/v1/identity/employees/all",
+        params={**params, "cursor": first["next_cursor"]},
+        headers=headers
+    ).json()
+    assert [item["employee_id"] for item in second["items"]] == ["PAGE2"]
+    assert second["next_cursor"] is None
+
+    response = client.get("/api/v1/identity/employees/all", params={"cursor": "bogus"}, headers=headers)
+    assert response.status_code == 400
+
+def test_export_identities_streams_ndjson_and_json(client):
+    headers = {"X-User-Role": "hr"}
+    response = client.get("/api/v1/identity/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows and all("primary_email" in row for row in rows)
+
+    response = client.get("/api/v1/identity/export", params={"format": "json"}, headers=headers)
+    assert [row["id"] for row in response.json()] == [row["id"] for row in rows]
+
+def test_entitlement_holders_follow_identity_writes(client):
+    headers = {"X-User-Role": "hr"}
+    ids = []
+    for number in range(3):
+        response = client.post("/api/v1/identity/", json={
+            "employee_id": f"OPS{number}",
+            "primary_email": f"ops{number}@example.com",
+            "business_role": "devops",
+            "first_name": "Ops",
+            "display_name": f"Ops {number}"
+        }, headers=headers)
+        ids.append(response.json()["id"])
+    # Moving one identity to another role drops its devops entitlements
+    client.put(f"/api/v1/identity/{ids[1]}", json={"business_role": "sales"}, headers=headers)
+
+    params = {"application": "slack", "type": "channels", "value": "#infrastructure"}
+    everyone = client.get("/api/v1/identity/entitlements/holders", params=params, headers=headers).json()
+    holders = [item["id"] for item in everyone["items"]]
+    assert ids[0] in holders and ids[2] in holders and ids[1] not in holders
+    assert everyone["items"][0]["entitlements"]["slack"]["channels"][0] == "#devops"
+
+    # Same holders one per page
+    paged, cursor = [], None
+    while True:
+        page = client.get(
+            "/api/v1/identity/entitlements/holders",
+            params={**params, "limit": 1, **({"cursor": cursor} if cursor else {})},
+            headers=headers
+        ).json()
+        paged.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert paged == holders
+
+    params = {"application": "iga", "type": "permissions", "value": "crm_access"}
+    holders = client.get("/api/v1/identity/entitlements/holders", params=params, headers=headers).json()
+    assert ids[1] in [item["id"] for item in holders["items"]]
+
+def test_access_index_answers_set_queries_and_follows_writes(client):
+    headers = {"X-User-Role": "hr"}
+    assert client.post("/api/v1/access/rebuild", headers=headers).json()["built"] is True
+    ids = {}
+    for role in ("devops", "developer", "manager"):
+        response = client.post("/api/v1/identity/", json={
+            "employee_id": f"ACCESS-{role}",
+            "primary_email": f"access-{role}@example.com",
+            "business_role": role,
+            "first_name": "Access",
+            "display_name": f"Access {role}"
+        }, headers=headers)
+        ids[role] = response.json()["id"]
+
+    def query(expression):
+        response = client.post("/api/v1/access/query", json={"expression": expression, "limit": 500}, headers=headers)
+        assert response.status_code == 200
+        return set(response.json()["identity_ids"]) & set(ids.values())
+
+    assert query("slack:channels:#alerts") == {ids["devops"]}
+    assert query({"difference": ["iga:permissions:write", "attribute:business_role:devops"]}) == {ids["developer"], ids["manager"]}
+    assert query({"intersection": ["iga:permissions:admin", {"union": ["slack:channels:#leadership", "slack:channels:#alerts"]}]}) == {ids["devops"], ids["manager"]}
+
+    # Writes reach the index through the write hooks, no rebuild needed
+    client.put(f"/api/v1/identity/{ids['developer']}", json={"business_role": "devops"}, headers=headers)
+    assert query("slack:channels:#alerts") == {ids["devops"], ids["developer"]}
+    holdings = client.get(f"/api/v1/access/identities/{ids['developer']}", headers=headers).json()
+    assert "attribute:business_role:devops" in holdings["keys"]
+    assert "slack:channels:#dev-team" not in holdings["keys"]
+
+    page = client.get("/api/v1/access/holders", params={"key": "slack:channels:#alerts", "limit": 1}, headers=headers).json()
+    assert len(page["identity_ids"]) == 1 and page["count"] >= 2 and page["next_cursor"]
+    assert client.post("/api/v1/access/query", json={"expression": {"xor": ["*"]}}, headers=headers).status_code == 400
+    stats = client.get("/api/v1/access/stats", headers=headers).json()
+    assert stats["pending_refresh"] == 0 and stats["memory_bytes"]["bitmaps"] > 0
@@ -0,0 +1,276 @@
+import json
+import os
+import pytest
+from app.service.policy import RolePolicyRegistry, role_policies
+
+
+def write_policy(path, roles, mtime):
+    path.write_text(json.dumps({"default": {"slack": {"channels": ["#general"]}, "permissions": ["read"]}, "roles": roles}))
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_shipped_policy_matches_role_lookup():
+    snapshot = role_policies.snapshot
+    assert snapshot.resolve("Developer").entitlements() == {
+        "slack": {"channels": ["#dev-team", "#general", "#tech-updates"]},
+        "permissions": ["read", "write", "code_access"]
+    }
+    assert snapshot.resolve("unknown-role") is snapshot.default
+    with pytest.raises(TypeError):
+        snapshot.roles["developer"] = snapshot.default
+    with pytest.raises(AttributeError):
+        snapshot.roles["developer"].channels = ("#x",)
+    assert "#dev-team" in snapshot.roles["developer"].channel_set
+
+
+def test_registry_reloads_changed_file_and_keeps_last_good_version(tmp_path):
+    path = tmp_path / "roles.json"
+    write_policy(path, {"Dev": {"slack": {"channels": ["#dev"]}, "permissions": ["read"]}}, 1_000_000_000)
+    registry = RolePolicyRegistry(str(path), check_interval=0)
+    first = registry.snapshot
+    assert first.resolve("DEV").channels == ("#dev",)
+
+    # Unchanged file: same snapshot object
+    assert registry.snapshot is first
+
+    write_policy(path, {"dev": {"slack": {"channels": ["#dev", "#ops"]}, "permissions": ["read"]}}, 2_000_000_000)
+    second = registry.snapshot
+    assert second.version != first.version
+    assert second.resolve("dev").channels == ("#dev", "#ops")
+    # Readers holding the old snapshot still see the old policy
+    assert first.resolve("dev").channels == ("#dev",)
+
+    path.write_text("{not json")
+    os.utime(path, ns=(3_000_000_000, 3_000_000_000))
+    assert registry.snapshot is second
+    assert registry.reload_errors == 1 and registry.last_error
+
+
+
+@pytest.mark.parametrize("document", [
+    ["not", "a", "mapping"],
+    {"roles": {"dev": "read"}},
+    {"roles": {"dev": {"slack": "x"}}},
+    {"roles": {"dev": {"slack": {"channels": "#dev"}}}},
+    {"roles": {"dev": {"permissions": "read"}}},
+    {"roles": {"dev": {"permissions": ["read", 1]}}},
+    {"roles": {"dev": {}}, "default": {"slack": ["#general"]}},
+    {"roles": {"dev": {}}, "rules": ["everyone"]},
+    {"roles": {"dev": {}}, "rules": [{"name": "r", "when": "developer"}]},
+    {"roles": {"dev": {}}, "rules": [{"name": "r", "when": {"department": {"in": ["it"]}}}]},
+    {"roles": {"dev": {}}, "rules": [{"name": "r", "priority": "high"}]},
+    {"roles": {"dev": {}}, "rules": [{"name": "r", "grant": {"slack": "x"}}]},
+    {"roles": {"dev": {}}, "rules": [{"name": "r", "revoke": {"permissions": "read"}}]},
+])
+def test_malformed_policy_is_rejected_with_value_error(tmp_path, document):
+    from app.service.policy import parse_policy
+
+    with pytest.raises(ValueError):
+        parse_policy(document, "test")
+
+    # A hot reload of the same document counts as a reload error and keeps the last good version
+    path = tmp_path / "roles.json"
+    write_policy(path, {"dev": {"permissions": ["read"]}}, 1_000_000_000)
+    registry = RolePolicyRegistry(str(path), check_interval=0)
+    good = registry.snapshot
+    path.write_text(json.dumps(document))
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    assert registry.snapshot is good
+    assert registry.reload_errors == 1 and registry.last_error
+
+def test_rules_fire_by_priority_from_the_index():
+    from app.service.policy import parse_policy
+    from app.service.rules import rule_attributes
+
+    snapshot = parse_policy({
+        "roles": {"developer": {"slack": {"channels": ["#dev", "#general"]}, "permissions": ["read", "write"]}},
+        "rules": [
+            {"name": "everyone", "grant": {"slack": {"channels": ["#all-hands"]}}},
+            {"name": "berlin", "when": {"location": ["Berlin", "Munich"]}, "grant": {"slack": {"channels": ["#de"]}}},
+            {"name": "platform", "priority": 10, "when": {"department": ["Platform", "Infrastructure"], "business_role": "developer"},
+             "grant": {"permissions": ["infrastructure_access"]}},
+            {"name": "contractors", "priority": 100, "when": {"employment_type": "Contractor"},
+             "revoke": {"slack": {"channels": ["#all-hands"]}, "permissions": ["write"]}, "stop": True},
+        ]
+    }, "test")
+    # The multi-valued location and department predicates are the hash keys, not business_role
+    assert snapshot.rules.key_attribute["platform"] == "department"
+    assert snapshot.rules.key_attribute["berlin"] == "location"
+
+    attributes = rule_attributes({"business_role": "Developer", "department": "platform", "location": "Berlin"})
+    fired, stopped, candidates = snapshot.rules.match(attributes)
+    assert [rule.name for rule in fired] == ["platform", "everyone", "berlin"]
+    assert candidates == 3
+    assert snapshot.evaluate(attributes) == {
+        "slack": {"channels": ["#dev", "#general", "#de", "#all-hands"]},
+        "permissions": ["read", "write", "infrastructure_access"]
+    }
+
+    contractor = dict(attributes, employment_type="contractor")
+    explanation = snapshot.explain(contractor)
+    assert [rule["name"] for rule in explanation["fired"]] == ["contractors"]
+    assert {rule["name"] for rule in explanation["stopped"]} == {"platform", "everyone", "berlin"}
+    assert explanation["entitlements"] == {"slack": {"channels": ["#dev", "#general"]}, "permissions": ["read"]}
+
+    with pytest.raises(ValueError):
+        parse_policy({"roles": {"x": {}}, "rules": [{"name": "bad", "when": {"salary": 1}}]}, "test")
+
+
+@pytest.mark.asyncio
+async def test_reevaluate_entitlements_reports_then_applies_rule_changes(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app.core.database import Base
+    from app.repository.provisioning import ProvisioningJobRepository
+    from app.schemas.identity import IdentityCreate, IdentityUpdate
+    from app.service import identity as identity_module
+
+    path = tmp_path / "roles.json"
+    roles = {"developer": {"slack": {"channels": ["#dev"]}, "permissions": ["read"]}}
+    write_policy(path, roles, 1_000_000_000)
+    registry = RolePolicyRegistry(str(path), check_interval=0)
+    monkeypatch.setattr(identity_module, "role_policies", registry)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    service = identity_module.IdentityService(db)
+    for n, department in enumerate(["Platform", "Sales", "Platform"]):
+        await service.create_identity(IdentityCreate(
+            employee_id=f"EMP{n}", first_name="Rule", display_name="Rule Test", primary_email=f"rule{n}@example.com",
+            business_role="developer", department=department
+        ))
+    first_version = registry.version
+
+    path.write_text(json.dumps({"roles": roles, "rules": [
+        {"name": "platform", "when": {"department": "platform"}, "grant": {"slack": {"channels": ["#platform"]}}}
+    ]}))
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+
+    report = service.reevaluate_entitlements()
+    assert report["scanned"] == 3
+    assert report["changed"]["count"] == 2 and report["restamped"] == 1
+    assert report["distinct_attribute_sets"] == 2
+    assert report["changed"]["sample"][0]["channels_added"] == ["#platform"]
+    db.expire_all()
+    assert {identity.policy_version for identity in service.get_all_identities()} == {first_version}
+
+    report = service.reevaluate_entitlements(apply=True)
+    assert len(report["job_ids"]) == 2
+    db.expire_all()
+    identities = {identity.department: identity for identity in service.get_all_identities()}
+    assert identities["Platform"].entitlements["slack"]["channels"] == ["#dev", "#platform"]
+    assert {identity.policy_version for identity in identities.values()} == {registry.version}
+    job = ProvisioningJobRepository(db).get_by_id(report["job_ids"][0])
+    assert job.operation == "reprovision" and job.payload["channels_added"] == ["#platform"]
+
+    assert service.reevaluate_entitlements()["unchanged"] == 3
+
+    # policy_version is set by the service only; a client-sent value is ignored
+    updated = await service.update_identity(
+        identities["Sales"].id, IdentityUpdate(department="Platform", policy_version="forged")
+    )
+    assert updated.entitlements["slack"]["channels"] == ["#dev", "#platform"]
+    assert updated.policy_version == registry.version
+    db.close()
+    engine.dispose()
+
+
+
+@pytest.mark.asyncio
+async def test_reevaluate_does_not_reprovision_inactive_identities(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app.core.database import Base
+    from app.repository.provisioning import ProvisioningJobRepository
+    from app.schemas.identity import IdentityCreate, IdentityUpdate
+    from app.service import identity as identity_module
+
+    path = tmp_path / "roles.json"
+    write_policy(path, {"developer": {"slack": {"channels": ["#dev"]}, "permissions": ["read"]}}, 1_000_000_000)
+    registry = RolePolicyRegistry(str(path), check_interval=0)
+    monkeypatch.setattr(identity_module, "role_policies", registry)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    service = identity_module.IdentityService(db)
+    for n in range(2):
+        await service.create_identity(IdentityCreate(
+            employee_id=f"ACT{n}", first_name="Act", display_name="Act", primary_email=f"act{n}@example.com",
+            business_role="developer"
+        ))
+    service.repository.update(2, IdentityUpdate(is_active=False))
+
+    write_policy(path, {"developer": {"slack": {"channels": ["#dev", "#new"]}, "permissions": ["read"]}}, 2_000_000_000)
+    report = service.reevaluate_entitlements(apply=True)
+    assert report["changed"]["count"] == 2
+    assert len(report["job_ids"]) == 1
+    assert ProvisioningJobRepository(db).get_by_id(report["job_ids"][0]).identity_id == 1
+    # The inactive identity still gets the new entitlements
+    db.expire_all()
+    assert service.get_identity(2).entitlements["slack"]["channels"] == ["#dev", "#new"]
+    db.close()
+    engine.dispose()
+
+@pytest.mark.asyncio
+async def test_simulate_proposed_policy_counts_invites_and_kicks_without_writing(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app.core.database import Base
+    from app.schemas.identity import IdentityCreate, IdentityUpdate
+    from app.service import identity as identity_module, simulation
+
+    path = tmp_path / "roles.json"
+    write_policy(path, {
+        "developer": {"slack": {"channels": ["#dev", "#general"]}, "permissions": ["read"]},
+        "manager": {"slack": {"channels": ["#leads"]}, "permissions": ["read", "admin"]}
+    }, 1_000_000_000)
+    registry = RolePolicyRegistry(str(path), check_interval=0)
+    monkeypatch.setattr(identity_module, "role_policies", registry)
+    monkeypatch.setattr(simulation, "role_policies", registry)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    service = identity_module.IdentityService(db)
+    for n, role in enumerate(["developer", "developer", "developer", "manager"]):
+        await service.create_identity(IdentityCreate(
+            employee_id=f"SIM{n}", first_name="Sim", display_name="Sim", primary_email=f"sim{n}@example.com",
+            business_role=role
+        ))
+    service.repository.update(3, IdentityUpdate(is_active=False))
+
+    report = simulation.PolicySimulationService(db).simulate({
+        "roles": {"Developer": {"slack": {"channels": ["#dev", "#platform"]}, "permissions": ["read", "write"]}}
+    })
+    assert report["identities_scanned"] == 4
+    assert report["identities_affected"] == 3 and report["active_identities_affected"] == 2
+    assert report["slack_invites"] == 2 and report["slack_kicks"] == 2
+    assert report["channels"] == {"#platform": {"invites": 2, "kicks": 0}, "#general": {"invites": 0, "kicks": 2}}
+    assert report["permissions"] == {"write": {"granted": 3, "revoked": 0}}
+    assert report["identities_out_of_date"] == 0
+    largest = report["diffs"][0]
+    assert largest["count"] == 2 and largest["channels_added"] == ["#platform"] and len(largest["sample"]) == 2
+
+    # Nothing was written
+    db.expire_all()
+    assert service.get_identity(1).entitlements["slack"]["channels"] == ["#dev", "#general"]
+
+    with pytest.raises(ValueError):
+        simulation.PolicySimulationService(db).simulate({"rules": [{"name": "bad", "when": {"salary": 1}}]})
+
+    # Applying the proposal queues exactly the Slack changes the simulation predicted
+    write_policy(path, {
+        "developer": {"slack": {"channels": ["#dev", "#platform"]}, "permissions": ["read", "write"]},
+        "manager": {"slack": {"channels": ["#leads"]}, "permissions": ["read", "admin"]}
+    }, 2_000_000_000)
+    applied = service.reevaluate_entitlements(apply=True)
+    jobs = [service.get_provisioning_job(job_id) for job_id in applied["job_ids"]]
+    assert sum(len(job.payload["channels_added"]) for job in jobs) == report["slack_invites"]
+    assert sum(len(job.payload["channels_removed"]) for job in jobs) == report["slack_kicks"]
+    db.close()
+    engine.dispose()
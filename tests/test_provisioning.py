@@ -0,0 +1,218 @@
+import pytest
+from sqlalchemy import create_engine, select, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.core.database import Base
+from app.models.provisioning import ProvisioningJob
+from app.repository.identity import IdentityRepository
+from app.repository.provisioning import ProvisioningJobRepository
+from app.schemas.identity import IdentityCreate, IdentityUpdate
+from app.service.identity import IdentityService, AsyncIdentityService
+from app.service.provisioning import ProvisioningWorkerPool, JOB_HANDLERS
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_create_identity_queues_job_drained_by_worker(session_factory):
+    db = session_factory()
+    identity = await IdentityService(db).create_identity(IdentityCreate(
+        employee_id="EMP100",
+        first_name="Queue",
+        display_name="Queue Test",
+        primary_email="queue@example.com",
+        business_role="developer"
+    ))
+    job = ProvisioningJobRepository(db).get_by_identity(identity.id)[0]
+    assert job.status == "pending"
+    assert job.payload["channels"] == ["#dev-team", "#general", "#tech-updates"]
+
+    pool = ProvisioningWorkerPool(session_factory=session_factory, workers=0)
+    assert await pool.process_next() == job.id
+    assert await pool.process_next() is None
+
+    db.expire_all()
+    job = ProvisioningJobRepository(db).get_by_id(job.id)
+    assert job.status == "succeeded"
+    assert job.result["status"] == "mocked"
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_jobs_block_later_jobs_for_identity_until_dead(session_factory, monkeypatch):
+    async def always_fails(slack, payload):
+        raise RuntimeError("slack down")
+
+    monkeypatch.setitem(JOB_HANDLERS, "fail", always_fails)
+    db = session_factory()
+    repo = ProvisioningJobRepository(db)
+    first = repo.enqueue("fail", {}, identity_id=1, max_attempts=2)
+    second = repo.enqueue("provision", {"email": "x@example.com"}, identity_id=1)
+    db.commit()
+
+    pool = ProvisioningWorkerPool(session_factory=session_factory, workers=0)
+    pool._retry_delay = lambda attempts: 0
+    assert await pool.process_next() == first.id
+    # The retry of the first job still runs before the second job
+    assert await pool.process_next() == first.id
+
+    db.expire_all()
+    assert repo.get_by_id(first.id).status == "dead"
+    assert repo.get_by_id(first.id).last_error == "slack down"
+    assert await pool.process_next() == second.id
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_update_waits_for_bulk_provisioning_of_imported_identity(session_factory):
+    async def records():
+        for row, email in enumerate(["imp1@example.com", "imp2@example.com"], start=1):
+            yield row, {
+                "employee_id": f"IMP{row}", "first_name": "Imp", "display_name": "Imp",
+                "primary_email": email, "business_role": "developer"
+            }, None
+
+    db = session_factory()
+    service = IdentityService(db)
+    summary = await service.import_identities(records())
+    assert summary["imported"] == 2 and len(summary["job_ids"]) == 1
+    repo = ProvisioningJobRepository(db)
+    bulk = repo.get_by_id(summary["job_ids"][0])
+    assert bulk.operation == "bulk_provision" and len(bulk.payload["users"]) == 2
+    identity_ids = sorted(link.identity_id for link in bulk.identity_links)
+    assert len(identity_ids) == 2
+
+    update = await service.update_identity(identity_ids[0], IdentityUpdate(business_role="manager"))
+    reprovision = repo.get_by_identity(update.id)[0]
+    assert reprovision.operation == "reprovision"
+    other = repo.enqueue("provision", {"email": "x@example.com"}, identity_id=999)
+    db.commit()
+
+    # While the bulk job runs, jobs for its identities wait; unrelated jobs do not
+    assert repo.claim_next().id == bulk.id
+    assert repo.claim_next().id == other.id
+    assert repo.claim_next() is None
+    repo.mark_succeeded(repo.get_by_id(bulk.id), {})
+    assert repo.claim_next().id == reprovision.id
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_update_identity_queues_only_the_channel_delta(session_factory):
+    db = session_factory()
+    service = IdentityService(db)
+    identity = await service.create_identity(IdentityCreate(
+        employee_id="EMP200",
+        first_name="Delta",
+        display_name="Delta Test",
+        primary_email="delta@example.com",
+        business_role="developer"
+    ))
+    repo = ProvisioningJobRepository(db)
+
+    await service.update_identity(identity.id, IdentityUpdate(business_role="Developer", location="Remote"))
+    assert len(repo.get_by_identity(identity.id)) == 1
+
+    updated = await service.update_identity(identity.id, IdentityUpdate(business_role="manager"))
+    assert updated.entitlements["slack"]["channels"] == ["#management", "#general", "#leadership"]
+
+    job = repo.get_by_identity(identity.id)[0]
+    assert job.operation == "reprovision"
+    assert job.payload["channels_added"] == ["#management", "#leadership"]
+    assert job.payload["channels_removed"] == ["#dev-team", "#tech-updates"]
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_async_service_writes_identity_and_delta_jobs():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        service = AsyncIdentityService(db)
+        identity = await service.create_identity(IdentityCreate(
+            employee_id="EMP300",
+            first_name="Async",
+            display_name="Async Test",
+            primary_email="async@example.com",
+            business_role="developer"
+        ))
+        assert identity.id and identity.created_at
+
+        await service.update_identity(identity.id, IdentityUpdate(business_role="tester"))
+        jobs = (await db.execute(
+            select(ProvisioningJob).where(ProvisioningJob.identity_id == identity.id).order_by(ProvisioningJob.id)
+        )).scalars().all()
+        assert [job.operation for job in jobs] == ["provision", "reprovision"]
+        assert jobs[1].payload["channels_added"] == ["#qa-team", "#bug-reports"]
+    await engine.dispose()
+
+
+def test_repository_update_writes_changed_columns_once(session_factory):
+    db = session_factory()
+    repo = IdentityRepository(db)
+    identity = repo.create(IdentityCreate(
+        employee_id="EMP400",
+        first_name="Update",
+        display_name="Update Test",
+        primary_email="update@example.com",
+        business_role="developer",
+        location="Office"
+    ))
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+
+    repo.update(identity.id, IdentityUpdate(location="Office", department="QA"))
+    updates = [sql for sql in statements if sql.startswith("UPDATE")]
+    assert len(updates) == 1 and "location" not in updates[0] and "RETURNING" in updates[0]
+    assert identity.department == "QA" and identity.updated_at is not None
+
+    statements.clear()
+    repo.update(identity.id, IdentityUpdate(location="Office", department="QA"))
+    assert not [sql for sql in statements if sql.startswith("UPDATE")]
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_unavailable_channel_index_keeps_job_pending(session_factory, monkeypatch):
+    import httpx
+    from app.service.slack import SlackService
+
+    monkeypatch.setattr("app.service.slack.settings.slack_bot_token", "xoxb-test")
+    list_calls = []
+
+    def handler(request):
+        if request.url.path.endswith("users.lookupByEmail"):
+            return httpx.Response(200, json={"ok": True, "user": {"id": "U1", "real_name": "Dev"}})
+        if request.url.path.endswith("conversations.list"):
+            list_calls.append(request.url.path)
+            return httpx.Response(200, json={"ok": False, "error": "ratelimited"})
+        return httpx.Response(200, json={"ok": True})
+
+    slack = SlackService(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    db = session_factory()
+    repo = ProvisioningJobRepository(db)
+    job = repo.enqueue("provision", {"email": "dev@example.com", "first_name": "Dev", "channels": ["#general"]}, identity_id=1)
+    db.commit()
+
+    pool = ProvisioningWorkerPool(slack=slack, session_factory=session_factory, workers=0)
+    assert await pool.process_next() == job.id
+    db.expire_all()
+    job = repo.get_by_id(job.id)
+    assert job.status == "pending"
+    assert "channel_index_unavailable" in job.last_error
+
+    # The failed pass is not repeated on every lookup
+    _, unknown = await slack.channels.resolve_many(["#general"])
+    assert unknown == {"#general": "channel_index_unavailable"}
+    assert len(list_calls) == 1
+    assert slack.channels.stats()["refresh_errors"] == 1
+    await slack.close()
+    db.close()
@@ -0,0 +1,60 @@
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.core.database import Base
+from app.models.identity import Identity
+from app.service.reconciliation import ReconciliationService
+from app.service.slack import SlackService
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Identity(employee_id="E1", first_name="Ann", primary_email="ann@example.com", business_role="developer",
+                 entitlements={"slack": {"channels": ["#general", "#dev"]}}, is_active=True),
+        Identity(employee_id="E2", first_name="Ben", primary_email="ben@example.com", business_role="developer",
+                 entitlements={"slack": {"channels": ["#general"]}}, is_active=True),
+        Identity(employee_id="E3", first_name="Cat", primary_email="cat@example.com", business_role="developer",
+                 entitlements={"slack": {"channels": ["#general"]}}, is_active=False),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def slack_handler(request):
+    path = request.url.path
+    if path.endswith("users.list"):
+        return httpx.Response(200, json={"ok": True, "members": [
+            {"id": "UANN", "profile": {"email": "ANN@example.com"}},
+            {"id": "UCAT", "profile": {"email": "cat@example.com"}},
+            {"id": "UZED", "profile": {"email": "zed@example.com"}},
+            {"id": "UBOT", "is_bot": True, "profile": {"email": "bot@example.com"}},
+        ]})
+    if path.endswith("conversations.list"):
+        return httpx.Response(200, json={"ok": True, "channels": [
+            {"id": "C0GENERAL", "name": "general"}, {"id": "C0DEVTEAM", "name": "dev"}
+        ]})
+    if path.endswith("conversations.members"):
+        members = {"C0GENERAL": ["UANN", "UZED"], "C0DEVTEAM": []}[request.url.params["channel"]]
+        return httpx.Response(200, json={"ok": True, "members": members})
+    return httpx.Response(404)
+
+
+@pytest.mark.asyncio
+async def test_reconciliation_reports_missing_orphaned_and_mismatched(db):
+    slack = SlackService(client=httpx.AsyncClient(transport=httpx.MockTransport(slack_handler)))
+    report = await ReconciliationService(db, slack).run()
+
+    assert report["identities_scanned"] == 3
+    assert [item["email"] for item in report["missing"]["sample"]] == ["ben@example.com"]
+    assert report["orphaned"]["sample"] == [{"email": "zed@example.com", "user_id": "UZED"}]
+    issues = sorted(item["issue"] for item in report["mismatched"]["sample"])
+    assert issues == ["active_in_slack", "missing_channel"]
+    assert report["channel_gaps"] == {"#general": 0, "#dev": 1}
+    assert report["applied"] is None
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import httpx
+import pytest
+from app.service.rate_limit import SlackRequestScheduler
+from app.service.slack import SlackService
+
+
+CHANNEL_LIST = {
+    "ok": True,
+    "channels": [{"id": "C0GENERAL", "name": "general"}, {"id": "C0DEVTEAM", "name": "dev"}],
+    "response_metadata": {"next_cursor": ""}
+}
+
+
+def make_service(handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return SlackService(client=client), client
+
+
+@pytest.mark.asyncio
+async def test_slack_service_reuses_shared_client():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"ok": True, "user": {"id": "U1", "real_name": "Test User"}})
+
+    service, client = make_service(handler)
+    await service.get_user_by_email("test@example.com")
+    await service.get_user_by_id("U1")
+
+    assert service.client is client
+    assert calls == ["/api/users.lookupByEmail", "/api/users.info"]
+
+    await service.close()
+    assert client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_create_user_account_reports_each_channel(monkeypatch):
+    monkeypatch.setattr("app.service.slack.settings.slack_bot_token", "xoxb-test")
+
+    def handler(request):
+        if request.url.path.endswith("users.lookupByEmail"):
+            return httpx.Response(200, json={"ok": True, "user": {"id": "U1", "real_name": "Dev"}})
+        if request.url.path.endswith("conversations.list"):
+            return httpx.Response(200, json=CHANNEL_LIST)
+        channel = json.loads(request.content)["channel"]
+        if channel == "C0DEVTEAM":
+            return httpx.Response(200, json={"ok": False, "error": "is_archived"})
+        return httpx.Response(200, json={"ok": True})
+
+    service, _ = make_service(handler)
+    result = await service.create_user_account("dev@example.com", "Dev", None, ["#general", "#dev", "#missing"])
+
+    assert result["channels_assigned"] == ["#general"]
+    assert result["channels_failed"] == {"#dev": "is_archived", "#missing": "channel_not_found"}
+
+
+@pytest.mark.asyncio
+async def test_bulk_assign_channels_groups_users_per_channel(monkeypatch):
+    monkeypatch.setattr("app.service.slack.settings.slack_bot_token", "xoxb-test")
+    invites = []
+
+    def handler(request):
+        if request.url.path.endswith("conversations.list"):
+            return httpx.Response(200, json=CHANNEL_LIST)
+        payload = json.loads(request.content)
+        invites.append((payload["channel"], payload["users"]))
+        return httpx.Response(200, json={"ok": True})
+
+    service, _ = make_service(handler)
+    results = await service.bulk_assign_channels({"U1": ["#general", "#dev"], "U2": ["#general", "#gone"]})
+
+    assert sorted(invites) == [("C0DEVTEAM", "U1"), ("C0GENERAL", "U1,U2")]
+    assert results["#general"] == {"invited": ["U1", "U2"], "failed": {}}
+    assert results["#gone"] == {"invited": [], "failed": {"U2": "channel_not_found"}}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_retries_after_rate_limit():
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"ok": True, "user": {"id": "U1"}}),
+    ]
+
+    service, _ = make_service(lambda request: responses.pop(0))
+    service.scheduler = SlackRequestScheduler(limits={"users.lookupByEmail": 6000})
+    service.scheduler.backoff_base = 0.01
+
+    user = await service.get_user_by_email("test@example.com")
+
+    assert user == {"id": "U1"}
+    stats = service.scheduler.stats()
+    assert stats["retries"] == 1
+    assert stats["methods"]["users.lookupByEmail"]["throttled"] == 1
+    assert stats["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_user_cache_serves_repeat_lookups_and_invalidates_on_delete():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if request.url.path.endswith("users.list"):
+            return httpx.Response(200, json={
+                "ok": True,
+                "members": [
+                    {"id": "U2", "profile": {"email": "Warm@Example.com"}},
+                    {"id": "U3", "deleted": True, "profile": {"email": "gone@example.com"}},
+                    {"id": "B1", "is_bot": True, "profile": {"email": "bot@example.com"}}
+                ],
+                "response_metadata": {"next_cursor": ""}
+            })
+        if request.method == "DELETE":
+            return httpx.Response(204)
+        return httpx.Response(200, json={"ok": True, "user": {"id": "U1"}})
+
+    service, _ = make_service(handler)
+    await service.get_user_by_email("Test@Example.com")
+    await service.get_user_by_email("test@example.com ")
+    assert calls.count("/api/users.lookupByEmail") == 1
+
+    assert await service.warm_user_cache() == 1
+    assert await service.get_user_by_email("warm@example.com") == {"id": "U2", "profile": {"email": "Warm@Example.com"}}
+    assert calls.count("/api/users.lookupByEmail") == 1
+
+    await service.delete_user("U1")
+    await service.get_user_by_email("test@example.com")
+    assert calls.count("/api/users.lookupByEmail") == 2
+    assert service.user_cache.stats()["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_apply_channel_delta_invites_and_kicks(monkeypatch):
+    monkeypatch.setattr("app.service.slack.settings.slack_bot_token", "xoxb-test")
+    calls = []
+
+    def handler(request):
+        if request.url.path.endswith("users.lookupByEmail"):
+            return httpx.Response(200, json={"ok": True, "user": {"id": "U1"}})
+        if request.url.path.endswith("conversations.list"):
+            return httpx.Response(200, json=CHANNEL_LIST)
+        payload = json.loads(request.content)
+        calls.append((request.url.path.rsplit("/", 1)[-1], payload["channel"]))
+        return httpx.Response(200, json={"ok": True})
+
+    service, _ = make_service(handler)
+    result = await service.apply_channel_delta("dev@example.com", "Dev", None, ["#dev"], ["#general"])
+
+    assert sorted(calls) == [("conversations.invite", "C0DEVTEAM"), ("conversations.kick", "C0GENERAL")]
+    assert result["channels_added"] == ["#dev"]
+    assert result["channels_removed"] == ["#general"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_get_or_create_for_one_email_share_one_operation(monkeypatch):
+    monkeypatch.setattr("app.service.slack.settings.slack_bot_token", "xoxb-test")
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.path)
+        await asyncio.sleep(0.01)
+        if request.url.path.endswith("users.lookupByEmail"):
+            return httpx.Response(200, json={"ok": False, "error": "users_not_found"})
+        return httpx.Response(201, json={"id": "UNEW"})
+
+    service, _ = make_service(handler)
+    results = await asyncio.gather(*(service.get_or_create_user("new@example.com", "New") for _ in range(5)))
+
+    assert calls == ["/api/users.lookupByEmail", "/api/scim/v1/Users"]
+    assert {result["user_id"] for result in results} == {"UNEW"}
+    assert service._inflight_users.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_single_flight_waiter_takes_over_when_leader_is_cancelled():
+    from app.service.cache import SingleFlight
+
+    flight = SingleFlight()
+    runs = []
+
+    async def operation():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return len(runs)
+
+    leader = asyncio.create_task(flight.do("key", operation))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flight.do("key", operation))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await waiter == 2
+    assert leader.cancelled()
+    assert len(flight) == 0
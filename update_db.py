@@ -1,11 +1,13 @@
-from app.core.database import engine, Base
-from app.models.identity import Identity, TargetApplication
+from app.core.database import engine
+from app.core.migrations import run_migrations, migration_status
+import logging
 
-def create_tables():
-    # Drop existing tables to recreate with new schema
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
-    print("Database tables updated successfully with comprehensive Identity model!")
+def update_tables():
+    # Apply pending migrations in place; existing data is kept
+    applied = run_migrations(engine)
+    print(f"Applied migrations: {applied}" if applied else "Database schema is already up to date")
+    print(f"Schema version: {migration_status(engine)['current_version']}")
 
 if __name__ == "__main__":
-    create_tables()
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    update_tables()